@@ -1,8 +1,12 @@
 from typing import Optional
 
-from fastapi import HTTPException, Header, Request
+from fastapi import HTTPException, Header
 from sqlmodel import Session, select
 
+from app.auth.token_cache import auth_token_cache
+from app.database.async_service import AsyncService
+from app.database.database import service_db_dependency
+from app.helpers.tokens import hash_token
 from app.models.models import User
 
 
@@ -12,13 +16,23 @@ class AuthService():
 
     def get_curent_user_by_token(self, auth_token: str) -> Optional[User]:
         """Get user by authentication token"""
-        statement = select(User).where(User.spotify_token == auth_token)
+        statement = select(User).where(User.spotify_token_hash == hash_token(auth_token))
         return self.db.exec(statement).first()
 
 
-def get_authenticated_user(
-        request: Request,
-        auth_token: Optional[str] = Header(None)
+class AsyncAuthService(AsyncService[AuthService]):
+    """AuthService for async handlers; queries never block the event loop"""
+
+    def _service(self, session: Session) -> AuthService:
+        return AuthService(session)
+
+    async def get_curent_user_by_token(self, auth_token: str) -> Optional[User]:
+        return await self._run(AuthService.get_curent_user_by_token, auth_token)
+
+
+async def get_authenticated_user(
+        db: service_db_dependency,
+        auth_token: Optional[str] = Header(None),
         ) -> User:
     """
     Validate user authentication token and return current user
@@ -33,8 +47,10 @@ def get_authenticated_user(
     if not token:
         raise HTTPException(status_code=401, detail="No token in auth header")
 
-    user_service = request.app.state.user_service
-    user = user_service.get_user_by_token(token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid authentication token")
+    user = auth_token_cache.get(token)
+    if user is None:
+        user = await AsyncAuthService(db).get_curent_user_by_token(token)
+        if not user:
+            raise HTTPException(status_code=401, detail="Invalid authentication token")
+        auth_token_cache.set(token, user)
     return user
@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends, Request, HTTPException, status
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Request, HTTPException, status
 from fastapi.responses import JSONResponse, RedirectResponse
 from sqlmodel import Session
 
+from app.auth.token_cache import auth_token_cache
 from app.database.database import get_db
+from app.users.users import UserService
 from app.constant import TOKEN_URL, CLIENT_REDIRECT_URL
 from datetime import datetime
 import base64
@@ -36,7 +40,8 @@ async def spotify_login(request: Request, db: Session = Depends(get_db)):
 
         user_data = await get_spotify_user_data(access_token)
 
-        existing_user = await request.app.state.user_service(db, user_data["id"])
+        user_service = UserService(db)
+        existing_user = user_service.get_user_by_spotify_id(user_data["id"])
         if not existing_user:
             new_user = UserSchema(
                 user_id=user_data["id"],
@@ -47,7 +52,7 @@ async def spotify_login(request: Request, db: Session = Depends(get_db)):
                 token_expires_date=datetime.now().timestamp()
                 + token_info["expires_in"],
             )
-            await request.app.state.auth_service.create_user(db, new_user)
+            user_service.create_user(new_user.dict())
 
             await save_user_top_tracks(new_user.auth_token, db)
             await save_top_artists(new_user.auth_token, db)
@@ -90,6 +95,8 @@ async def refresh_token(refresh_token: str, request: Request):
                 )
 
             new_token_info = response.json()
+            if request.session.get("access_token"):
+                auth_token_cache.invalidate(request.session["access_token"])
             request.session["access_token"] = new_token_info["access_token"]
             request.session["expires_at"] = (
                 datetime.now().timestamp() + new_token_info["expires_in"]
@@ -102,6 +109,9 @@ async def refresh_token(refresh_token: str, request: Request):
 
 # TODO: : Handle proper logout
 @router.get("/logout")
-async def logout(request: Request):
+async def logout(request: Request, auth_token: Optional[str] = Header(None)):
+    # Don't keep serving this token from the auth cache
+    if auth_token and auth_token.startswith("Bearer"):
+        auth_token_cache.invalidate(auth_token[7:])
     request.session.clear()
     return RedirectResponse("/")
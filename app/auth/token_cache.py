@@ -0,0 +1,64 @@
+from typing import Any, Dict, Optional, Set
+from uuid import UUID
+
+from app.constant import AUTH_CACHE_SIZE, AUTH_CACHE_TTL
+from app.helpers.cache import TTLCache
+from app.helpers.tokens import hash_token
+from app.models.models import User
+
+
+class AuthTokenCache:
+    """
+    Token hash -> snapshot of the authenticated user, so the hot auth path
+    is a dict lookup. Only valid tokens are cached; entries are dropped when
+    the user changes, logs out or gets a new token, and otherwise live for
+    AUTH_CACHE_TTL in this worker.
+    """
+
+    def __init__(self, maxsize: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL):
+        self.memory = TTLCache(maxsize, ttl)
+        # Every cached token of each user (one per device or login), so user
+        # changes can find the entries to drop. Hashes the TTLCache expired
+        # or evicted are pruned as the map is updated.
+        self._hashes_by_user: Dict[str, Set[str]] = {}
+
+    def get(self, token: str) -> Optional[User]:
+        """A fresh, session-less User for a cached token, else None"""
+        snapshot = self.memory.get(hash_token(token))
+        return None if snapshot is None else User.model_validate(snapshot)
+
+    def set(self, token: str, user: User) -> None:
+        token_hash = hash_token(token)
+        self.memory.set(token_hash, user.model_dump())
+        user_id = str(user.id)
+        hashes = self._live_hashes(user_id)
+        hashes.add(token_hash)
+        self._hashes_by_user[user_id] = hashes
+        if len(self._hashes_by_user) > 2 * self.memory.maxsize:
+            # Forget users none of whose tokens are cached any more
+            for stale_user_id in list(self._hashes_by_user):
+                if not self._live_hashes(stale_user_id):
+                    del self._hashes_by_user[stale_user_id]
+
+    def invalidate(self, token: str) -> None:
+        self.memory.pop(hash_token(token))
+
+    def invalidate_user(self, user_id: UUID) -> None:
+        for token_hash in self._hashes_by_user.pop(str(user_id), ()):
+            self.memory.pop(token_hash)
+
+    def _live_hashes(self, user_id: str) -> Set[str]:
+        hashes = {
+            token_hash
+            for token_hash in self._hashes_by_user.get(user_id, ())
+            if token_hash in self.memory
+        }
+        self._hashes_by_user[user_id] = hashes
+        return hashes
+
+    def stats(self) -> Dict[str, Any]:
+        return self.memory.stats()
+
+
+# Shared by every request in this worker process
+auth_token_cache = AuthTokenCache()
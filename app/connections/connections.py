@@ -4,8 +4,10 @@ from uuid import UUID
 from fastapi import HTTPException
 from sqlmodel import Session, select, and_
 
+from app.database.async_service import AsyncService
 from app.users.users import UserService
-from app.recommendation.music_recommender import MusicRecommender
+from app.recommendation.compatibility import get_compatibility
+from app.recommendation.music_recommender import recommender
 from app.models.models import Connection, User
 
 
@@ -17,7 +19,7 @@ class ConnectionService:
     ):
         self.db = db
         self.user_service = user_service
-        self.recommender = MusicRecommender()
+        self.recommender = recommender
 
     def get_user_connections(self, user_id: UUID) -> List[Connection]:
         """Get connections for a user"""
@@ -48,13 +50,9 @@ class ConnectionService:
         if not current_user_profile or not target_profile:
             raise HTTPException(status_code=404, detail="Music profile not found")
 
-            # TODO: : we probably don't need to calculate compatability at this point
-        # we are alreadysending compatability when recommending users in `/recommendations/users` endpoint
-        # Calculate compatibility score
-        current_profile_dict = current_user_profile.dict()
-        target_profile_dict = target_profile.dict()
-        compatibility = self.recommender.calculate_overall_similarity(
-            current_profile_dict, target_profile_dict
+        # Precomputed by the compatibility job; scored inline on a miss
+        compatibility = get_compatibility(
+            self.db, current_user_profile, target_profile, self.recommender
         )
 
         # Find shared music elements
@@ -138,6 +136,28 @@ class ConnectionService:
         self.db.commit()
 
 
+class AsyncConnectionService(AsyncService[ConnectionService]):
+    """ConnectionService for async handlers; queries never block the event loop"""
+
+    def _service(self, session: Session) -> ConnectionService:
+        return ConnectionService(session, UserService(session))
+
+    async def get_user_connections(self, user_id: UUID) -> List[Connection]:
+        return await self._run(ConnectionService.get_user_connections, user_id)
+
+    async def create_connection(self, user_id: UUID, target_user_id: UUID) -> Connection:
+        return await self._run(ConnectionService.create_connection, user_id, target_user_id)
+
+    async def accept_connection(self, current_user: User, connection_id: UUID) -> Connection:
+        return await self._run(ConnectionService.accept_connection, current_user, connection_id)
+
+    async def reject_connection(self, current_user: User, connection_id: UUID) -> Connection:
+        return await self._run(ConnectionService.reject_connection, current_user, connection_id)
+
+    async def delete_connection(self, current_user: User, connection_id: UUID):
+        return await self._run(ConnectionService.delete_connection, current_user, connection_id)
+
+
 
 # def get_user_connections(db: Session, user_id: UUID) -> List[Connection]:
 #     """Get connections for a user"""
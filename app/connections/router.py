@@ -5,13 +5,13 @@ from fastapi import APIRouter, Depends
 from sqlmodel import Session
 
 from app.users.users import UserService
-from app.database.database import get_db
+from app.database.database import get_db, service_db_dependency
 from app.auth.auth import get_authenticated_user
 from app.models.models import User, Connection
 from app.helpers.router.utils import get_user_service
 
 
-from .connections import ConnectionService
+from .connections import AsyncConnectionService, ConnectionService
 
 
 def get_connection_service(
@@ -21,26 +21,30 @@ def get_connection_service(
     return ConnectionService(db_dependency, user_serivce)
 
 
+def get_async_connection_service(db: service_db_dependency) -> AsyncConnectionService:
+    return AsyncConnectionService(db)
+
+
 router = APIRouter()
 
 
 @router.get("", response_model=List[Connection])
 async def list_user_connections(
     current_user: User = Depends(get_authenticated_user),
-    connection_service: ConnectionService = Depends(get_connection_service),
+    connection_service: AsyncConnectionService = Depends(get_async_connection_service),
 ) -> List[Connection]:
     """Get all connections for the current user"""
-    return connection_service.get_user_connections(current_user.id)
+    return await connection_service.get_user_connections(current_user.id)
 
 
 @router.post("/request/{target_user_id}")
 async def request_connection(
     target_user_id: UUID,
     current_user: User = Depends(get_authenticated_user),
-    connection_service: ConnectionService = Depends(get_connection_service),
+    connection_service: AsyncConnectionService = Depends(get_async_connection_service),
 ):
     """Create a connection request"""
-    connection = connection_service.create_connection(
+    connection = await connection_service.create_connection(
         current_user.id, target_user_id)
     return {"message": "Connection request sent", "connection": connection}
 
@@ -49,10 +53,10 @@ async def request_connection(
 async def accept_connection_request(
     connection_id: UUID,
     current_user: User = Depends(get_authenticated_user),
-    connection_service: ConnectionService = Depends(get_connection_service),
+    connection_service: AsyncConnectionService = Depends(get_async_connection_service),
 ):
     """Accept a connection request"""
-    connection = connection_service.accept_connection(
+    connection = await connection_service.accept_connection(
         current_user, connection_id)
     return {"message": "Connection accepted", "connection": connection}
 
@@ -61,10 +65,10 @@ async def accept_connection_request(
 async def reject_connection_request(
     connection_id: UUID,
     current_user: User = Depends(get_authenticated_user),
-    connection_service: ConnectionService = Depends(get_connection_service),
+    connection_service: AsyncConnectionService = Depends(get_async_connection_service),
 
 ):
     """Reject a connection request"""
-    connection = connection_service.reject_connection(current_user, connection_id)
+    connection = await connection_service.reject_connection(current_user, connection_id)
     return {"message": "Connection rejected", "connection": connection}
 
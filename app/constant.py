@@ -8,3 +8,106 @@ CLIENT_REDIRECT_URL = 'http://localhost:3000/login'
 
 CLIENT_ID = os.getenv("SPOTIPY_CLIENT_ID", "")
 CLIENT_SECRET = os.getenv("SPOTIPY_CLIENT_SECRET", "")
+
+# Shared outbound HTTP pool (used by SpotifyClient and the auth callbacks)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "50"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+# Max in-flight Spotify requests for a single user's SpotifyClient
+SPOTIFY_USER_CONCURRENCY = int(os.getenv("SPOTIFY_USER_CONCURRENCY", "4"))
+
+# Artist metadata cache (genres rarely change, so entries live for a week)
+ARTIST_CACHE_SIZE = int(os.getenv("ARTIST_CACHE_SIZE", "20000"))
+ARTIST_CACHE_TTL = float(os.getenv("ARTIST_CACHE_TTL", str(7 * 24 * 60 * 60)))
+ARTIST_CACHE_DB_ENABLED = os.getenv("ARTIST_CACHE_DB_ENABLED", "false").lower() == "true"
+
+# App-wide Spotify request budget (per worker process) and retry policy
+SPOTIFY_RATE_LIMIT = float(os.getenv("SPOTIFY_RATE_LIMIT", "10"))
+SPOTIFY_RATE_BURST = int(os.getenv("SPOTIFY_RATE_BURST", "20"))
+SPOTIFY_MAX_RETRIES = int(os.getenv("SPOTIFY_MAX_RETRIES", "3"))
+SPOTIFY_BACKOFF_BASE = float(os.getenv("SPOTIFY_BACKOFF_BASE", "0.5"))
+SPOTIFY_BACKOFF_MAX = float(os.getenv("SPOTIFY_BACKOFF_MAX", "30"))
+
+# Per-user Spotify response cache (top artists change roughly daily)
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")  # or "redis"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "10000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(6 * 60 * 60)))
+RESPONSE_CACHE_STALE_TTL = float(os.getenv("RESPONSE_CACHE_STALE_TTL", str(24 * 60 * 60)))
+
+# How often the recommender refits its TF-IDF vocabularies over all profiles
+RECOMMENDER_REFIT_INTERVAL = float(os.getenv("RECOMMENDER_REFIT_INTERVAL", "3600"))
+
+# Approximate nearest-neighbour index for user recommendations
+ANN_INDEX_PATH = os.getenv("ANN_INDEX_PATH", "data/ann_index")
+ANN_INDEX_NPROBE = int(os.getenv("ANN_INDEX_NPROBE", "8"))
+# Candidates pulled from the index per request, re-ranked exactly
+ANN_CANDIDATES = int(os.getenv("ANN_CANDIDATES", "200"))
+
+# Authenticated-user cache, keyed by token hash (per worker process)
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "300"))
+
+# Precomputed compatibility: each user's top matches, refreshed in the background
+COMPATIBILITY_TOP_K = int(os.getenv("COMPATIBILITY_TOP_K", "200"))
+COMPATIBILITY_REFRESH_INTERVAL = float(os.getenv("COMPATIBILITY_REFRESH_INTERVAL", "300"))
+COMPATIBILITY_REFRESH_ENABLED = (
+    os.getenv("COMPATIBILITY_REFRESH_ENABLED", "true").lower() == "true"
+)
+
+# Inverted index (artist/genre/track -> users) for recommendation candidates
+INVERTED_INDEX_CANDIDATES = int(os.getenv("INVERTED_INDEX_CANDIDATES", "300"))
+INVERTED_INDEX_MAX_POSTING = int(os.getenv("INVERTED_INDEX_MAX_POSTING", "20000"))
+
+# MinHash sketches of profiles and the LSH index over them. Changing the
+# permutation count invalidates every stored signature. 32 bands of 2 rows
+# make users with Jaccard ~0.2 or more likely to share a bucket.
+MINHASH_PERMUTATIONS = int(os.getenv("MINHASH_PERMUTATIONS", "64"))
+LSH_BANDS = int(os.getenv("LSH_BANDS", "32"))
+LSH_MAX_BUCKET = int(os.getenv("LSH_MAX_BUCKET", "5000"))
+
+# Columnar profile features, memory-mapped by every worker
+FEATURE_STORE_PATH = os.getenv("FEATURE_STORE_PATH", "data/feature_store")
+
+# Background jobs (e.g. Spotify syncs). Workers per process cap how many
+# syncs hit Spotify at once, on top of the app-wide request budget.
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "memory")  # or "redis"
+JOB_TTL = float(os.getenv("JOB_TTL", str(24 * 60 * 60)))
+JOB_HISTORY_SIZE = int(os.getenv("JOB_HISTORY_SIZE", "10000"))
+SPOTIFY_SYNC_WORKERS = int(os.getenv("SPOTIFY_SYNC_WORKERS", "4"))
+
+# Scheduled refresh of profiles whose last Spotify sync is older than
+# PROFILE_REFRESH_MAX_AGE. The rate (profiles/second) keeps the refresh to a
+# share of the Spotify budget, leaving the rest for interactive requests.
+PROFILE_REFRESH_ENABLED = os.getenv("PROFILE_REFRESH_ENABLED", "true").lower() == "true"
+PROFILE_REFRESH_INTERVAL = float(os.getenv("PROFILE_REFRESH_INTERVAL", str(60 * 60)))
+PROFILE_REFRESH_MAX_AGE = float(os.getenv("PROFILE_REFRESH_MAX_AGE", str(7 * 24 * 60 * 60)))
+PROFILE_REFRESH_BATCH_SIZE = int(os.getenv("PROFILE_REFRESH_BATCH_SIZE", "100"))
+PROFILE_REFRESH_CONCURRENCY = int(os.getenv("PROFILE_REFRESH_CONCURRENCY", "8"))
+PROFILE_REFRESH_RATE = float(os.getenv("PROFILE_REFRESH_RATE", "2"))
+
+# Realtime: each room socket gets a bounded send queue drained by its own
+# writer task. A full queue is handled by the slow-consumer policy:
+# "drop_oldest", "coalesce" (replace a queued update of the same kind, else
+# drop oldest) or "disconnect".
+REALTIME_SEND_QUEUE_SIZE = int(os.getenv("REALTIME_SEND_QUEUE_SIZE", "64"))
+REALTIME_SLOW_CONSUMER_POLICY = os.getenv("REALTIME_SLOW_CONSUMER_POLICY", "coalesce")
+REALTIME_SEND_TIMEOUT = float(os.getenv("REALTIME_SEND_TIMEOUT", "10"))
+# "memory" (one worker) or "redis" (pub/sub, so rooms span workers)
+REALTIME_BROKER = os.getenv("REALTIME_BROKER", "memory")
+# At most one track update per room per window (the latest wins); 0 disables
+REALTIME_TRACK_UPDATE_WINDOW = float(os.getenv("REALTIME_TRACK_UPDATE_WINDOW", "0.5"))
+# Chat messages per user: sustained rate (per second) and burst
+REALTIME_CHAT_RATE = float(os.getenv("REALTIME_CHAT_RATE", "1"))
+REALTIME_CHAT_BURST = int(os.getenv("REALTIME_CHAT_BURST", "5"))
+
+# Presence: joins and leaves within a window go out as one diff; the
+# registry is written to room_participants every checkpoint interval, and
+# rows missed by PRESENCE_STALE_CHECKPOINTS checkpoints are removed
+PRESENCE_DIFF_WINDOW = float(os.getenv("PRESENCE_DIFF_WINDOW", "0.25"))
+PRESENCE_CHECKPOINT_INTERVAL = float(os.getenv("PRESENCE_CHECKPOINT_INTERVAL", "30"))
+PRESENCE_STALE_CHECKPOINTS = int(os.getenv("PRESENCE_STALE_CHECKPOINTS", "3"))
@@ -0,0 +1,40 @@
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Generic, TypeVar, Union
+
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+ServiceT = TypeVar("ServiceT")
+T = TypeVar("T")
+
+AnySession = Union[Session, AsyncSession]
+
+
+async def run_db(db: AnySession, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run `fn(session, *args, **kwargs)` without blocking the event loop.
+
+    On an AsyncSession the sync code runs through `run_sync`, so every query
+    awaits asyncpg. On a plain Session it is moved to the threadpool.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+class AsyncService(ABC, Generic[ServiceT]):
+    """Awaitable variant of a synchronous service, sharing its queries"""
+
+    def __init__(self, db: AnySession):
+        self.db = db
+
+    @abstractmethod
+    def _service(self, session: Session) -> ServiceT:
+        """The synchronous service bound to `session`"""
+
+    async def _run(self, method: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        return await run_db(
+            self.db,
+            lambda session: method(self._service(session), *args, **kwargs),
+        )
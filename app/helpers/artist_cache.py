@@ -0,0 +1,125 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, select
+
+from app.constant import ARTIST_CACHE_DB_ENABLED, ARTIST_CACHE_SIZE, ARTIST_CACHE_TTL
+from app.database.database import engine
+from app.helpers.cache import TTLCache
+from app.models.models import ArtistMetadata
+
+
+class ArtistMetadataCache:
+    """Spotify artist payloads by id: in-process LRU first, then Postgres"""
+
+    def __init__(
+        self,
+        maxsize: int = ARTIST_CACHE_SIZE,
+        ttl: float = ARTIST_CACHE_TTL,
+        use_db: bool = ARTIST_CACHE_DB_ENABLED,
+    ):
+        self.ttl = ttl
+        self.use_db = use_db
+        self.memory = TTLCache(maxsize, ttl)
+        self.db_hits = 0
+        self.db_misses = 0
+
+    async def get(self, artist_id: str) -> Optional[Dict[str, Any]]:
+        """Get one cached artist payload, or None on a miss"""
+        return (await self.get_many([artist_id])).get(artist_id)
+
+    async def get_many(self, artist_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Get every cached artist among `artist_ids`, keyed by id"""
+        found: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        for artist_id in dict.fromkeys(artist_ids):
+            artist = self.memory.get(artist_id)
+            if artist is None:
+                missing.append(artist_id)
+            else:
+                found[artist_id] = artist
+
+        if missing and self.use_db:
+            stored = await asyncio.to_thread(self._load, missing)
+            self.db_hits += len(stored)
+            self.db_misses += len(missing) - len(stored)
+            for artist_id, (artist, remaining_ttl) in stored.items():
+                self.memory.set(artist_id, artist, ttl=remaining_ttl)
+                found[artist_id] = artist
+
+        return found
+
+    async def set_many(self, artists: Iterable[Dict[str, Any]]) -> None:
+        """Cache full artist payloads as returned by Spotify"""
+        artists = [artist for artist in artists if artist and artist.get("id")]
+        for artist in artists:
+            self.memory.set(artist["id"], artist)
+
+        if artists and self.use_db:
+            await asyncio.to_thread(self._store, artists)
+
+    def _load(self, artist_ids: List[str]) -> Dict[str, Tuple[Dict[str, Any], float]]:
+        now = datetime.utcnow()
+        statement = select(ArtistMetadata).where(
+            ArtistMetadata.id.in_(artist_ids),
+            ArtistMetadata.fetched_at > now - timedelta(seconds=self.ttl),
+        )
+        try:
+            with Session(engine) as session:
+                rows = session.exec(statement).all()
+        except Exception as e:
+            logging.warning(f"Artist cache lookup failed: {str(e)}")
+            return {}
+
+        return {
+            row.id: (row.data, self.ttl - (now - row.fetched_at).total_seconds())
+            for row in rows
+        }
+
+    def _store(self, artists: List[Dict[str, Any]]) -> None:
+        now = datetime.utcnow()
+        statement = insert(ArtistMetadata).values(
+            [
+                {
+                    "id": artist["id"],
+                    "name": artist.get("name"),
+                    "genres": artist.get("genres", []),
+                    "popularity": artist.get("popularity"),
+                    "data": artist,
+                    "fetched_at": now,
+                }
+                for artist in artists
+            ]
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[ArtistMetadata.id],
+            set_={
+                column: statement.excluded[column]
+                for column in ("name", "genres", "popularity", "data", "fetched_at")
+            },
+        )
+        try:
+            with Session(engine) as session:
+                session.execute(statement)
+                session.commit()
+        except Exception as e:
+            logging.warning(f"Artist cache write failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.memory.stats()
+        stats.update(
+            {
+                "db_enabled": self.use_db,
+                "db_hits": self.db_hits,
+                "db_misses": self.db_misses,
+                # Every hit is an artist lookup Spotify didn't have to serve
+                "lookups_saved": self.memory.hits + self.db_hits,
+            }
+        )
+        return stats
+
+
+artist_cache = ArtistMetadataCache()
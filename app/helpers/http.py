@@ -0,0 +1,82 @@
+import asyncio
+import importlib.util
+import logging
+from typing import Dict, Optional
+
+import httpx
+
+from app.constant import (
+    HTTP2_ENABLED,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_CONNECTIONS_PER_HOST,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_TIMEOUT,
+)
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+class HostLimitedTransport(httpx.AsyncHTTPTransport):
+    """Connection-pooling transport that caps concurrent requests per host"""
+
+    def __init__(self, max_per_host: int = HTTP_MAX_CONNECTIONS_PER_HOST, **kwargs):
+        super().__init__(**kwargs)
+        self.max_per_host = max_per_host
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_per_host)
+            self._host_semaphores[host] = semaphore
+
+        async with semaphore:
+            return await super().handle_async_request(request)
+
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional `h2` package (httpx[http2])"""
+    return importlib.util.find_spec("h2") is not None
+
+
+def create_http_client(
+    max_connections: int = HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections: int = HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+    max_connections_per_host: int = HTTP_MAX_CONNECTIONS_PER_HOST,
+    http2: bool = HTTP2_ENABLED,
+    timeout: float = HTTP_TIMEOUT,
+) -> httpx.AsyncClient:
+    """Build a pooled AsyncClient with keep-alive and per-host connection caps"""
+    if http2 and not http2_available():
+        logging.warning("HTTP/2 requested but `h2` is not installed, using HTTP/1.1")
+        http2 = False
+
+    transport = HostLimitedTransport(
+        max_per_host=max_connections_per_host,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        ),
+    )
+    return httpx.AsyncClient(transport=transport, timeout=timeout)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the process-wide pooled HTTP client, creating it on first use"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = create_http_client()
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the process-wide HTTP client and release pooled connections"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from fastapi import HTTPException
+
+from app.constant import JOB_HISTORY_SIZE, JOB_QUEUE_BACKEND, JOB_TTL, REDIS_URL
+from app.helpers.cache import TTLCache
+from app.models.schema import Job
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# Reports a job's current stage, e.g. "fetching top artists"
+Progress = Callable[[str], Awaitable[None]]
+JobHandler = Callable[[Job, Progress], Awaitable[None]]
+
+
+class InMemoryJobBackend:
+    """Jobs and their queue local to this worker"""
+
+    def __init__(self, maxsize: int = JOB_HISTORY_SIZE, ttl: float = JOB_TTL):
+        self._jobs = TTLCache(maxsize, ttl)
+        self._active: Dict[str, str] = {}  # dedupe key -> job id
+        self._queue: Optional[asyncio.Queue] = None
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        # Created on first use, inside the running event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    async def add(self, job: Job) -> Tuple[Job, bool]:
+        """Queue `job` unless one with its key is still active"""
+        active = self._jobs.get(self._active.get(job.key))
+        if active is not None and active.status in ACTIVE_STATUSES:
+            return active, False
+        self._jobs.set(job.id, job)
+        self._active[job.key] = job.id
+        await self.queue.put(job.id)
+        return job, True
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def save(self, job: Job) -> None:
+        self._jobs.set(job.id, job)
+
+    async def pop(self) -> Optional[str]:
+        return await self.queue.get()
+
+    async def finish(self, job: Job) -> None:
+        await self.save(job)
+        if self._active.get(job.key) == job.id:
+            del self._active[job.key]
+
+    async def depth(self) -> int:
+        return self.queue.qsize()
+
+
+class RedisJobBackend:
+    """Jobs in Redis, so any worker can run them and report their status"""
+
+    def __init__(self, name: str, url: str = REDIS_URL, ttl: float = JOB_TTL):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self.namespace = f"alma:jobs:{name}:"
+        self.ttl = int(ttl)
+
+    async def add(self, job: Job) -> Tuple[Job, bool]:
+        active_key = f"{self.namespace}active:{job.key}"
+        # Expires with the job, so a worker dying mid-job cannot block the key
+        if not await self._redis.set(active_key, job.id, nx=True, ex=self.ttl):
+            existing_id = await self._redis.get(active_key)
+            active = existing_id and await self.get(existing_id.decode())
+            if active is not None and active.status in ACTIVE_STATUSES:
+                return active, False
+            await self._redis.set(active_key, job.id, ex=self.ttl)
+        await self.save(job)
+        await self._redis.rpush(f"{self.namespace}queue", job.id)
+        return job, True
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        raw = await self._redis.get(f"{self.namespace}job:{job_id}")
+        return None if raw is None else Job.model_validate_json(raw)
+
+    async def save(self, job: Job) -> None:
+        await self._redis.set(
+            f"{self.namespace}job:{job.id}", job.model_dump_json(), ex=self.ttl
+        )
+
+    async def pop(self) -> Optional[str]:
+        item = await self._redis.blpop(f"{self.namespace}queue", timeout=1)
+        return None if item is None else item[1].decode()
+
+    async def finish(self, job: Job) -> None:
+        await self.save(job)
+        active_key = f"{self.namespace}active:{job.key}"
+        if await self._redis.get(active_key) == job.id.encode():
+            await self._redis.delete(active_key)
+
+    async def depth(self) -> int:
+        return await self._redis.llen(f"{self.namespace}queue")
+
+
+class JobQueue:
+    """
+    Background jobs run by a fixed pool of worker tasks.
+    At most one job per key (e.g. per user) is queued or running at a time;
+    enqueueing another returns the active one.
+    """
+
+    def __init__(self, name: str, handler: JobHandler, backend, workers: int):
+        self.name = name
+        self.handler = handler
+        self.backend = backend
+        self.workers = workers
+        self._tasks: List[asyncio.Task] = []
+        self.enqueued = 0
+        self.deduplicated = 0
+        self.running = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    async def enqueue(self, key: str) -> Job:
+        job, created = await self.backend.add(
+            Job(id=str(uuid4()), kind=self.name, key=key, created_at=datetime.utcnow())
+        )
+        if created:
+            self.enqueued += 1
+        else:
+            self.deduplicated += 1
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await self.backend.get(job_id)
+
+    async def _run(self, job: Job) -> None:
+        async def progress(stage: str) -> None:
+            job.progress = stage
+            await self.backend.save(job)
+
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        await self.backend.save(job)
+        self.running += 1
+        try:
+            await self.handler(job, progress)
+            job.status = "succeeded"
+            self.succeeded += 1
+        except Exception as e:
+            job.status = "failed"
+            job.error = e.detail if isinstance(e, HTTPException) else str(e)
+            self.failed += 1
+            logging.warning(f"{self.name} job {job.id} failed: {job.error}")
+        finally:
+            self.running -= 1
+            job.finished_at = datetime.utcnow()
+            await self.backend.finish(job)
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                job_id = await self.backend.pop()
+                job = job_id and await self.backend.get(job_id)
+                if job is not None:
+                    await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # e.g. Redis unavailable: back off instead of spinning
+                logging.warning(f"{self.name} worker error: {str(e)}")
+                await asyncio.sleep(1)
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def stats(self) -> Dict[str, object]:
+        return {
+            "backend": type(self.backend).__name__,
+            "workers": self.workers,
+            "queued": await self.backend.depth(),
+            "running": self.running,
+            "enqueued": self.enqueued,
+            "deduplicated": self.deduplicated,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+        }
+
+
+def create_job_queue(name: str, handler: JobHandler, workers: int) -> JobQueue:
+    if JOB_QUEUE_BACKEND == "redis":
+        return JobQueue(name, handler, RedisJobBackend(name), workers)
+    return JobQueue(name, handler, InMemoryJobBackend(), workers)
@@ -0,0 +1,53 @@
+"""
+MinHash sketches of a profile's artists, genres and tracks.
+
+Two signatures agree in each position with probability equal to the
+Jaccard similarity of the underlying sets, so the fraction of matching
+positions estimates it without either set at hand.
+"""
+import zlib
+from typing import Any, Iterable, List, Mapping, Optional, Set
+
+import numpy as np
+
+from app.constant import MINHASH_PERMUTATIONS
+
+INDEXED_FIELDS = ("top_artists", "genres", "top_tracks")
+
+# Universal hashing ((a * x + b) mod p) over 32-bit item hashes. The
+# coefficients must never change: stored signatures depend on them.
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32
+_MAX_HASH = np.uint64(2**32 - 1)
+_random = np.random.RandomState(20241017)
+_A = _random.randint(1, 2**32, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+_B = _random.randint(0, 2**32, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+
+def profile_terms(profile: Mapping[str, Any]) -> Set[str]:
+    """A profile's artists, genres and tracks as "field:item" terms"""
+    terms = set()
+    for field in INDEXED_FIELDS:
+        for item in profile.get(field) or []:
+            # Synced artists may be stored as Spotify payloads rather than names
+            if isinstance(item, dict):
+                item = item.get("id") or item.get("name")
+            if item:
+                terms.add(f"{field}:{str(item).lower()}")
+    return terms
+
+
+def minhash_signature(terms: Iterable[str]) -> Optional[List[int]]:
+    """MINHASH_PERMUTATIONS minimum hashes of `terms`, None for no terms"""
+    hashes = np.fromiter(
+        (zlib.crc32(term.encode()) for term in terms), dtype=np.uint64
+    )
+    if not len(hashes):
+        return None
+    # a < 2**32 and x < 2**32, so a * x + b stays below 2**64
+    permuted = (np.outer(hashes, _A) + _B) % _PRIME & _MAX_HASH
+    return permuted.min(axis=0).astype(np.int64).tolist()
+
+
+def estimate_jaccard(signature: Iterable[int], other: Iterable[int]) -> float:
+    """Estimated Jaccard similarity of the sets behind two signatures"""
+    return float(np.mean(np.asarray(signature) == np.asarray(other)))
@@ -0,0 +1,170 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+from app.constant import (
+    SPOTIFY_BACKOFF_BASE,
+    SPOTIFY_BACKOFF_MAX,
+    SPOTIFY_MAX_RETRIES,
+    SPOTIFY_RATE_BURST,
+    SPOTIFY_RATE_LIMIT,
+)
+
+
+class TokenBucket:
+    """Async token bucket; waiters are served in arrival order"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    async def acquire(self) -> float:
+        """Take one token, waiting if needed. Returns seconds spent waiting"""
+        started_at = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return now - started_at
+                else:
+                    delay = (1 - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+
+    def try_acquire(self) -> bool:
+        """Take one token if one is available now, without waiting"""
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.paused_until or self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller, e.g. while Spotify's Retry-After runs"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def parse_retry_after(response: httpx.Response) -> Optional[float]:
+    """Read Retry-After as delta-seconds or an HTTP date"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class SpotifyRequestScheduler:
+    """
+    Gate for all outbound Spotify traffic.
+    Enforces a requests-per-second budget shared by every user in the
+    process, honours Retry-After on 429 and retries 429/5xx with jittered
+    exponential backoff.
+    """
+
+    def __init__(
+        self,
+        rate: float = SPOTIFY_RATE_LIMIT,
+        burst: int = SPOTIFY_RATE_BURST,
+        max_retries: int = SPOTIFY_MAX_RETRIES,
+        backoff_base: float = SPOTIFY_BACKOFF_BASE,
+        backoff_max: float = SPOTIFY_BACKOFF_MAX,
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        # Metrics
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.throttled_seconds = 0.0
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.server_errors = 0
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": spreads retries from many users over the window
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    async def _wait_for_budget(self) -> None:
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            waited = await self.bucket.acquire()
+        finally:
+            self.queue_depth -= 1
+        self.throttled_seconds += waited
+
+    async def send(
+        self, send_request: Callable[[], Awaitable[httpx.Response]]
+    ) -> httpx.Response:
+        """Run `send_request` within the budget, retrying 429 and 5xx"""
+        attempt = 0
+        while True:
+            await self._wait_for_budget()
+            response = await send_request()
+            self.requests += 1
+
+            status = response.status_code
+            if status != 429 and status < 500:
+                return response
+            if status == 429:
+                self.rate_limited += 1
+            else:
+                self.server_errors += 1
+            if attempt >= self.max_retries:
+                return response
+
+            self.retries += 1
+            if status == 429:
+                # Spotify's limit is app-wide, so every caller backs off
+                retry_after = parse_retry_after(response)
+                delay = self._backoff(attempt)
+                if retry_after is not None:
+                    delay += retry_after
+                self.bucket.pause(delay)
+            else:
+                await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rate_limit": self.bucket.rate,
+            "burst": self.bucket.capacity,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "throttled_seconds": round(self.throttled_seconds, 3),
+            "requests": self.requests,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "server_errors": self.server_errors,
+        }
+
+
+spotify_scheduler = SpotifyRequestScheduler()
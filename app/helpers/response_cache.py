@@ -0,0 +1,146 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.constant import (
+    REDIS_URL,
+    RESPONSE_CACHE_BACKEND,
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_STALE_TTL,
+    RESPONSE_CACHE_TTL,
+)
+from app.helpers.cache import TTLCache
+
+# (fresh_until as a unix timestamp, cached value)
+CacheEntry = Tuple[float, Any]
+
+
+class InMemoryResponseBackend:
+    """Size-bounded LRU storage local to this worker"""
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE):
+        self._cache = TTLCache(maxsize, RESPONSE_CACHE_TTL + RESPONSE_CACHE_STALE_TTL)
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        return self._cache.get(key)
+
+    async def set(self, key: str, entry: CacheEntry, ttl: float) -> None:
+        self._cache.set(key, entry, ttl=ttl)
+
+    async def delete_prefix(self, prefix: str) -> None:
+        for key in [key for key in self._cache.keys() if key.startswith(prefix)]:
+            self._cache.pop(key)
+
+
+class RedisResponseBackend:
+    """Redis storage so every worker shares the same cached responses"""
+
+    def __init__(self, url: str = REDIS_URL, namespace: str = "alma:responses:"):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self.namespace = namespace
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        raw = await self._redis.get(self.namespace + key)
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        return data["fresh_until"], data["value"]
+
+    async def set(self, key: str, entry: CacheEntry, ttl: float) -> None:
+        fresh_until, value = entry
+        await self._redis.set(
+            self.namespace + key,
+            json.dumps({"fresh_until": fresh_until, "value": value}),
+            ex=max(int(ttl), 1),
+        )
+
+    async def delete_prefix(self, prefix: str) -> None:
+        keys = [key async for key in self._redis.scan_iter(f"{self.namespace}{prefix}*")]
+        if keys:
+            await self._redis.delete(*keys)
+
+
+class ResponseCache:
+    """
+    Read-through cache with stale-while-revalidate.
+    Fresh entries are returned as is; stale ones are returned immediately
+    while a single background task refreshes them.
+    """
+
+    def __init__(
+        self,
+        backend,
+        ttl: float = RESPONSE_CACHE_TTL,
+        stale_ttl: float = RESPONSE_CACHE_STALE_TTL,
+    ):
+        self.backend = backend
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._refreshing: Dict[str, "asyncio.Task[None]"] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refresh_errors = 0
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for `key`, calling `fetch` on a miss"""
+        entry = await self.backend.get(key)
+        if entry is not None:
+            fresh_until, value = entry
+            if time.time() < fresh_until:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                self._refresh_in_background(key, fetch)
+            return value
+
+        self.misses += 1
+        value = await fetch()
+        await self.set(key, value)
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        entry = (time.time() + self.ttl, value)
+        await self.backend.set(key, entry, ttl=self.ttl + self.stale_ttl)
+
+    async def invalidate(self, prefix: str) -> None:
+        """Drop every entry whose key starts with `prefix`"""
+        await self.backend.delete_prefix(prefix)
+
+    def _refresh_in_background(
+        self, key: str, fetch: Callable[[], Awaitable[Any]]
+    ) -> None:
+        if key not in self._refreshing:
+            self._refreshing[key] = asyncio.create_task(self._refresh(key, fetch))
+
+    async def _refresh(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> None:
+        try:
+            await self.set(key, await fetch())
+        except Exception as e:
+            self.refresh_errors += 1
+            logging.warning(f"Background refresh of {key} failed: {str(e)}")
+        finally:
+            del self._refreshing[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshing": len(self._refreshing),
+            "refresh_errors": self.refresh_errors,
+        }
+
+
+def create_response_cache() -> ResponseCache:
+    if RESPONSE_CACHE_BACKEND == "redis":
+        return ResponseCache(RedisResponseBackend())
+    return ResponseCache(InMemoryResponseBackend())
+
+
+music_response_cache = create_response_cache()
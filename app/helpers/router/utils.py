@@ -1,11 +1,11 @@
 from typing import Annotated
 
-from fastapi import Depends, Request
+from fastapi import Depends
 from sqlmodel import Session
 
-from app.auth.auth import AuthService
-from app.database.database import get_db
-from app.users.users import UserService
+from app.auth.auth import AsyncAuthService, AuthService
+from app.database.database import get_db, service_db_dependency
+from app.users.users import AsyncUserService, UserService
 
 
 def get_user_service(
@@ -14,8 +14,15 @@ def get_user_service(
     return UserService(db_dependency)
 
 
-def get_auth_service(request: Request) -> AuthService:
-    if isinstance(request.app.state.auth_service, AuthService):
-        return request.app.state.auth_service
-    else:
-        raise ValueError('Invalid auth client')
+def get_auth_service(
+    db_dependency: Annotated[Session, Depends(get_db)],
+) -> AuthService:
+    return AuthService(db_dependency)
+
+
+def get_async_user_service(db: service_db_dependency) -> AsyncUserService:
+    return AsyncUserService(db)
+
+
+def get_async_auth_service(db: service_db_dependency) -> AsyncAuthService:
+    return AsyncAuthService(db)
@@ -1,52 +1,101 @@
-from typing import List, Dict, Any
+import asyncio
+import base64
+from typing import Any, Dict, List, Optional, Tuple
 
 import httpx
 from fastapi import HTTPException, Depends
-from sqlalchemy.orm import Session
-from datetime import datetime
-
-from app.constant import API_BASE_URL
-from app.database.database import get_db
-from app.helpers.router.utils import get_user_service
-from app.users.users import UserService
+from sqlmodel import Session, select
+from datetime import datetime, timedelta
+
+from app.constant import (
+    API_BASE_URL,
+    CLIENT_ID,
+    CLIENT_SECRET,
+    SPOTIFY_USER_CONCURRENCY,
+    TOKEN_URL,
+)
+from app.database.async_service import AnySession, run_db
+from app.database.database import get_service_session
+from app.helpers.artist_cache import artist_cache
+from app.helpers.http import get_http_client
+from app.helpers.jobs import Progress
+from app.helpers.rate_limit import spotify_scheduler
+from app.helpers.single_flight import spotify_inflight
+from app.helpers.router.utils import get_async_user_service
+from app.users.users import AsyncUserService
 from app.models.models import MusicProfile, User
 from app.music.profile_analyzer import MusicProfileAnalyzer
+from app.recommendation.ann_index import profile_index
+from app.recommendation.feature_store import feature_store
+from app.recommendation.inverted_index import profile_postings
+from app.recommendation.lsh_index import profile_lsh
 from app.models.schema import Metrics
 
+# Spotify's multi-id artists endpoint accepts at most 50 ids
+ARTISTS_BATCH_SIZE = 50
+# Access tokens are refreshed this long before Spotify expires them
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
 
 class SpotifyClient:
     """Spotify API client for making authenticated requests"""
 
-    def __init__(self, token: str, user_service: UserService = None):
+    def __init__(
+        self,
+        token: str,
+        user_service: AsyncUserService = None,
+        http_client: httpx.AsyncClient = None,
+    ):
         self.token = token
         self.headers = {"Authorization": f"Bearer {token}"}
         self.user_service = user_service
+        # Reuse the process-wide pool so calls share keep-alive connections
+        self.http_client = http_client or get_http_client()
+        # Caps how many of this user's requests run at once during fan-out
+        self._semaphore = asyncio.Semaphore(SPOTIFY_USER_CONCURRENCY)
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send an authenticated request to the Spotify API"""
+        if method == "GET":
+            # Identical reads already in flight for this token share one response
+            params = kwargs.get("params") or {}
+            key = (self.token, path, tuple(sorted(params.items())))
+            return await spotify_inflight.do(
+                key, lambda: self._send(method, path, **kwargs)
+            )
+        return await self._send(method, path, **kwargs)
+
+    async def _send(self, method: str, path: str, **kwargs) -> httpx.Response:
+        async with self._semaphore:
+            response = await spotify_scheduler.send(
+                lambda: self.http_client.request(
+                    method, f"{API_BASE_URL}{path}", headers=self.headers, **kwargs
+                )
+            )
+        response.raise_for_status()
+        return response
 
     async def current_user_top_artists(
         self, limit: int = 20, time_range: str = "medium_term"
     ) -> Dict[str, Any]:
         """Get the current user's top artists"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{API_BASE_URL}me/top/artists",
-                headers=self.headers,
-                params={"limit": limit, "time_range": time_range},
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self._request(
+            "GET",
+            "me/top/artists",
+            params={"limit": limit, "time_range": time_range},
+        )
+        return response.json()
 
     async def current_user_top_tracks(
         self, limit: int = 20, time_range: str = "medium_term"
     ) -> Dict[str, Any]:
         """Get the current user's top tracks"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{API_BASE_URL}me/top/tracks",
-                headers=self.headers,
-                params={"limit": limit, "time_range": time_range},
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self._request(
+            "GET",
+            "me/top/tracks",
+            params={"limit": limit, "time_range": time_range},
+        )
+        return response.json()
 
     async def recommendations(
         self,
@@ -64,28 +113,48 @@ class SpotifyClient:
         if seed_tracks:
             params["seed_tracks"] = ",".join(seed_tracks[:2])
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{API_BASE_URL}recommendations", headers=self.headers, params=params
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self._request("GET", "recommendations", params=params)
+        return response.json()
 
     async def get_artist(self, artist_id: str) -> Dict[str, Any]:
         """Get Spotify catalog information for an artist"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{API_BASE_URL}artists/{artist_id}", headers=self.headers
+        artist = await artist_cache.get(artist_id)
+        if artist is None:
+            response = await self._request("GET", f"artists/{artist_id}")
+            artist = response.json()
+            await artist_cache.set_many([artist])
+        return artist
+
+    async def get_artists(self, artist_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get several artists at once, de-duplicated and batched 50 ids per call"""
+        unique_ids = list(dict.fromkeys(filter(None, artist_ids)))
+        cached = await artist_cache.get_many(unique_ids)
+        missing_ids = [artist_id for artist_id in unique_ids if artist_id not in cached]
+
+        chunks = [
+            missing_ids[i : i + ARTISTS_BATCH_SIZE]
+            for i in range(0, len(missing_ids), ARTISTS_BATCH_SIZE)
+        ]
+        responses = await asyncio.gather(
+            *(
+                self._request("GET", "artists", params={"ids": ",".join(chunk)})
+                for chunk in chunks
             )
-            response.raise_for_status()
-            return response.json()
+        )
+        # Spotify returns null entries for ids it doesn't know
+        fetched = [
+            artist
+            for response in responses
+            for artist in response.json()["artists"]
+            if artist
+        ]
+        await artist_cache.set_many(fetched)
+        return list(cached.values()) + fetched
 
     async def get_user_data(self) -> Dict[str, Any]:
         """Get the current user's Spotify profile"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{API_BASE_URL}me", headers=self.headers)
-            response.raise_for_status()
-            return response.json()
+        response = await self._request("GET", "me")
+        return response.json()
 
     async def current_user_recently_played(self, limit: int = 50) -> Dict[str, Any]:
         """Get the current user's recently played tracks
@@ -96,16 +165,14 @@ class SpotifyClient:
         Returns:
             A dictionary containing the recently played tracks
         """
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{API_BASE_URL}me/player/recently-played",
-                headers=self.headers,
-                params={
-                    "limit": min(limit, 50)
-                },  # Ensure limit doesn't exceed Spotify's max
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self._request(
+            "GET",
+            "me/player/recently-played",
+            params={
+                "limit": min(limit, 50)
+            },  # Ensure limit doesn't exceed Spotify's max
+        )
+        return response.json()
 
     async def create_playlist(
         self, user_id: str, name: str, description: str = None, public: bool = True
@@ -113,14 +180,10 @@ class SpotifyClient:
         """Create a new playlist in Spotify"""
         data = {"name": name, "public": public, "description": description}
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{API_BASE_URL}users/{user_id}/playlists",
-                headers=self.headers,
-                json=data,
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self._request(
+            "POST", f"users/{user_id}/playlists", json=data
+        )
+        return response.json()
 
     async def update_playlist(
         self,
@@ -138,82 +201,53 @@ class SpotifyClient:
         if public is not None:
             data["public"] = public
 
-        async with httpx.AsyncClient() as client:
-            response = await client.put(
-                f"{API_BASE_URL}playlists/{playlist_id}",
-                headers=self.headers,
-                json=data,
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self._request("PUT", f"playlists/{playlist_id}", json=data)
+        return response.json()
 
     async def delete_playlist(self, playlist_id: str):
         """Delete a Spotify playlist"""
-        async with httpx.AsyncClient() as client:
-            response = await client.delete(
-                f"{API_BASE_URL}playlists/{playlist_id}/followers", headers=self.headers
-            )
-            response.raise_for_status()
+        await self._request("DELETE", f"playlists/{playlist_id}/followers")
 
     async def add_tracks_to_playlist(self, playlist_id: str, track_uris: List[str]):
         """Add tracks to a Spotify playlist"""
         data = {"uris": track_uris}
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{API_BASE_URL}playlists/{playlist_id}/tracks",
-                headers=self.headers,
-                json=data,
-            )
-            response.raise_for_status()
+        await self._request("POST", f"playlists/{playlist_id}/tracks", json=data)
 
     async def clear_playlist(self, playlist_id: str):
         """Remove all tracks from a Spotify playlist"""
-        async with httpx.AsyncClient() as client:
-            # First, get all tracks in the playlist
-            tracks_response = await client.get(
-                f"{API_BASE_URL}playlists/{playlist_id}/tracks", headers=self.headers
+        # First, get all tracks in the playlist
+        tracks_response = await self._request("GET", f"playlists/{playlist_id}/tracks")
+        tracks = tracks_response.json()["items"]
+
+        # Create list of track URIs to remove
+        tracks_to_remove = [{"uri": track["track"]["uri"]} for track in tracks]
+
+        if tracks_to_remove:
+            # Remove all tracks
+            await self._request(
+                "DELETE",
+                f"playlists/{playlist_id}/tracks",
+                json={"tracks": tracks_to_remove},
             )
-            tracks_response.raise_for_status()
-            tracks = tracks_response.json()["items"]
-
-            # Create list of track URIs to remove
-            tracks_to_remove = [{"uri": track["track"]["uri"]} for track in tracks]
-
-            if tracks_to_remove:
-                # Remove all tracks
-                response = await client.delete(
-                    f"{API_BASE_URL}playlists/{playlist_id}/tracks",
-                    headers=self.headers,
-                    json={"tracks": tracks_to_remove},
-                )
-                response.raise_for_status()
 
     async def get_playlist_tracks(self, playlist_id: str) -> List[str]:
         """Get all track URIs from a playlist"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{API_BASE_URL}playlists/{playlist_id}/tracks", headers=self.headers
-            )
-            response.raise_for_status()
-            tracks = response.json()["items"]
-            return [track["track"]["uri"] for track in tracks]
+        response = await self._request("GET", f"playlists/{playlist_id}/tracks")
+        tracks = response.json()["items"]
+        return [track["track"]["uri"] for track in tracks]
 
     async def audio_features(self, track_ids: List[str]) -> List[Dict[str, Any]]:
         """Get audio features for a list of tracks"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{API_BASE_URL}audio-features",
-                headers=self.headers,
-                params={"ids": ",".join(track_ids)},
-            )
-            response.raise_for_status()
-            return response.json()["audio_features"]
+        response = await self._request(
+            "GET", "audio-features", params={"ids": ",".join(track_ids)}
+        )
+        return response.json()["audio_features"]
 
 
 async def get_spotify_client(
     user_id: str,
-    user_service: UserService = Depends(get_user_service),
+    user_service: AsyncUserService = Depends(get_async_user_service),
 ) -> SpotifyClient:
     """Get a configured Spotify client for a user"""
     # Get the user's access token from the database
@@ -223,13 +257,154 @@ async def get_spotify_client(
             status_code=401, detail="User not found or Spotify token not available"
         )
 
-    return SpotifyClient(user.spotify_token, user_service)
+    token = user.spotify_access_token or user.spotify_token
+    if user.spotify_refresh_token and token_expired(user.token_expires_at):
+        tokens = await refresh_spotify_token(user.spotify_refresh_token)
+        await user_service.update_user(user.id, tokens)
+        token = tokens["spotify_access_token"]
+    return SpotifyClient(token, user_service)
+
+
+def token_expired(expires_at: Optional[datetime]) -> bool:
+    """Whether a stored access token is past, or about to pass, its expiry"""
+    return expires_at is not None and expires_at - TOKEN_REFRESH_MARGIN <= datetime.utcnow()
+
+
+async def refresh_spotify_token(refresh_token: str) -> Dict[str, Any]:
+    """
+    Trade a refresh token for a new access token.
+    Returns the User fields to store; Spotify may also rotate the refresh token.
+    The login token in `spotify_token` is left alone, so clients stay signed in.
+    """
+    credentials = base64.b64encode(f"{CLIENT_ID}:{CLIENT_SECRET}".encode()).decode()
+    response = await get_http_client().post(
+        TOKEN_URL,
+        data={"grant_type": "refresh_token", "refresh_token": refresh_token},
+        headers={"Authorization": f"Basic {credentials}"},
+    )
+    response.raise_for_status()
+    token_info = response.json()
+    return {
+        "spotify_access_token": token_info["access_token"],
+        "spotify_refresh_token": token_info.get("refresh_token", refresh_token),
+        "token_expires_at": datetime.utcnow() + timedelta(seconds=token_info["expires_in"]),
+    }
+
+
+async def fetch_spotify_profile(
+    spotify: SpotifyClient,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Fetch a user's Spotify data without saving it.
+    Returns the User fields and the MusicProfile fields to store.
+    """
+    analyzer = MusicProfileAnalyzer(spotify)
+
+    # Fetch every independent Spotify read in one concurrent round trip
+    (
+        user_data,
+        top_tracks_data,
+        top_artists_data,
+        recent_tracks_data,
+    ) = await asyncio.gather(
+        spotify.get_user_data(),
+        spotify.current_user_top_tracks(limit=50, time_range="long_term"),
+        spotify.current_user_top_artists(limit=50, time_range="long_term"),
+        spotify.current_user_recently_played(limit=50),
+    )
+
+    # Extract core music data
+    top_artists = [
+        {
+            "name": artist["name"],
+            "id": artist["id"],
+            "popularity": artist["popularity"],
+            "genres": artist["genres"],
+        }
+        for artist in top_artists_data["items"]
+    ]
+
+    top_tracks = [
+        {
+            "name": track["name"],
+            "id": track["id"],
+            "artist": track["artists"][0]["name"],
+            "album": track["album"]["name"],
+            "popularity": track["popularity"],
+        }
+        for track in top_tracks_data["items"]
+    ]
+
+    genres = list(
+        set(
+            [
+                genre
+                for artist in top_artists_data["items"]
+                for genre in artist.get("genres", [])
+            ]
+        )
+    )
+
+    user_update = {
+        "spotify_id": user_data["id"],
+        "display_name": user_data["display_name"],
+        "spotify_url": user_data["external_urls"]["spotify"],
+        "spotify_image_url": (
+            user_data["images"][0]["url"] if user_data.get("images") else None
+        ),
+        "country": user_data.get("country"),
+        "last_spotify_sync": datetime.utcnow(),
+    }
+
+    # Calculate all profile metrics from the payloads fetched above
+    profile_metrics: Metrics = await analyzer.get_complete_profile_metrics(
+        top_tracks=top_tracks_data,
+        top_artists=top_artists_data,
+        recent_tracks=recent_tracks_data,
+    )
+
+    profile_data = {
+        "top_artists": top_artists,
+        "top_tracks": top_tracks,
+        "genres": genres,
+        "favorite_decades": profile_metrics.favorite_decades,
+        "energy_score": profile_metrics.energy_score,
+        "danceability_score": profile_metrics.danceability_score,
+        "diversity_score": profile_metrics.diversity_score,
+        "obscurity_score": profile_metrics.obscurity_score,
+        "listening_history": profile_metrics.listening_patterns,
+    }
+    return user_update, profile_data
+
+
+def profile_columns(profile_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    MusicProfile column values for fetched profile data. Top artists and
+    tracks are stored by name, as their columns are string arrays.
+    """
+    columns = dict(profile_data)
+    for field in ("top_artists", "top_tracks"):
+        if columns.get(field):
+            columns[field] = [
+                item["name"] if isinstance(item, dict) else item for item in columns[field]
+            ]
+    return columns
+
+
+def index_music_profile(music_profile: MusicProfile) -> None:
+    """Replace the profile in this worker's recommendation indexes"""
+    profile_index.upsert(music_profile.dict())
+    profile_postings.upsert(music_profile.dict())
+    profile_lsh.upsert(music_profile.user_id, music_profile.minhash)
+    if feature_store.is_loaded:
+        feature_store.upsert(music_profile.dict())
 
 
 async def sync_user_spotify_data(
         user_id: str,
-        user_service: UserService = Depends(get_user_service),
-        db: Session = Depends(get_db)
+        user_service: AsyncUserService = Depends(get_async_user_service),
+        db: AnySession = Depends(get_service_session),
+        progress: Optional[Progress] = None,
     ) -> None:
     """
     Sync user's Spotify data with our database.
@@ -237,94 +412,48 @@ async def sync_user_spotify_data(
     - User profile (spotify_id, display_name, etc.)
     - Music profile (top artists, tracks, genres, etc.)
     """
+    progress = progress or _no_progress
     spotify = await get_spotify_client(user_id, user_service)
-    analyzer = MusicProfileAnalyzer(spotify)
 
     try:
-        # Get user profile data
-        user_data = await spotify.get_user_data()
-
-        # Get top artists and tracks data
-        top_tracks_data = await spotify.current_user_top_tracks(
-            limit=50, time_range="long_term"
-        )
-        top_artists_data = await spotify.current_user_top_artists(
-            limit=50, time_range="long_term"
-        )
-
-        # Extract core music data
-        top_artists = [
-            {
-                "name": artist["name"],
-                "id": artist["id"],
-                "popularity": artist["popularity"],
-                "genres": artist["genres"],
-            }
-            for artist in top_artists_data["items"]
-        ]
+        await progress("fetching spotify profile")
+        user_update, profile_data = await fetch_spotify_profile(spotify)
+        await progress("saving profile")
+        await user_service.update_user(user_id, user_update)
 
-        top_tracks = [
-            {
-                "name": track["name"],
-                "id": track["id"],
-                "artist": track["artists"][0]["name"],
-                "album": track["album"]["name"],
-                "popularity": track["popularity"],
-            }
-            for track in top_tracks_data["items"]
-        ]
+        # Update music profile with core data and metrics
+        music_profile = await run_db(db, _save_music_profile, user_id, profile_data)
+        index_music_profile(music_profile)
 
-        genres = list(
-            set(
-                [
-                    genre
-                    for artist in top_artists_data["items"]
-                    for genre in artist.get("genres", [])
-                ]
-            )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to sync Spotify data: {str(e)}"
         )
 
-        # Update user data
-        user_update = {
-            "spotify_id": user_data["id"],
-            "display_name": user_data["display_name"],
-            "spotify_url": user_data["external_urls"]["spotify"],
-            "spotify_image_url": (
-                user_data["images"][0]["url"] if user_data.get("images") else None
-            ),
-            "country": user_data.get("country"),
-            "last_spotify_sync": datetime.utcnow(),
-        }
-        await user_service.update_user_profile(user_id, **user_update)
 
-        # Calculate all profile metrics
-        profile_metrics: Metrics = await analyzer.get_complete_profile_metrics()
+async def _no_progress(stage: str) -> None:
+    pass
 
-        # Get or create music profile
-        music_profile = (
-            db.query(MusicProfile).filter(MusicProfile.user_id == user_id).first()
-        )
+
+def _save_music_profile(
+    session: Session, user_id: str, profile_data: Dict[str, Any]
+) -> MusicProfile:
+    """Create or update the user's music profile in one commit"""
+    try:
+        music_profile = session.exec(
+            select(MusicProfile).where(MusicProfile.user_id == user_id)
+        ).first()
         if not music_profile:
             music_profile = MusicProfile(user_id=user_id)
-            db.add(music_profile)
 
-        # Update music profile with core data and metrics
-        music_profile.top_artists = top_artists
-        music_profile.top_tracks = top_tracks
-        music_profile.genres = genres
-        music_profile.favorite_decades = profile_metrics.favorite_decades
-        music_profile.energy_score = profile_metrics.energy_score
-        music_profile.danceability_score = profile_metrics.danceability_score
-        music_profile.diversity_score = profile_metrics.diversity_score
-        music_profile.obscurity_score = profile_metrics.obscurity_score
-        music_profile.listening_history = profile_metrics.listening_patterns
+        for key, value in profile_columns(profile_data).items():
+            setattr(music_profile, key, value)
         music_profile.updated_at = datetime.utcnow()
 
-        # Commit all changes
-        db.commit()
-
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(
-            status_code=500, detail=f"Failed to sync Spotify data: {str(e)}"
-        )
+        session.add(music_profile)
+        session.commit()
+        session.refresh(music_profile)
+        return music_profile
+    except Exception:
+        session.rollback()
+        raise
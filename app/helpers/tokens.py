@@ -0,0 +1,6 @@
+import hashlib
+
+
+def hash_token(token: str) -> str:
+    """Stable digest of an auth token, used for lookups instead of the raw value"""
+    return hashlib.sha256(token.encode()).hexdigest()
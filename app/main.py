@@ -1,15 +1,23 @@
+import asyncio
 from contextlib import asynccontextmanager
-from typing import AsyncIterator, TypedDict
+from typing import AsyncIterator
 
-import httpx
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from sqlmodel import Session
 from starlette.middleware.sessions import SessionMiddleware
 
-from app.auth.auth import AuthService
-from app.users.users import UserService
-from app.database.database import create_db_and_tables, engine
+from app.database.database import create_db_and_tables, dispose_async_engine, engine
+from app.helpers.http import close_http_client, get_http_client
+from app.music.music import spotify_sync_queue
+from app.music.refresh import profile_refresher
+from app.realtime.handlers import manager as realtime_manager
+from app.realtime.presence import presence
+from app.recommendation.ann_index import profile_index
+from app.recommendation.compatibility import compatibility_refresher
+from app.recommendation.feature_store import feature_store
+from app.recommendation.inverted_index import rebuild as rebuild_postings
+from app.recommendation.lsh_index import rebuild as rebuild_lsh
+from app.recommendation.music_recommender import recommender, recommender_refitter
 
 from app.connections.router import router as connections_router
 from app.recommendation.router import router as recommendation_router
@@ -17,25 +25,51 @@ from app.auth.router import router as auth_router
 from app.playlists.router import router as playlist_router
 from app.users.router import router as user_router
 from app.moodrooms.router import router as moodroom_router
+from app.music.router import router as music_router
 from app.realtime.router import router as websocket_router
-
-
-class State(TypedDict):
-    user_service: UserService
-    auth_service: AuthService
+from app.stats.router import router as stats_router
 
 
 @asynccontextmanager
-async def lifespan(app: FastAPI) -> AsyncIterator[State]:
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     create_db_and_tables()
-    app.state.http_client = httpx.AsyncClient()
-    # Create a database session and pass it to services
-    with Session(engine) as session:
-        app.state.user_service = UserService(session)
-        app.state.auth_service = AuthService(session)
-        yield {'user_service': app.state.user_service, 'auth_service': app.state.auth_service}
+    # One pooled client for the whole process, shared with SpotifyClient
+    app.state.http_client = get_http_client()
+    # Memory-map the prebuilt recommendation index and feature store, if any
+    profile_index.load()
+    if feature_store.load():
+        recommender.use_store(feature_store)
+    # Build the posting lists and LSH buckets off the event loop;
+    # recommendations score every profile until they are ready
+    index_builds = [
+        asyncio.create_task(asyncio.to_thread(rebuild))
+        for rebuild in (rebuild_postings, rebuild_lsh)
+    ]
+    # Fit the shared recommender's vocabularies, then refit periodically
+    recommender_refitter.start()
+    # Keep user_compatibility current for profiles that changed
+    compatibility_refresher.start()
+    # Workers for queued Spotify syncs
+    spotify_sync_queue.start()
+    # Re-sync profiles whose last Spotify sync is too old
+    profile_refresher.start()
+    # Room broadcasts from other workers (see REALTIME_BROKER)
+    await realtime_manager.start()
+    # Checkpoint mood room presence to room_participants
+    presence.start()
+    # Services get a pooled session per request (see get_db)
+    yield
 
-    await app.state.http_client.aclose()
+    await presence.stop()
+    await realtime_manager.stop()
+    await profile_refresher.stop()
+    await spotify_sync_queue.stop()
+    await compatibility_refresher.stop()
+    await recommender_refitter.stop()
+    await asyncio.gather(*index_builds, return_exceptions=True)
+    await close_http_client()
+    engine.dispose()
+    await dispose_async_engine()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -60,4 +94,6 @@ app.include_router(
 app.include_router(playlist_router, prefix='/playlists', tags=['Playlists'])
 app.include_router(user_router, prefix='/users', tags=['Users'])
 app.include_router(moodroom_router, prefix='/mood-rooms', tags=['Mood Rooms'])
+app.include_router(music_router, prefix='/music', tags=['Music'])
 app.include_router(websocket_router, prefix='/ws', tags=['Realtime'])
+app.include_router(stats_router, prefix='/stats', tags=['Stats'])
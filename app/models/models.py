@@ -2,16 +2,30 @@ from datetime import datetime
 from typing import List, Optional, Dict, Any
 from uuid import UUID, uuid4
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import Column, ARRAY, String, JSON, DateTime
+from sqlalchemy import BigInteger, Column, Index, String, JSON, DateTime, event
+# Postgres ARRAY: supports the @> / && operators GIN indexes serve
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from app.helpers.minhash import INDEXED_FIELDS, minhash_signature, profile_terms
+from app.helpers.tokens import hash_token
 
 
 class User(SQLModel, table=True):
     __tablename__ = "users"
+    __table_args__ = (
+        # Keyset pagination over stale profiles (see app.music.refresh)
+        Index("ix_users_last_spotify_sync_id", "last_spotify_sync", "id"),
+    )
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     email: str = Field(unique=True, index=True)
     spotify_id: Optional[str] = Field(unique=True, default=None)
     spotify_token: Optional[str] = Field(default=None)
+    # sha256 of spotify_token, set on every flush; auth looks users up by it
+    spotify_token_hash: Optional[str] = Field(default=None, index=True)
+    # Access token refreshed server-side; spotify_token stays the client's
+    # login token, so refreshing never logs the client out
+    spotify_access_token: Optional[str] = Field(default=None)
     spotify_refresh_token: Optional[str] = Field(default=None)
     token_expires_at: Optional[datetime] = Field(default=None)
 
@@ -36,8 +50,21 @@ class User(SQLModel, table=True):
     playlists: Optional[List["Playlist"]] = Relationship(back_populates="user")
 
 
+@event.listens_for(User, "before_insert")
+@event.listens_for(User, "before_update")
+def _hash_spotify_token(mapper, connection, target: User) -> None:
+    target.spotify_token_hash = (
+        hash_token(target.spotify_token) if target.spotify_token else None
+    )
+
+
 class MusicProfile(SQLModel, table=True):
     __tablename__ = "music_profiles"
+    __table_args__ = (
+        Index("ix_music_profiles_genres_gin", "genres", postgresql_using="gin"),
+        Index("ix_music_profiles_top_artists_gin", "top_artists", postgresql_using="gin"),
+        Index("ix_music_profiles_top_tracks_gin", "top_tracks", postgresql_using="gin"),
+    )
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     user_id: UUID = Field(foreign_key="users.id", unique=True)
@@ -67,6 +94,11 @@ class MusicProfile(SQLModel, table=True):
     diversity_score: Optional[float] = Field(default=None)
     obscurity_score: Optional[float] = Field(default=None)
 
+    # MinHash of artists, genres and tracks, set on every flush (see LSHIndex)
+    minhash: Optional[List[int]] = Field(
+        default=None, sa_column=Column(ARRAY(BigInteger))
+    )
+
     # Timestamps
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -75,6 +107,14 @@ class MusicProfile(SQLModel, table=True):
     user: User = Relationship(back_populates="music_profile")
 
 
+@event.listens_for(MusicProfile, "before_insert")
+@event.listens_for(MusicProfile, "before_update")
+def _sketch_music_profile(mapper, connection, target: MusicProfile) -> None:
+    target.minhash = minhash_signature(
+        profile_terms({field: getattr(target, field) for field in INDEXED_FIELDS})
+    )
+
+
 class Connection(SQLModel, table=True):
     __tablename__ = "connections"
 
@@ -109,6 +149,26 @@ class Connection(SQLModel, table=True):
     )
 
 
+class CompatibilityScore(SQLModel, table=True):
+    """
+    Precomputed similarity of user_id's profile to other_user_id's, kept for
+    each user's top matches and refreshed when either profile changes
+    """
+
+    __tablename__ = "user_compatibility"
+    __table_args__ = (
+        # A user's best matches: range scan in score order
+        Index("ix_user_compatibility_user_score", "user_id", "overall_similarity"),
+    )
+
+    user_id: UUID = Field(foreign_key="users.id", primary_key=True)
+    other_user_id: UUID = Field(foreign_key="users.id", primary_key=True, index=True)
+    overall_similarity: float
+    # Per-component similarities, as in UserCompatibility
+    breakdown: Optional[Dict] = Field(default=None, sa_column=Column(JSON))
+    computed_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
 class MoodRoom(SQLModel, table=True):
     __tablename__ = "mood_rooms"
 
@@ -127,6 +187,24 @@ class MoodRoom(SQLModel, table=True):
     owner: User = Relationship(back_populates="mood_rooms")
 
 
+class RoomParticipant(SQLModel, table=True):
+    """
+    Who is in each mood room, checkpointed from the in-memory presence
+    registry. Rows not seen for a few checkpoints belong to a worker that
+    went away and are deleted.
+    """
+
+    __tablename__ = "room_participants"
+
+    # No foreign key: realtime rooms are not required to be MoodRoom rows
+    room_id: UUID = Field(primary_key=True)
+    user_id: UUID = Field(foreign_key="users.id", primary_key=True)
+    name: Optional[str] = Field(default=None)
+    avatar_url: Optional[str] = Field(default=None)
+    joined_at: datetime = Field(default_factory=datetime.utcnow)
+    last_seen_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
 class Playlist(SQLModel, table=True):
     __tablename__ = "playlists"
 
@@ -158,3 +236,16 @@ class Playlist(SQLModel, table=True):
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat(),
         }
+
+
+class ArtistMetadata(SQLModel, table=True):
+    """Cached Spotify artist payloads shared by all workers"""
+
+    __tablename__ = "artist_metadata"
+
+    id: str = Field(primary_key=True)  # Spotify artist id
+    name: Optional[str] = Field(default=None)
+    genres: Optional[List[str]] = Field(default=None, sa_column=Column(ARRAY(String)))
+    popularity: Optional[int] = Field(default=None)
+    data: Optional[Dict] = Field(default=None, sa_column=Column(JSON))
+    fetched_at: datetime = Field(default_factory=datetime.utcnow, index=True)
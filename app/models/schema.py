@@ -123,3 +123,17 @@ class PlaylistResponse(PlaylistBase):
 
     class Config:
         orm_mode = True
+
+
+class Job(SQLModel):
+    """Status of a background job, e.g. a Spotify sync"""
+
+    id: str
+    kind: str
+    key: str  # at most one active job per key, e.g. per user id
+    status: str = "queued"  # queued, running, succeeded or failed
+    progress: Optional[str] = None  # the stage a running job is at
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -8,6 +8,8 @@ from app.auth.auth import get_authenticated_user
 
 from app.database.database import get_db
 from app.models.models import MoodRoom, User
+from app.realtime.models import WebSocketUser
+from app.realtime.presence import presence
 
 router = APIRouter()
 
@@ -48,10 +50,8 @@ async def join_room(
     if not room:
         raise HTTPException(status_code=404, detail="Mood room not found")
 
-    # TODO Logic to add user to room participants
-    # This will depend on how you're tracking room participants
-    # You might want to create a room_participants table
-
+    # Presence follows the room's websocket: connecting to it is what
+    # joins, and the socket closing is what leaves
     return {"message": "Successfully joined the room"}
 
 
@@ -67,27 +67,25 @@ async def leave_room(
     if not room:
         raise HTTPException(status_code=404, detail="Mood room not found")
 
-    # TODO Logic to remove user from room participants
-
     return {"message": "Successfully left the room"}
 
 
-@router.get("/{room_id}/users", response_model=List[User])
+@router.get("/{room_id}/users", response_model=List[WebSocketUser])
 async def get_room_users(
     room_id: UUID, db: Session = Depends(get_db),
     current_user: User = Depends(get_authenticated_user)
 ):
     """Get all users in a mood room"""
-    # Check if room exists
+    participants = await presence.all_participants(room_id)
+    if participants:
+        return participants
+
+    # Only an empty room needs the database, to tell it from a missing one
     room_statement = select(MoodRoom).where(MoodRoom.id == room_id)
     room = db.exec(room_statement).first()
     if not room:
         raise HTTPException(status_code=404, detail="Mood room not found")
-
-    # TODO Logic to get room participants
-    # This will depend on your data model for tracking participants
-
-    return []  # Return list of participants
+    return []
 
 
 # @router.post("/{room_id}/track")
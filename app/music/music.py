@@ -1,4 +1,5 @@
-from typing import List, Optional
+import asyncio
+from typing import Any, Dict, List, Optional
 from uuid import UUID
 from collections import Counter
 
@@ -13,20 +14,43 @@ from app.models.schema import (
     MutualMusicInterests,
     MusicRecommendationsResponse,
     TrackRecommendation,
+    Job,
 )
-from app.helpers.spotify import get_spotify_client
+from app.constant import SPOTIFY_SYNC_WORKERS
+from app.database.async_service import AnySession, run_db
+from app.database.database import open_service_session
+from app.helpers.jobs import Progress, create_job_queue
+from app.helpers.response_cache import music_response_cache
+from app.helpers.spotify import get_spotify_client, sync_user_spotify_data
+from app.users.users import AsyncUserService
+
+# Top-artist reads always ask Spotify for the same page so concurrent
+# endpoints coalesce into one upstream call; callers slice what they need
+TOP_ARTISTS_FETCH_LIMIT = 50
+
+
+async def _get_top_artists_payload(user_id: UUID, time_range: str) -> Dict[str, Any]:
+    """Get the user's top artists payload from cache, or Spotify on a miss"""
+
+    async def fetch() -> Dict[str, Any]:
+        # Own session: stale entries are refreshed after the request has ended
+        async with open_service_session() as session:
+            spotify = await get_spotify_client(user_id, AsyncUserService(session))
+        return await spotify.current_user_top_artists(
+            limit=TOP_ARTISTS_FETCH_LIMIT, time_range=time_range
+        )
+
+    return await music_response_cache.get_or_fetch(
+        f"{user_id}:top_artists:{time_range}", fetch
+    )
 
 
 async def get_user_top_artists(
-    db: Session, user_id: UUID, time_range: str = "medium_term", limit: int = 20
+    db: AnySession, user_id: UUID, time_range: str = "medium_term", limit: int = 20
 ) -> TopArtistsResponse:
     """Get user's top artists from Spotify"""
-    spotify = await get_spotify_client(user_id, db)
-
     try:
-        top_artists = await spotify.current_user_top_artists(
-            limit=limit, time_range=time_range
-        )
+        top_artists = await _get_top_artists_payload(user_id, time_range)
 
         artists = [
             Artist(
@@ -36,12 +60,14 @@ async def get_user_top_artists(
                 popularity=artist["popularity"],
                 image_url=artist["images"][0]["url"] if artist["images"] else None,
             )
-            for artist in top_artists["items"]
+            for artist in top_artists["items"][:limit]
         ]
 
         return TopArtistsResponse(
             items=artists, total=len(artists), time_range=time_range
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error fetching top artists: {str(e)}"
@@ -49,16 +75,11 @@ async def get_user_top_artists(
 
 
 async def get_user_top_genres(
-    db: Session, user_id: UUID, time_range: str = "medium_term"
+    db: AnySession, user_id: UUID, time_range: str = "medium_term"
 ) -> TopGenresResponse:
     """Get user's top genres based on their top artists"""
-    spotify = await get_spotify_client(user_id, db)
-
     try:
-        top_artists = await spotify.current_user_top_artists(
-            limit=50,  # Get more artists for better genre analysis
-            time_range=time_range,
-        )
+        top_artists = await _get_top_artists_payload(user_id, time_range)
 
         # Extract and count genres
         all_genres = []
@@ -71,6 +92,8 @@ async def get_user_top_genres(
         top_genres = [genre for genre, _ in genre_counts.most_common(20)]
 
         return TopGenresResponse(genres=top_genres, time_range=time_range)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error fetching top genres: {str(e)}"
@@ -78,15 +101,17 @@ async def get_user_top_genres(
 
 
 async def get_music_recommendations(
-    db: Session, user_id: UUID, limit: int = 20
+    db: AnySession, user_id: UUID, limit: int = 20
 ) -> MusicRecommendationsResponse:
     """Get personalized music recommendations"""
-    spotify = await get_spotify_client(user_id, db)
+    spotify = await get_spotify_client(user_id, AsyncUserService(db))
 
     try:
-        # Get user's top artists and genres
-        top_artists_resp = await get_user_top_artists(db, user_id, limit=5)
-        top_genres_resp = await get_user_top_genres(db, user_id)
+        # Get user's top artists and genres (both share one top-artists read)
+        top_artists_resp, top_genres_resp = await asyncio.gather(
+            get_user_top_artists(db, user_id, limit=5),
+            get_user_top_genres(db, user_id),
+        )
 
         seed_artists = [artist.id for artist in top_artists_resp.items[:2]]
         seed_genres = top_genres_resp.genres[:3]
@@ -122,15 +147,12 @@ async def get_music_recommendations(
 
 
 async def get_mutual_music_interests(
-    db: Session, user1_id: UUID, user2_id: UUID
+    db: AnySession, user1_id: UUID, user2_id: UUID
 ) -> MutualMusicInterests:
     """Get mutual music interests between two users"""
     # Get both users' profiles
-    statement1 = select(MusicProfile).where(MusicProfile.user_id == user1_id)
-    statement2 = select(MusicProfile).where(MusicProfile.user_id == user2_id)
-
-    profile1 = db.exec(statement1).first()
-    profile2 = db.exec(statement2).first()
+    profile1 = await run_db(db, find_music_profile, user1_id)
+    profile2 = await run_db(db, find_music_profile, user2_id)
 
     if not profile1 or not profile2:
         raise HTTPException(
@@ -177,30 +199,19 @@ async def get_mutual_music_interests(
     )
 
 
-async def sync_user_spotify_data(user_id: UUID, db: Session):
-    """Sync user's Spotify data with our database"""
-    # Get user's profile
-    statement = select(MusicProfile).where(MusicProfile.user_id == user_id)
-    profile = db.exec(statement).first()
-
-    if not profile:
-        raise HTTPException(status_code=404, detail="User profile not found")
+async def _run_sync_job(job: Job, progress: Progress) -> None:
+    # The request that queued the job is long gone, so use a fresh session
+    user_id = UUID(job.key)
+    # A sync is an explicit refresh, so drop everything cached for the user
+    await music_response_cache.invalidate(f"{user_id}:")
+    async with open_service_session() as db:
+        await sync_user_spotify_data(user_id, AsyncUserService(db), db, progress)
 
-    try:
-        # Get user's top artists and genres
-        top_artists = await get_user_top_artists(db, user_id, limit=50)
-        top_genres = await get_user_top_genres(db, user_id)
 
-        # Update profile with new data
-        profile.top_artists = [artist.model_dump() for artist in top_artists.items]
-        profile.genres = top_genres.genres
+# Syncs run in the background, one at a time per user
+spotify_sync_queue = create_job_queue("spotify-sync", _run_sync_job, SPOTIFY_SYNC_WORKERS)
 
-        # Save changes
-        db.add(profile)
-        db.commit()
-        db.refresh(profile)
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Error syncing Spotify data: {str(e)}"
-        )
+def find_music_profile(session: Session, user_id: UUID) -> Optional[MusicProfile]:
+    statement = select(MusicProfile).where(MusicProfile.user_id == user_id)
+    return session.exec(statement).first()
@@ -1,8 +1,10 @@
-from typing import List, Dict, Any
+import asyncio
+from typing import List, Dict, Any, Optional
 from datetime import datetime
 import statistics
 from collections import Counter
 
+from app.helpers.artist_cache import artist_cache
 from app.models.schema import Metrics
 
 
@@ -43,6 +45,15 @@ class MusicProfileAnalyzer:
             "recent_tracks": [],
         }
 
+        # Resolve every artist's genres up front in one batched lookup
+        artist_ids = [
+            track.get("track", {}).get("artists", [{}])[0].get("id")
+            for track in recent_tracks
+            if track.get("track")
+        ]
+        artists = await self.spotify.get_artists(artist_ids)
+        artist_genres = {artist["id"]: artist.get("genres", []) for artist in artists}
+
         for track in recent_tracks:
             # Extract basic track info
             track_data = track.get("track", {})
@@ -64,12 +75,10 @@ class MusicProfileAnalyzer:
             if track_id:
                 patterns["most_played"][track_id] += 1
 
-            # Genre analysis (requires additional API call)
+            # Genre analysis
             artist_id = track_data.get("artists", [{}])[0].get("id")
-            if artist_id:
-                artist_data = await self.spotify.artist(artist_id)
-                for genre in artist_data.get("genres", []):
-                    patterns["by_genre"][genre] += 1
+            for genre in artist_genres.get(artist_id, []):
+                patterns["by_genre"][genre] += 1
 
             # Add to recent tracks
             patterns["recent_tracks"].append(
@@ -204,24 +213,48 @@ class MusicProfileAnalyzer:
             + (mainstream_score * 0.2)
         )
 
-    async def get_complete_profile_metrics(self) -> Metrics:
+    async def get_complete_profile_metrics(
+        self,
+        top_tracks: Optional[Dict[str, Any]] = None,
+        top_artists: Optional[Dict[str, Any]] = None,
+        recent_tracks: Optional[Dict[str, Any]] = None,
+    ) -> Metrics:
         """
         Calculate all profile metrics in one go.
+        Payloads already fetched by the caller are reused; missing ones are
+        fetched concurrently.
         Returns a complete profile including all metrics and patterns.
         """
+
+        async def _reuse(payload: Dict[str, Any]) -> Dict[str, Any]:
+            return payload
+
         # Get all necessary data
-        top_tracks = await self.spotify.current_user_top_tracks(
-            limit=50, time_range="long_term"
-        )
-        top_artists = await self.spotify.current_user_top_artists(
-            limit=50, time_range="long_term"
+        top_tracks, top_artists, recent_tracks = await asyncio.gather(
+            _reuse(top_tracks)
+            if top_tracks is not None
+            else self.spotify.current_user_top_tracks(
+                limit=50, time_range="long_term"
+            ),
+            _reuse(top_artists)
+            if top_artists is not None
+            else self.spotify.current_user_top_artists(
+                limit=50, time_range="long_term"
+            ),
+            _reuse(recent_tracks)
+            if recent_tracks is not None
+            else self.spotify.current_user_recently_played(limit=50),
         )
-        recent_tracks = await self.spotify.current_user_recently_played(limit=50)
 
-        # Get audio features for top tracks
+        # Top artists are full artist objects, so they warm the genre cache
+        # before listening patterns look up recently played artists
+        await artist_cache.set_many(top_artists.get("items", []))
+
+        # Audio features and listening patterns are independent of each other
         track_ids = [track["id"] for track in top_tracks.get("items", [])]
-        audio_features = (
-            await self.spotify.audio_features(track_ids) if track_ids else []
+        audio_features, listening_patterns = await asyncio.gather(
+            self.spotify.audio_features(track_ids) if track_ids else _reuse([]),
+            self.analyze_listening_patterns(recent_tracks.get("items", [])),
         )
 
         # Extract genres from top artists
@@ -236,9 +269,8 @@ class MusicProfileAnalyzer:
             "favorite_decades": await self.analyze_favorite_decades(
                 top_tracks.get("items", [])
             ),
-            "listening_pattern_similarity": await self.analyze_listening_patterns(
-                recent_tracks.get("items", [])
-            ),
+            "listening_patterns": listening_patterns,
+            "listening_history": listening_patterns["recent_tracks"],
             "energy_score": await self.calculate_energy_score(audio_features),
             "danceability_score": await self.calculate_danceability_score(
                 audio_features
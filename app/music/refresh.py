@@ -0,0 +1,339 @@
+"""
+Scheduled refresh of stale music profiles.
+
+Profiles otherwise only change when their user syncs, so a background job
+walks every user whose `last_spotify_sync` is older than
+PROFILE_REFRESH_MAX_AGE, never-synced users first. Users are read in
+keyset-paginated batches ordered by (last_spotify_sync, id), served by
+ix_users_last_spotify_sync_id. Each batch is fetched from Spotify
+concurrently, at most PROFILE_REFRESH_RATE profiles a second, and written
+back with one bulk upsert. Expired access tokens are refreshed on the way,
+and the new tokens saved with the rest of the user's fields; the login
+token clients authenticate with is never replaced.
+
+Run once from the command line with `python -m app.music.refresh`.
+"""
+import asyncio
+import logging
+import time
+import zlib
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from uuid import UUID, uuid4
+
+import httpx
+from sqlalchemy import func, text, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+
+from app.constant import (
+    PROFILE_REFRESH_BATCH_SIZE,
+    PROFILE_REFRESH_CONCURRENCY,
+    PROFILE_REFRESH_ENABLED,
+    PROFILE_REFRESH_INTERVAL,
+    PROFILE_REFRESH_MAX_AGE,
+    PROFILE_REFRESH_RATE,
+)
+from app.database.async_service import run_db
+from app.database.database import engine, open_service_session
+from app.helpers.minhash import minhash_signature, profile_terms
+from app.helpers.rate_limit import TokenBucket
+from app.helpers.spotify import (
+    SpotifyClient,
+    fetch_spotify_profile,
+    index_music_profile,
+    profile_columns,
+    refresh_spotify_token,
+    token_expired,
+)
+from app.models.models import MusicProfile, User
+
+logger = logging.getLogger(__name__)
+
+# Only one worker refreshes at a time (Postgres advisory lock key)
+REFRESH_LOCK_KEY = zlib.crc32(b"music_profile_refresh")
+
+# (last_spotify_sync, id) of the last user of the previous page
+Cursor = Tuple[Optional[datetime], UUID]
+# (user id, last_spotify_sync, access token, spotify_refresh_token, token_expires_at)
+StaleUser = Tuple[UUID, Optional[datetime], str, Optional[str], Optional[datetime]]
+# User fields and MusicProfile fields fetched for one user
+Fetched = Tuple[Dict[str, Any], Dict[str, Any]]
+
+
+def stale_users_page(
+    session: Session, cutoff: datetime, after: Optional[Cursor], limit: int
+) -> List[StaleUser]:
+    """
+    Up to `limit` users with a token whose last sync is before `cutoff`,
+    never-synced users first, continuing after the `after` cursor.
+    """
+    statement = select(
+        User.id,
+        User.last_spotify_sync,
+        func.coalesce(User.spotify_access_token, User.spotify_token),
+        User.spotify_refresh_token,
+        User.token_expires_at,
+    ).where(User.spotify_token.is_not(None))
+    users: List[StaleUser] = []
+    if after is None or after[0] is None:
+        never_synced = (
+            statement.where(User.last_spotify_sync.is_(None)).order_by(User.id).limit(limit)
+        )
+        if after is not None:
+            never_synced = never_synced.where(User.id > after[1])
+        users = list(session.exec(never_synced))
+        if len(users) == limit:
+            return users
+        after = None
+
+    synced = statement.where(User.last_spotify_sync < cutoff)
+    if after is not None:
+        synced = synced.where(tuple_(User.last_spotify_sync, User.id) > tuple_(*after))
+    synced = synced.order_by(User.last_spotify_sync, User.id).limit(limit - len(users))
+    return users + list(session.exec(synced))
+
+
+def save_profiles(session: Session, fetched: Dict[UUID, Fetched]) -> List[MusicProfile]:
+    """Write a batch of fetched users and profiles with one bulk upsert each"""
+    now = datetime.utcnow()
+    users = []
+    for user_id, (user_update, _) in fetched.items():
+        users.append({"id": user_id, **user_update, "updated_at": now})
+    session.exec(update(User), params=users)
+
+    rows = []
+    for user_id, (_, profile_data) in fetched.items():
+        columns = profile_columns(profile_data)
+        rows.append({
+            "id": uuid4(),
+            "user_id": user_id,
+            **columns,
+            # Core inserts skip the mapper events, so sketch the profiles here
+            "minhash": minhash_signature(profile_terms(columns)),
+            "created_at": now,
+            "updated_at": now,
+        })
+    dialect = postgresql if session.get_bind().dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(MusicProfile).values(rows)
+    updated = set(rows[0]) - {"id", "user_id", "created_at"}
+    session.exec(
+        statement.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={key: statement.excluded[key] for key in updated},
+        )
+    )
+    session.commit()
+    return list(
+        session.exec(select(MusicProfile).where(MusicProfile.user_id.in_(list(fetched))))
+    )
+
+
+def _error_reason(error: Exception) -> str:
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"http_{error.response.status_code}"
+    return type(error).__name__
+
+
+@asynccontextmanager
+async def _refresh_lock() -> AsyncIterator[bool]:
+    """
+    Whether this worker may refresh. The session-level advisory lock is held
+    on its own connection for the whole run, which spans many transactions.
+    """
+    if engine.dialect.name != "postgresql":
+        yield True
+        return
+    connection = await asyncio.to_thread(engine.connect)
+    try:
+        locked = await asyncio.to_thread(
+            lambda: connection.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": REFRESH_LOCK_KEY}
+            ).scalar()
+        )
+        try:
+            yield locked
+        finally:
+            if locked:
+                await asyncio.to_thread(
+                    connection.execute,
+                    text("SELECT pg_advisory_unlock(:key)"),
+                    {"key": REFRESH_LOCK_KEY},
+                )
+    finally:
+        await asyncio.to_thread(connection.close)
+
+
+class ProfileRefresher:
+    """Refreshes stale profiles every `interval` seconds in the background"""
+
+    def __init__(
+        self,
+        interval: float = PROFILE_REFRESH_INTERVAL,
+        max_age: float = PROFILE_REFRESH_MAX_AGE,
+        batch_size: int = PROFILE_REFRESH_BATCH_SIZE,
+        concurrency: int = PROFILE_REFRESH_CONCURRENCY,
+        rate: float = PROFILE_REFRESH_RATE,
+    ):
+        self.interval = interval
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, max(1, concurrency))
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.skipped = 0
+        self.refreshed = 0
+        self.failed = 0
+        self.tokens_refreshed = 0
+        self.errors: Counter = Counter()
+        self.busy_seconds = 0.0
+        self.last_run: Dict[str, Any] = {}
+
+    async def _fetch_batch(self, users: List[StaleUser]) -> Dict[UUID, Fetched]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(user: StaleUser) -> Optional[Fetched]:
+            user_id, _, token, refresh_token, expires_at = user
+            async with semaphore:
+                await self.bucket.acquire()
+                try:
+                    return await self._fetch_profile(token, refresh_token, expires_at)
+                except Exception as e:
+                    # e.g. a revoked token; the user stays stale and is retried
+                    self.errors[_error_reason(e)] += 1
+                    logger.warning(f"Profile refresh failed for {user_id}: {str(e)}")
+                    return None
+
+        results = await asyncio.gather(*(fetch(user) for user in users))
+        return {
+            user[0]: result
+            for user, result in zip(users, results)
+            if result is not None
+        }
+
+    async def _fetch_profile(
+        self, token: str, refresh_token: Optional[str], expires_at: Optional[datetime]
+    ) -> Fetched:
+        """
+        Fetch with the stored access token, refreshing it first when it has
+        expired. Tokens without a known expiry are refreshed after a 401.
+        New tokens are returned with the user's fields, to be saved.
+        """
+        tokens: Dict[str, Any] = {}
+        if refresh_token and token_expired(expires_at):
+            tokens = await refresh_spotify_token(refresh_token)
+            self.tokens_refreshed += 1
+        try:
+            user_update, profile_data = await fetch_spotify_profile(
+                SpotifyClient(tokens.get("spotify_access_token", token))
+            )
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 401 or not refresh_token or tokens:
+                raise
+            tokens = await refresh_spotify_token(refresh_token)
+            self.tokens_refreshed += 1
+            user_update, profile_data = await fetch_spotify_profile(
+                SpotifyClient(tokens["spotify_access_token"])
+            )
+        return {**user_update, **tokens}, profile_data
+
+    async def run_once(self) -> Optional[Dict[str, Any]]:
+        """One pass over every stale user, or None when another worker holds the lock"""
+        async with _refresh_lock() as locked:
+            if not locked:
+                self.skipped += 1
+                return None
+            return await self._refresh_stale()
+
+    async def _refresh_stale(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        cutoff = datetime.utcnow() - timedelta(seconds=self.max_age)
+        after: Optional[Cursor] = None
+        batches = refreshed = failed = 0
+        async with open_service_session() as db:
+            while True:
+                users = await run_db(db, stale_users_page, cutoff, after, self.batch_size)
+                if not users:
+                    break
+                after = (users[-1][1], users[-1][0])
+
+                fetched = await self._fetch_batch(users)
+                if fetched:
+                    profiles = await run_db(db, save_profiles, fetched)
+                    for profile in profiles:
+                        index_music_profile(profile)
+                batches += 1
+                refreshed += len(fetched)
+                failed += len(users) - len(fetched)
+                self.refreshed += len(fetched)
+                self.failed += len(users) - len(fetched)
+
+        duration = time.perf_counter() - started
+        self.runs += 1
+        self.busy_seconds += duration
+        result = {
+            "batches": batches,
+            "refreshed": refreshed,
+            "failed": failed,
+            "profiles_per_minute": refreshed / duration * 60 if duration else 0.0,
+        }
+        self.last_run = {
+            **result,
+            "finished_at": datetime.utcnow().isoformat(),
+            "duration": duration,
+        }
+        return result
+
+    async def _run_forever(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                self.errors["run"] += 1
+                logger.exception("Profile refresh failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if PROFILE_REFRESH_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "interval": self.interval,
+            "max_age": self.max_age,
+            "batch_size": self.batch_size,
+            "concurrency": self.concurrency,
+            "rate": self.bucket.rate,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            "tokens_refreshed": self.tokens_refreshed,
+            "errors": dict(self.errors),
+            "profiles_per_minute": (
+                self.refreshed / self.busy_seconds * 60 if self.busy_seconds else 0.0
+            ),
+            "last_run": self.last_run,
+        }
+
+
+# One refresher per worker; the advisory lock keeps runs from overlapping
+profile_refresher = ProfileRefresher()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    logging.info("Profile refresh: %s", asyncio.run(profile_refresher.run_once()))
@@ -1,17 +1,18 @@
 from typing import Optional
 from uuid import UUID
 
-from sqlmodel import select
 from fastapi import APIRouter, Depends, HTTPException, Query
 
-from app.database.database import db_dependency
-from app.auth.auth import get_current_user
+from app.database.async_service import run_db
+from app.database.database import service_db_dependency
+from app.auth.auth import get_authenticated_user
 from app.models.models import User, MusicProfile
 from app.models.schema import (
     TopArtistsResponse,
     TopGenresResponse,
     MutualMusicInterests,
     MusicRecommendationsResponse,
+    Job,
 )
 from app.music import music
 
@@ -20,8 +21,8 @@ router = APIRouter()
 
 @router.get("/top-artists", response_model=TopArtistsResponse)
 async def get_top_artists(
-    db: db_dependency,
-    current_user: User = Depends(get_current_user),
+    db: service_db_dependency,
+    current_user: User = Depends(get_authenticated_user),
     time_range: str = Query(
         "medium_term",
         description="Time range for top artists (short_term, medium_term, long_term)",
@@ -36,8 +37,8 @@ async def get_top_artists(
 
 @router.get("/top-genres", response_model=TopGenresResponse)
 async def get_top_genres(
-    db: db_dependency,
-    current_user: User = Depends(get_current_user),
+    db: service_db_dependency,
+    current_user: User = Depends(get_authenticated_user),
     time_range: str = Query(
         "medium_term",
         description="Time range for top genres (short_term, medium_term, long_term)",
@@ -51,8 +52,8 @@ async def get_top_genres(
 
 @router.get("/recommendations", response_model=MusicRecommendationsResponse)
 async def get_recommendations(
-    db: db_dependency,
-    current_user: User = Depends(get_current_user),
+    db: service_db_dependency,
+    current_user: User = Depends(get_authenticated_user),
     limit: int = Query(20, ge=1, le=50),
 ):
     """Get personalized music recommendations based on user's taste"""
@@ -63,7 +64,7 @@ async def get_recommendations(
 
 @router.get("/mutual/{user_id}", response_model=MutualMusicInterests)
 async def get_mutual_interests(
-    user_id: UUID, db: db_dependency, current_user: User = Depends(get_current_user)
+    user_id: UUID, db: service_db_dependency, current_user: User = Depends(get_authenticated_user)
 ):
     """Get mutual music interests with another user"""
     if current_user.id == user_id:
@@ -76,23 +77,30 @@ async def get_mutual_interests(
     )
 
 
-@router.post("/spotify/sync")
-async def sync_spotify_data(
-    db: db_dependency, current_user: User = Depends(get_current_user)
+@router.post("/spotify/sync", response_model=Job, status_code=202)
+async def sync_spotify_data(current_user: User = Depends(get_authenticated_user)):
+    """Queue a sync of the user's Spotify data; poll the returned job for status"""
+    return await music.spotify_sync_queue.enqueue(str(current_user.id))
+
+
+@router.get("/spotify/sync/{job_id}", response_model=Job)
+async def get_spotify_sync_job(
+    job_id: str, current_user: User = Depends(get_authenticated_user)
 ):
-    """Sync user's Spotify data"""
-    await music.sync_user_spotify_data(current_user.id, db)
-    return {"message": "Spotify data synced successfully"}
+    """Status and progress of one of the user's Spotify syncs"""
+    job = await music.spotify_sync_queue.get(job_id)
+    if job is None or job.key != str(current_user.id):
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    return job
 
 
 @router.get("/profile/metrics", response_model=MusicProfile)
 async def get_profile_metrics(
-    db: db_dependency, current_user: User = Depends(get_current_user)
+    db: service_db_dependency, current_user: User = Depends(get_authenticated_user)
 ):
     """Get user's music profile metrics"""
 
-    statement = select(MusicProfile).where(MusicProfile.user_id == current_user.id)
-    profile = db.exec(statement).first()
+    profile = await run_db(db, music.find_music_profile, current_user.id)
 
     if not profile:
         raise HTTPException(status_code=404, detail="Music profile not found")
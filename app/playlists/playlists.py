@@ -1,22 +1,24 @@
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 from fastapi import HTTPException
 from sqlmodel import Session, select
 
+from app.database.async_service import AnySession, run_db
 from app.models.schema import PlaylistResponse, PlaylistCreate, PlaylistUpdate
 from app.models.models import Playlist, User
 from app.helpers.spotify import get_spotify_client
+from app.users.users import AsyncUserService
 
 
-async def get_user_playlists(db: Session, user_id: UUID) -> List[PlaylistResponse]:
+async def get_user_playlists(db: AnySession, user_id: UUID) -> List[PlaylistResponse]:
     """Get user's playlists from both Spotify and our database"""
     # Get playlists from Spotify
-    spotify = await get_spotify_client(user_id, db)
+    spotify = await get_spotify_client(user_id, AsyncUserService(db))
     spotify_playlists = await spotify.get_user_playlists()
 
     # Get playlists from our database
     statement = select(Playlist).where(Playlist.user_id == user_id)
-    db_playlists = db.exec(statement).all()
+    db_playlists = await run_db(db, _all, statement)
 
     # Merge and deduplicate playlists
     playlist_map = {p["id"]: p for p in spotify_playlists}
@@ -28,12 +30,12 @@ async def get_user_playlists(db: Session, user_id: UUID) -> List[PlaylistRespons
 
 
 async def get_user_mutual_playlists(
-    user1_id: UUID, user2_id: UUID, db: Session
+    user1_id: UUID, user2_id: UUID, db: AnySession
 ) -> List[PlaylistResponse]:
     """Get mutual playlists between two users"""
     # Get both users' playlists from Spotify
-    user1_spotify = await get_spotify_client(user1_id, db)
-    user2_spotify = await get_spotify_client(user2_id, db)
+    user1_spotify = await get_spotify_client(user1_id, AsyncUserService(db))
+    user2_spotify = await get_spotify_client(user2_id, AsyncUserService(db))
 
     # Get playlists for both users
     user1_playlists = await user1_spotify.get_user_playlists()
@@ -49,7 +51,7 @@ async def get_user_mutual_playlists(
         (Playlist.user_id.in_([user1_id, user2_id]))
         & (Playlist.id.in_([UUID(pid) for pid in mutual_ids]))
     )
-    db_playlists = db.exec(statement).all()
+    db_playlists = await run_db(db, _all, statement)
 
     # Merge Spotify and database playlists
     mutual_playlists = [p for p in user1_playlists if p["id"] in mutual_ids]
@@ -61,13 +63,13 @@ async def get_user_mutual_playlists(
 
 
 async def create_user_playlist(
-    user_id: UUID, playlist_data: PlaylistCreate, db: Session
+    user_id: UUID, playlist_data: PlaylistCreate, db: AnySession
 ) -> PlaylistResponse:
     """Create a new playlist in both Spotify and our database"""
     # TODO:  add error handling
     # TODO:  There should be a limit on tracks to be added to a playlist
     # TODO:  This should be  self generating playlist based on users taste
-    spotify = await get_spotify_client(user_id, db)
+    spotify = await get_spotify_client(user_id, AsyncUserService(db))
     spotify_playlist = await spotify.create_playlist(
         name=playlist_data.name,
         description=playlist_data.description,
@@ -94,25 +96,23 @@ async def create_user_playlist(
         spotify_id=spotify_playlist["id"],
         tracks=playlist_data.tracks or [],
     )
-    db.add(db_playlist)
-    db.commit()
-    db.refresh(db_playlist)
+    await run_db(db, _save_playlist, db_playlist)
 
     return spotify_playlist
 
 
 async def update_user_playlist(
-    playlist_id: UUID, playlist_update: PlaylistUpdate, db: Session
+    playlist_id: UUID, playlist_update: PlaylistUpdate, db: AnySession
 ) -> PlaylistResponse:
     """Update a playlist in both Spotify and our database"""
     # Get playlist from database
     statement = select(Playlist).where(Playlist.id == playlist_id)
-    playlist = db.exec(statement).first()
+    playlist = await run_db(db, _first, statement)
     if not playlist:
         raise HTTPException(status_code=404, detail="Playlist not found")
 
     # Update playlist in Spotify
-    spotify = await get_spotify_client(playlist.user_id, db)
+    spotify = await get_spotify_client(playlist.user_id, AsyncUserService(db))
     spotify_playlist = await spotify.update_playlist(
         playlist_id=str(playlist_id),
         name=playlist_update.name,
@@ -142,8 +142,36 @@ async def update_user_playlist(
     )
     playlist.tracks = playlist_update.tracks or playlist.tracks
 
-    db.add(playlist)
-    db.commit()
-    db.refresh(playlist)
+    await run_db(db, _save_playlist, playlist)
 
     return spotify_playlist
+
+
+def find_user_playlist(
+    session: Session, playlist_id: UUID, user_id: UUID
+) -> Optional[Playlist]:
+    """The playlist, if it exists and belongs to the user"""
+    statement = select(Playlist).where(
+        (Playlist.id == playlist_id) & (Playlist.user_id == user_id)
+    )
+    return session.exec(statement).first()
+
+
+def delete_playlist_record(session: Session, playlist: Playlist) -> None:
+    session.delete(playlist)
+    session.commit()
+
+
+def _all(session: Session, statement) -> List[Playlist]:
+    return session.exec(statement).all()
+
+
+def _first(session: Session, statement) -> Optional[Playlist]:
+    return session.exec(statement).first()
+
+
+def _save_playlist(session: Session, playlist: Playlist) -> Playlist:
+    session.add(playlist)
+    session.commit()
+    session.refresh(playlist)
+    return playlist
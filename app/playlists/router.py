@@ -1,14 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException
 from uuid import UUID
 from typing import List
-from sqlmodel import select, Session
 
 from app.auth.auth import get_authenticated_user
-from app.database.database import get_db
-from app.models.models import User, Playlist
+from app.database.async_service import run_db
+from app.database.database import service_db_dependency
+from app.models.models import User
 from app.models.schema import PlaylistCreate, PlaylistUpdate, PlaylistResponse
 from app.helpers.spotify import get_spotify_client
+from app.users.users import AsyncUserService
 from app.playlists.playlists import (
+    delete_playlist_record,
+    find_user_playlist,
     get_user_playlists,
     update_user_playlist,
     create_user_playlist,
@@ -20,7 +23,7 @@ router = APIRouter()
 
 @router.get("/", response_model=List[PlaylistResponse])
 async def list_playlists(
-    db: Session = Depends(get_db),
+    db: service_db_dependency,
     current_user: User = Depends(get_authenticated_user)
 ):
     """Get current user's playlists"""
@@ -30,7 +33,7 @@ async def list_playlists(
 @router.get("/mutual/{user_id}", response_model=List[PlaylistResponse])
 async def get_mutual_playlists(
     user_id: UUID,
-    db: Session = Depends(get_db),
+    db: service_db_dependency,
     current_user: User = Depends(get_authenticated_user)
 ):
     """Get mutual playlists between current user and specified user"""
@@ -44,7 +47,7 @@ async def get_mutual_playlists(
 @router.post("/", response_model=PlaylistResponse)
 async def create_playlist(
     playlist_data: PlaylistCreate,
-    db: Session = Depends(get_db),
+    db: service_db_dependency,
     current_user: User = Depends(get_authenticated_user),
 ):
     """Create a new playlist"""
@@ -55,15 +58,12 @@ async def create_playlist(
 async def update_playlist(
     playlist_id: UUID,
     playlist_update: PlaylistUpdate,
-    db: Session = Depends(get_db),
+    db: service_db_dependency,
     current_user: User = Depends(get_authenticated_user),
 ):
     """Update an existing playlist"""
     # Verify playlist exists and belongs to user
-    statement = select(Playlist).where(
-        (Playlist.id == playlist_id) & (Playlist.user_id == current_user.id)
-    )
-    playlist = db.exec(statement).first()
+    playlist = await run_db(db, find_user_playlist, playlist_id, current_user.id)
     if not playlist:
         raise HTTPException(
             status_code=404,
@@ -76,15 +76,12 @@ async def update_playlist(
 @router.delete("/{playlist_id}")
 async def delete_playlist(
     playlist_id: UUID,
-    db: Session = Depends(get_db),
+    db: service_db_dependency,
     current_user: User = Depends(get_authenticated_user)
 ):
     """Delete a playlist"""
     # Verify playlist exists and belongs to user
-    statement = select(Playlist).where(
-        (Playlist.id == playlist_id) & (Playlist.user_id == current_user.id)
-    )
-    playlist = db.exec(statement).first()
+    playlist = await run_db(db, find_user_playlist, playlist_id, current_user.id)
     if not playlist:
         raise HTTPException(
             status_code=404,
@@ -92,12 +89,11 @@ async def delete_playlist(
         )
 
     # Delete from Spotify
-    spotify = await get_spotify_client(current_user.id, db)
+    spotify = await get_spotify_client(current_user.id, AsyncUserService(db))
     await spotify.delete_playlist(str(playlist_id))
 
     # Delete from our database
-    db.delete(playlist)
-    db.commit()
+    await run_db(db, delete_playlist_record, playlist)
 
     return {"message": "Playlist deleted successfully"}
 
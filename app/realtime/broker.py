@@ -0,0 +1,158 @@
+"""
+Pub/sub between workers for mood room broadcasts.
+
+Every broadcast is published to its room's channel, and each worker
+subscribes only to the rooms it has local sockets for, then hands what it
+receives to its own sockets. With the in-memory broker that is just this
+process; with Redis, users on different uvicorn workers share rooms.
+
+On the wire a message is "<coalesce key>\\n<JSON frame>"; JSON text never
+contains a raw newline, so the first one separates the two.
+"""
+import asyncio
+import logging
+from typing import Callable, Dict, Optional, Set
+from uuid import UUID
+
+from app.constant import REALTIME_BROKER, REDIS_URL
+
+# Set by the ConnectionManager; called with (room_id, frame, coalesce key)
+# for every message of a subscribed room
+Deliver = Callable[[UUID, str, Optional[str]], None]
+
+
+def pack(frame: str, key: Optional[str]) -> str:
+    return f"{key or ''}\n{frame}"
+
+
+def unpack(data: str):
+    key, frame = data.split("\n", 1)
+    return frame, key or None
+
+
+class InMemoryBroker:
+    """Delivers straight to this worker's sockets"""
+
+    def __init__(self):
+        self.rooms: Set[UUID] = set()
+        self.deliver: Optional[Deliver] = None
+        self.published = 0
+        self.received = 0
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        self.rooms.clear()
+
+    async def subscribe(self, room_id: UUID) -> None:
+        self.rooms.add(room_id)
+
+    async def unsubscribe(self, room_id: UUID) -> None:
+        self.rooms.discard(room_id)
+
+    async def publish(self, room_id: UUID, frame: str, key: Optional[str]) -> None:
+        self.published += 1
+        if room_id in self.rooms and self.deliver is not None:
+            self.received += 1
+            self.deliver(room_id, frame, key)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "backend": type(self).__name__,
+            "subscribed_rooms": len(self.rooms),
+            "published": self.published,
+            "received": self.received,
+        }
+
+
+class RedisBroker:
+    """Redis pub/sub: one channel per room, one subscriber connection per worker"""
+
+    def __init__(self, url: str = REDIS_URL, client=None, prefix: str = "alma:rooms:"):
+        if client is None:
+            import redis.asyncio as redis
+
+            client = redis.from_url(url)
+        self._redis = client
+        self._pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self._reader: Optional[asyncio.Task] = None
+        self.prefix = prefix
+        self.rooms: Set[UUID] = set()
+        self.deliver: Optional[Deliver] = None
+        self.published = 0
+        self.received = 0
+        self.errors = 0
+
+    def _channel(self, room_id: UUID) -> str:
+        return f"{self.prefix}{room_id}"
+
+    async def start(self) -> None:
+        if self._reader is None:
+            self._reader = asyncio.create_task(self._read())
+
+    async def stop(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+            self._reader = None
+        await self._pubsub.reset()
+        self.rooms.clear()
+
+    async def subscribe(self, room_id: UUID) -> None:
+        await self._pubsub.subscribe(self._channel(room_id))
+        self.rooms.add(room_id)
+
+    async def unsubscribe(self, room_id: UUID) -> None:
+        self.rooms.discard(room_id)
+        await self._pubsub.unsubscribe(self._channel(room_id))
+
+    async def publish(self, room_id: UUID, frame: str, key: Optional[str]) -> None:
+        await self._redis.publish(self._channel(room_id), pack(frame, key))
+        self.published += 1
+
+    async def _read(self) -> None:
+        while True:
+            try:
+                if not self._pubsub.subscribed:
+                    # Nothing to read until the first local socket joins a room
+                    await asyncio.sleep(0.1)
+                    continue
+                message = await self._pubsub.get_message(timeout=1.0)
+                if message is None or message["type"] != "message":
+                    continue
+                channel = message["channel"]
+                if isinstance(channel, bytes):
+                    channel = channel.decode()
+                data = message["data"]
+                if isinstance(data, bytes):
+                    data = data.decode()
+                room_id = UUID(channel[len(self.prefix):])
+                if room_id in self.rooms and self.deliver is not None:
+                    self.received += 1
+                    self.deliver(room_id, *unpack(data))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # e.g. Redis restarting: back off instead of spinning
+                self.errors += 1
+                logging.warning(f"Realtime broker read failed: {str(e)}")
+                await asyncio.sleep(1)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "backend": type(self).__name__,
+            "subscribed_rooms": len(self.rooms),
+            "published": self.published,
+            "received": self.received,
+            "errors": self.errors,
+        }
+
+
+def create_broker():
+    if REALTIME_BROKER == "redis":
+        return RedisBroker()
+    return InMemoryBroker()
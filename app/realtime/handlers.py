@@ -1,8 +1,23 @@
+import asyncio
+import logging
+import time
+from collections import Counter, deque
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, Set
+from typing import Any, Callable, Deque, Dict, Optional, Set, Tuple
 from uuid import UUID
 from sqlmodel import SQLModel
 
+from app.constant import (
+    REALTIME_CHAT_BURST,
+    REALTIME_CHAT_RATE,
+    REALTIME_SEND_QUEUE_SIZE,
+    REALTIME_SEND_TIMEOUT,
+    REALTIME_SLOW_CONSUMER_POLICY,
+    REALTIME_TRACK_UPDATE_WINDOW,
+)
+from app.helpers.cache import TTLCache
+from app.helpers.rate_limit import TokenBucket
+from app.realtime.broker import create_broker
 from app.realtime.models import (
     BaseWebSocketMessage,
     UserJoinedMessage,
@@ -13,26 +28,223 @@ from app.realtime.models import (
     WebSocketUser,
 )
 
-# TODO: consider using Redis for real-time updates
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+# "Try again later": the client fell too far behind the room
+SLOW_CONSUMER_CLOSE_CODE = 1013
+# "Internal error": sending to the client failed
+SEND_ERROR_CLOSE_CODE = 1011
+# Idle chat buckets are forgotten; by then they would be full again anyway
+CHAT_BUCKETS_SIZE = 10000
+CHAT_BUCKET_TTL = 300
+
+
+def encode_message(message: BaseWebSocketMessage) -> str:
+    """The JSON text frame for `message`, built once however many sockets get it"""
+    # pydantic's compiled serializer: faster than dumping to a dict and
+    # encoding that with orjson or json, and it handles datetimes itself
+    return message.model_dump_json()
+
+
+def coalesce_key(message: BaseWebSocketMessage) -> Optional[str]:
+    """Messages with the same key supersede each other, e.g. a user's track updates"""
+    if isinstance(message, TrackUpdateMessage):
+        return f"{message.type}:{message.user.id}"
+    return None
+
+
+class RoomConnection:
+    """
+    One socket in a room: a bounded send queue drained by a writer task,
+    so a slow client only ever delays itself.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        on_close: Callable[["RoomConnection"], None],
+        counters: Counter,
+        maxsize: int = REALTIME_SEND_QUEUE_SIZE,
+        policy: str = REALTIME_SLOW_CONSUMER_POLICY,
+        send_timeout: float = REALTIME_SEND_TIMEOUT,
+    ):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {policy}")
+        self.websocket = websocket
+        self.on_close = on_close
+        self.counters = counters
+        self.maxsize = maxsize
+        self.policy = policy
+        self.send_timeout = send_timeout
+        # (coalesce key, frame, frame size in bytes)
+        self.queue: Deque[Tuple[Optional[str], str, int]] = deque()
+        self.closed = False
+        self._evicted = False
+        self._ready = asyncio.Event()
+        self._writer = asyncio.create_task(self._write())
+
+    def push(self, frame: str, size: int, key: Optional[str] = None) -> None:
+        """Queue an encoded frame without waiting, applying the policy when full"""
+        if self.closed:
+            return
+        if key is not None and self.policy == "coalesce":
+            for index, (queued_key, _, _) in enumerate(self.queue):
+                if queued_key == key:
+                    self.queue[index] = (key, frame, size)
+                    self.counters["coalesced"] += 1
+                    return
+        if len(self.queue) >= self.maxsize:
+            if self.policy == "disconnect":
+                self._evict()
+                return
+            self.queue.popleft()
+            self.counters["dropped"] += 1
+        self.queue.append((key, frame, size))
+        self._ready.set()
+
+    def _evict(self) -> None:
+        # The writer closes the socket; anything still queued is discarded
+        self.counters["slow_disconnects"] += 1
+        self.counters["dropped"] += len(self.queue)
+        self.queue.clear()
+        self.closed = True
+        self._evicted = True
+        self._ready.set()
+
+    async def _write(self) -> None:
+        close_code = None
+        try:
+            while True:
+                await self._ready.wait()
+                if self._evicted:
+                    close_code, reason = SLOW_CONSUMER_CLOSE_CODE, "Too slow to keep up"
+                    break
+                if not self.queue:
+                    self._ready.clear()
+                    continue
+                _, frame, size = self.queue.popleft()
+                await asyncio.wait_for(self.websocket.send_text(frame), self.send_timeout)
+                self.counters["sent"] += 1
+                self.counters["bytes_sent"] += size
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.counters["send_timeouts"] += 1
+            close_code, reason = SLOW_CONSUMER_CLOSE_CODE, "Send timed out"
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            logging.warning(f"Room websocket send failed: {str(e)}")
+            close_code, reason = SEND_ERROR_CLOSE_CODE, "Send failed"
+        self.closed = True
+        if close_code is not None:
+            # Ends the client's receive loop too, so the router cleans up
+            await self._close_socket(close_code, reason)
+        self.on_close(self)
+
+    async def _close_socket(self, code: int, reason: str) -> None:
+        try:
+            await asyncio.wait_for(
+                self.websocket.close(code=code, reason=reason), self.send_timeout
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Already gone; there is no one left to tell
+            pass
+
+    async def close(self) -> None:
+        self.closed = True
+        self._writer.cancel()
+        try:
+            await self._writer
+        except asyncio.CancelledError:
+            pass
 
 
 class ConnectionManager:
-    def __init__(self):
-        # Store room connections: room_id -> set of websockets
-        self.room_connections: Dict[UUID, Set[WebSocket]] = {}
+    """
+    This worker's sockets. Room broadcasts go through the broker, which
+    hands them back to every worker with sockets in the room.
+    """
+
+    def __init__(
+        self,
+        send_queue_size: int = REALTIME_SEND_QUEUE_SIZE,
+        slow_consumer_policy: str = REALTIME_SLOW_CONSUMER_POLICY,
+        broker=None,
+        track_update_window: float = REALTIME_TRACK_UPDATE_WINDOW,
+        chat_rate: float = REALTIME_CHAT_RATE,
+        chat_burst: int = REALTIME_CHAT_BURST,
+    ):
+        # Store room connections: room_id -> websocket -> its send queue
+        self.room_connections: Dict[UUID, Dict[WebSocket, RoomConnection]] = {}
+        self.broker = broker if broker is not None else create_broker()
+        self.broker.deliver = self._deliver
+        # Serializes (un)subscribing as sockets come and go
+        self._subscription_lock = asyncio.Lock()
+        self._pending: Set[asyncio.Task] = set()
+        self.track_update_window = track_update_window
+        # Rooms with an open window -> user id -> their latest update held back
+        self._track_windows: Dict[UUID, Dict[str, TrackUpdateMessage]] = {}
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._chat_buckets = TTLCache(CHAT_BUCKETS_SIZE, CHAT_BUCKET_TTL)
         # Store user notification connections: user_id -> websocket
         self.notification_connections: Dict[UUID, WebSocket] = {}
+        self.send_queue_size = send_queue_size
+        self.slow_consumer_policy = slow_consumer_policy
+        # encoded, encode_seconds, sent, bytes_sent, dropped, coalesced,
+        # slow_disconnects, send_timeouts
+        self.counters: Counter = Counter()
 
     async def connect_to_room(self, websocket: WebSocket, room_id: UUID):
         await websocket.accept()
         if room_id not in self.room_connections:
-            self.room_connections[room_id] = set()
-        self.room_connections[room_id].add(websocket)
+            self.room_connections[room_id] = {}
+        self.room_connections[room_id][websocket] = RoomConnection(
+            websocket,
+            lambda connection: self._drop(room_id, connection.websocket),
+            self.counters,
+            self.send_queue_size,
+            self.slow_consumer_policy,
+        )
+        await self._sync_subscription(room_id)
 
-    async def disconnect_from_room(self, websocket: WebSocket, room_id: UUID):
-        self.room_connections[room_id].remove(websocket)
-        if not self.room_connections[room_id]:
+    async def _sync_subscription(self, room_id: UUID) -> None:
+        """Subscribe to a room while it has local sockets, and only then"""
+        async with self._subscription_lock:
+            wanted = room_id in self.room_connections
+            if wanted and room_id not in self.broker.rooms:
+                await self.broker.subscribe(room_id)
+            elif not wanted and room_id in self.broker.rooms:
+                await self.broker.unsubscribe(room_id)
+
+    def _remove(self, room_id: UUID, websocket: WebSocket) -> Optional[RoomConnection]:
+        connections = self.room_connections.get(room_id)
+        if connections is None:
+            return None
+        connection = connections.pop(websocket, None)
+        if not connections:
             del self.room_connections[room_id]
+        return connection
+
+    def _drop(self, room_id: UUID, websocket: WebSocket) -> None:
+        # A writer gave up on its socket; unsubscribe later if the room emptied
+        self._remove(room_id, websocket)
+        if room_id not in self.room_connections:
+            self._spawn(self._sync_subscription(room_id))
+
+    def _spawn(self, coroutine) -> None:
+        task = asyncio.create_task(coroutine)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def disconnect_from_room(self, websocket: WebSocket, room_id: UUID):
+        # Already gone if its writer failed or it was evicted as too slow
+        connection = self._remove(room_id, websocket)
+        if connection is not None:
+            await connection.close()
+        await self._sync_subscription(room_id)
 
     async def connect_to_notifications(self, websocket: WebSocket, user_id: UUID):
         await websocket.accept()
@@ -43,27 +255,134 @@ class ConnectionManager:
             del self.notification_connections[user_id]
 
     async def broadcast_to_room(self, room_id: UUID, message: BaseWebSocketMessage):
-        """Send message to all users in a room"""
-        if room_id in self.room_connections:
-            disconnected_ws = set()
-            message_dict = message.dict()
-            for websocket in self.room_connections[room_id]:
-                try:
-                    await websocket.send_json(message_dict)
-                except WebSocketDisconnect:
-                    disconnected_ws.add(websocket)
-
-            # Clean up disconnected websockets
-            for ws in disconnected_ws:
-                self.room_connections[room_id].remove(ws)
+        """Publish message to a room; every worker queues it for its sockets there"""
+        frame = self._encode(message)
+        await self.broker.publish(room_id, frame, coalesce_key(message))
+
+    async def send_to_socket(
+        self, room_id: UUID, websocket: WebSocket, message: BaseWebSocketMessage
+    ):
+        """Queue message for one socket in a room, behind what it already has"""
+        connection = self.room_connections.get(room_id, {}).get(websocket)
+        if connection is not None:
+            frame = self._encode(message)
+            connection.push(frame, len(frame.encode()))
+
+    async def broadcast_track_update(self, room_id: UUID, message: TrackUpdateMessage):
+        """
+        Broadcast track updates at most once per window per room and user.
+        The first goes out at once; later ones in the window replace the
+        same user's earlier ones, and each user's latest is sent when it
+        closes.
+        """
+        if self.track_update_window <= 0:
+            await self.broadcast_to_room(room_id, message)
+            return
+        held = self._track_windows.get(room_id)
+        if held is not None:
+            if message.user.id in held:
+                self.counters["track_updates_coalesced"] += 1
+            held[message.user.id] = message
+            return
+        self._track_windows[room_id] = {}
+        await self.broadcast_to_room(room_id, message)
+        self._spawn(self._flush_track_updates(room_id))
+
+    async def _flush_track_updates(self, room_id: UUID) -> None:
+        try:
+            while True:
+                await asyncio.sleep(self.track_update_window)
+                held = self._track_windows.get(room_id)
+                if not held:
+                    break
+                # Sending opens the next window
+                self._track_windows[room_id] = {}
+                for latest in held.values():
+                    await self.broadcast_to_room(room_id, latest)
+        finally:
+            self._track_windows.pop(room_id, None)
+
+    async def broadcast_chat(self, room_id: UUID, user_id: str, message: ChatMessage) -> bool:
+        """Broadcast a chat message unless its sender is over the chat rate limit"""
+        bucket = self._chat_buckets.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+        self._chat_buckets.set(user_id, bucket)
+        if not bucket.try_acquire():
+            self.counters["chat_rate_limited"] += 1
+            return False
+        await self.broadcast_to_room(room_id, message)
+        return True
+
+    def _deliver(self, room_id: UUID, frame: str, key: Optional[str]) -> None:
+        connections = self.room_connections.get(room_id)
+        if not connections:
+            return
+        size = len(frame.encode())
+        for connection in list(connections.values()):
+            connection.push(frame, size, key)
+
+    def _encode(self, message: BaseWebSocketMessage) -> str:
+        started = time.perf_counter()
+        frame = encode_message(message)
+        self.counters["encode_seconds"] += time.perf_counter() - started
+        self.counters["encoded"] += 1
+        return frame
+
+    async def start(self) -> None:
+        await self.broker.start()
+
+    async def stop(self) -> None:
+        for task in list(self._pending):
+            task.cancel()
+        await asyncio.gather(*self._pending, return_exceptions=True)
+        await self.broker.stop()
 
     async def send_notification(self, user_id: UUID, message: NotificationMessage):
         """Send notification to a specific user"""
         if user_id in self.notification_connections:
+            frame = self._encode(message)
             try:
-                await self.notification_connections[user_id].send_json(message.dict())
+                await self.notification_connections[user_id].send_text(frame)
+                self.counters["bytes_sent"] += len(frame.encode())
             except WebSocketDisconnect:
                 await self.disconnect_from_notifications(user_id)
 
+    def stats(self) -> Dict[str, Any]:
+        connections = [
+            connection
+            for room in self.room_connections.values()
+            for connection in room.values()
+        ]
+        return {
+            "broker": self.broker.stats(),
+            "rooms": len(self.room_connections),
+            "room_connections": len(connections),
+            "notification_connections": len(self.notification_connections),
+            "slow_consumer_policy": self.slow_consumer_policy,
+            "send_queue_size": self.send_queue_size,
+            "queued": sum(len(connection.queue) for connection in connections),
+            "max_queued": max((len(c.queue) for c in connections), default=0),
+            "encoded": self.counters["encoded"],
+            "avg_encode_us": (
+                self.counters["encode_seconds"] / self.counters["encoded"] * 1e6
+                if self.counters["encoded"]
+                else 0.0
+            ),
+            **{
+                counter: self.counters[counter]
+                for counter in (
+                    "sent",
+                    "bytes_sent",
+                    "dropped",
+                    "coalesced",
+                    "slow_disconnects",
+                    "send_timeouts",
+                    "track_updates_coalesced",
+                    "chat_rate_limited",
+                )
+            },
+        }
+
 
 manager = ConnectionManager()
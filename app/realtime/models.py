@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional, Dict, Any, Literal
+from typing import Optional, Dict, Any, List, Literal
 from uuid import UUID
 from sqlmodel import SQLModel
 
@@ -51,6 +51,29 @@ class TrackUpdateMessage(BaseWebSocketMessage):
     user: WebSocketUser
 
 
+class PresenceSnapshotMessage(BaseWebSocketMessage):
+    """Everyone in the room, sent once to a socket when it joins"""
+
+    type: Literal["presence_snapshot"] = "presence_snapshot"
+    users: List[WebSocketUser]
+
+
+class PresenceDiffMessage(BaseWebSocketMessage):
+    """Who joined or left the room since the last diff"""
+
+    type: Literal["presence_diff"] = "presence_diff"
+    joined: List[WebSocketUser] = []
+    left: List[str] = []  # user ids
+
+
+class RateLimitedMessage(BaseWebSocketMessage):
+    """Sent back to a sender whose message was dropped by a rate limit"""
+
+    type: Literal["rate_limited"] = "rate_limited"
+    message_type: str  # type of the dropped message
+    detail: str
+
+
 class NotificationMessage(BaseWebSocketMessage):
     """Message sent for user notifications"""
 
@@ -0,0 +1,292 @@
+"""
+In-memory presence for mood rooms.
+
+The registry knows who is in each room on this worker, so participant
+lists are answered from memory in O(participants). Only mood room sockets
+register, so presence ends when the connection does. A user with several
+sockets counts once and leaves with their last one.
+
+Rooms get compact diffs: joins and leaves within PRESENCE_DIFF_WINDOW go
+out as one `presence_diff`, and a join undone within the window sends
+nothing. A joining socket gets the full list once as `presence_snapshot`.
+
+Every PRESENCE_CHECKPOINT_INTERVAL the registry is written to
+room_participants, which outlives restarts and covers every worker. With
+the Redis broker a room spans workers, so full participant lists add what
+the other workers last checkpointed.
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import delete, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+
+from app.constant import (
+    PRESENCE_CHECKPOINT_INTERVAL,
+    PRESENCE_DIFF_WINDOW,
+    PRESENCE_STALE_CHECKPOINTS,
+    REALTIME_BROKER,
+)
+from app.database.database import engine
+from app.models.models import RoomParticipant
+from app.realtime.handlers import manager
+from app.realtime.models import (
+    BaseWebSocketMessage,
+    PresenceDiffMessage,
+    PresenceSnapshotMessage,
+    WebSocketUser,
+)
+
+logger = logging.getLogger(__name__)
+
+Broadcast = Callable[[UUID, BaseWebSocketMessage], Awaitable[None]]
+# (room id, user id)
+Seat = Tuple[UUID, str]
+# Keeps multi-row inserts a reasonable size
+CHECKPOINT_CHUNK_SIZE = 1000
+
+
+class PresenceRegistry:
+    def __init__(
+        self,
+        broadcast: Broadcast,
+        diff_window: float = PRESENCE_DIFF_WINDOW,
+        checkpoint_interval: float = PRESENCE_CHECKPOINT_INTERVAL,
+        shared: bool = REALTIME_BROKER == "redis",
+    ):
+        self.broadcast = broadcast
+        self.diff_window = diff_window
+        self.checkpoint_interval = checkpoint_interval
+        # Rooms span workers, whose participants only this table knows
+        self.shared = shared
+        # room -> user id -> user, in join order
+        self.rooms: Dict[UUID, Dict[str, WebSocketUser]] = {}
+        self._connections: Counter = Counter()
+        self._joined_at: Dict[Seat, datetime] = {}
+        # Rooms with a diff window open -> (joined, left) so far
+        self._diffs: Dict[UUID, Tuple[Dict[str, WebSocketUser], Set[str]]] = {}
+        # Seats left since the last checkpoint, to delete
+        self._left: Set[Seat] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._checkpointer: Optional[asyncio.Task] = None
+        self.diffs_sent = 0
+        self.checkpoints = 0
+        self.checkpoint_errors = 0
+        self.last_checkpoint: Dict[str, Any] = {}
+
+    def participants(self, room_id: UUID) -> List[WebSocketUser]:
+        """The room's participants on this worker"""
+        return list(self.rooms.get(room_id, {}).values())
+
+    async def all_participants(self, room_id: UUID) -> List[WebSocketUser]:
+        """
+        The room's participants on every worker. Other workers' are read
+        from their last checkpoint, so they can be an interval behind.
+        """
+        local = self.participants(room_id)
+        if not self.shared:
+            return local
+
+        def read() -> List[WebSocketUser]:
+            with Session(engine) as session:
+                return self.read_checkpoint(session, room_id)
+
+        try:
+            checkpointed = await asyncio.to_thread(read)
+        except Exception:
+            logger.exception("Reading checkpointed presence failed")
+            return local
+        everyone = {user.id: user for user in checkpointed}
+        # Left this worker since its last checkpoint
+        for left_room, user_id in self._left:
+            if left_room == room_id:
+                everyone.pop(user_id, None)
+        everyone.update((user.id, user) for user in local)
+        return list(everyone.values())
+
+    async def snapshot(self, room_id: UUID) -> PresenceSnapshotMessage:
+        return PresenceSnapshotMessage(users=await self.all_participants(room_id))
+
+    def read_checkpoint(self, session: Session, room_id: UUID) -> List[WebSocketUser]:
+        """The room's participants as last checkpointed by every worker"""
+        rows = session.exec(
+            select(RoomParticipant)
+            .where(RoomParticipant.room_id == room_id)
+            .order_by(RoomParticipant.joined_at)
+        )
+        return [
+            WebSocketUser(id=str(row.user_id), name=row.name or "", avatar_url=row.avatar_url)
+            for row in rows
+        ]
+
+    def join(self, room_id: UUID, user: WebSocketUser) -> None:
+        seat = (room_id, user.id)
+        self._connections[seat] += 1
+        if self._connections[seat] > 1:
+            return
+        self.rooms.setdefault(room_id, {})[user.id] = user
+        self._joined_at[seat] = datetime.utcnow()
+        self._left.discard(seat)
+
+        joined, left = self._open_diff(room_id)
+        if user.id in left:
+            # Left and came back within the window: nothing changed
+            left.discard(user.id)
+        else:
+            joined[user.id] = user
+
+    def leave(self, room_id: UUID, user_id: str) -> None:
+        seat = (room_id, user_id)
+        if not self._connections.get(seat):
+            return
+        self._connections[seat] -= 1
+        if self._connections[seat]:
+            return
+        del self._connections[seat]
+        del self._joined_at[seat]
+        room = self.rooms[room_id]
+        del room[user_id]
+        if not room:
+            del self.rooms[room_id]
+        self._left.add(seat)
+
+        joined, left = self._open_diff(room_id)
+        if user_id in joined:
+            del joined[user_id]
+        else:
+            left.add(user_id)
+
+    def _open_diff(self, room_id: UUID) -> Tuple[Dict[str, WebSocketUser], Set[str]]:
+        if room_id not in self._diffs:
+            self._diffs[room_id] = ({}, set())
+            task = asyncio.create_task(self._send_diff(room_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return self._diffs[room_id]
+
+    async def _send_diff(self, room_id: UUID) -> None:
+        await asyncio.sleep(self.diff_window)
+        joined, left = self._diffs.pop(room_id)
+        if joined or left:
+            self.diffs_sent += 1
+            await self.broadcast(
+                room_id, PresenceDiffMessage(joined=list(joined.values()), left=sorted(left))
+            )
+
+    def _collect(self) -> Tuple[List[Dict[str, Any]], Set[Seat]]:
+        # Taken on the event loop, so the write can run in a thread
+        rows = [
+            {
+                "room_id": room_id,
+                "user_id": UUID(user_id),
+                "name": user.name,
+                "avatar_url": user.avatar_url,
+                "joined_at": self._joined_at[(room_id, user_id)],
+            }
+            for room_id, users in self.rooms.items()
+            for user_id, user in users.items()
+        ]
+        left, self._left = self._left, set()
+        return rows, left
+
+    def write_checkpoint(
+        self, session: Session, rows: List[Dict[str, Any]], left: Set[Seat]
+    ) -> Dict[str, Any]:
+        """Upsert present participants, delete departed and stale ones"""
+        now = datetime.utcnow()
+        if left:
+            session.exec(
+                delete(RoomParticipant).where(
+                    tuple_(RoomParticipant.room_id, RoomParticipant.user_id).in_(
+                        [(room_id, UUID(user_id)) for room_id, user_id in left]
+                    )
+                )
+            )
+        dialect = postgresql if session.get_bind().dialect.name == "postgresql" else sqlite
+        for start in range(0, len(rows), CHECKPOINT_CHUNK_SIZE):
+            statement = dialect.insert(RoomParticipant).values(
+                [{**row, "last_seen_at": now} for row in rows[start:start + CHECKPOINT_CHUNK_SIZE]]
+            )
+            session.exec(
+                statement.on_conflict_do_update(
+                    index_elements=["room_id", "user_id"],
+                    set_={
+                        "name": statement.excluded.name,
+                        "avatar_url": statement.excluded.avatar_url,
+                        "last_seen_at": statement.excluded.last_seen_at,
+                    },
+                )
+            )
+        # Seats no worker has reported for a while, e.g. after a crash
+        stale_before = now - timedelta(
+            seconds=self.checkpoint_interval * PRESENCE_STALE_CHECKPOINTS
+        )
+        stale = session.exec(
+            delete(RoomParticipant).where(RoomParticipant.last_seen_at < stale_before)
+        )
+        session.commit()
+        return {"participants": len(rows), "left": len(left), "stale": stale.rowcount}
+
+    async def checkpoint(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        rows, left = self._collect()
+
+        def write() -> Dict[str, Any]:
+            with Session(engine) as session:
+                return self.write_checkpoint(session, rows, left)
+
+        try:
+            result = await asyncio.to_thread(write)
+        except Exception:
+            # Retried with the next checkpoint
+            self._left |= left
+            raise
+        self.checkpoints += 1
+        self.last_checkpoint = {
+            **result,
+            "finished_at": datetime.utcnow().isoformat(),
+            "duration": time.perf_counter() - started,
+        }
+        return result
+
+    async def _checkpoint_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            try:
+                await self.checkpoint()
+            except Exception:
+                self.checkpoint_errors += 1
+                logger.exception("Presence checkpoint failed")
+
+    def start(self) -> None:
+        if self._checkpointer is None:
+            self._checkpointer = asyncio.create_task(self._checkpoint_forever())
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks)
+        if self._checkpointer is not None:
+            tasks.append(self._checkpointer)
+            self._checkpointer = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rooms": len(self.rooms),
+            "participants": sum(len(users) for users in self.rooms.values()),
+            "diffs_sent": self.diffs_sent,
+            "checkpoints": self.checkpoints,
+            "checkpoint_errors": self.checkpoint_errors,
+            "last_checkpoint": self.last_checkpoint,
+        }
+
+
+# Shared by every socket in this worker process
+presence = PresenceRegistry(manager.broadcast_to_room)
@@ -6,10 +6,12 @@ from app.models.models import User
 from app.users.users import UserService
 from app.helpers.router.utils import get_user_service
 from app.realtime.handlers import manager
+from app.realtime.presence import presence
 from app.realtime.models import (
     UserJoinedMessage,
     UserLeftMessage,
     ChatMessage,
+    RateLimitedMessage,
     TrackUpdateMessage,
     WebSocketUser,
 )
@@ -40,6 +42,10 @@ async def mood_room_websocket(
             avatar_url=current_user.spotify_image_url,
         )
 
+        # The full participant list once; changes arrive as presence diffs
+        presence.join(room_id, user_info)
+        await manager.send_to_socket(room_id, websocket, await presence.snapshot(room_id))
+
         # Notify others that user joined
         join_message = UserJoinedMessage(user=user_info)
         await manager.broadcast_to_room(room_id, join_message)
@@ -55,7 +61,16 @@ async def mood_room_websocket(
                     chat_message = ChatMessage(
                         user=user_info, content=data.get("content", "")
                     )
-                    await manager.broadcast_to_room(room_id, chat_message)
+                    if not await manager.broadcast_chat(room_id, user_info.id, chat_message):
+                        # Only the sender hears about it
+                        await manager.send_to_socket(
+                            room_id,
+                            websocket,
+                            RateLimitedMessage(
+                                message_type=message_type,
+                                detail="Sending messages too fast, slow down",
+                            ),
+                        )
 
                 elif message_type == "track_update":
                     # Handle track update
@@ -65,15 +80,18 @@ async def mood_room_websocket(
                         track_name=data.get("track_name", ""),
                         artist_name=data.get("artist_name", ""),
                     )
-                    await manager.broadcast_to_room(room_id, track_message)
+                    await manager.broadcast_track_update(room_id, track_message)
 
         except WebSocketDisconnect:
             await manager.disconnect_from_room(websocket, room_id)
+            presence.leave(room_id, user_info.id)
             # Notify others that user left
             leave_message = UserLeftMessage(user=user_info)
             await manager.broadcast_to_room(room_id, leave_message)
 
     except Exception as e:
+        await manager.disconnect_from_room(websocket, room_id)
+        presence.leave(room_id, str(current_user.id))
         await websocket.close(code=4000, reason=str(e))
 
 
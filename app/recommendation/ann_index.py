@@ -0,0 +1,314 @@
+"""
+Approximate nearest-neighbour index over music profiles.
+
+Profiles are embedded by feature hashing so that the inner product of two
+embeddings approximates the recommender's weighted overall similarity. An
+IVF (inverted file) index partitions the embeddings with k-means, and a
+query only scans the `nprobe` partitions closest to it.
+
+The base index is built offline (`python -m app.recommendation.ann_index`)
+and memory-mapped by each worker on startup. Profiles synced afterwards go
+into a small in-memory overlay that is searched exhaustively until the next
+rebuild.
+"""
+import logging
+import math
+import os
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sqlmodel import Session, select
+
+from app.constant import ANN_INDEX_NPROBE, ANN_INDEX_PATH
+from app.database.database import engine
+from app.models.models import MusicProfile
+from .music_recommender import NUMERIC_SIMILARITIES, SIMILARITY_WEIGHTS
+
+# (similarity key, profile field, hashed dimensions)
+HASHED_FIELDS = (
+    ("genre_similarity", "genres", 64),
+    ("artist_similarity", "top_artists", 128),
+    ("track_similarity", "top_tracks", 128),
+    ("decade_similarity", "favorite_decades", 16),
+)
+HOURS = 24
+DIM = sum(dims for _, _, dims in HASHED_FIELDS) + 2 * len(NUMERIC_SIMILARITIES) + HOURS
+
+# k-means trains on a sample; assignment runs over every row in chunks
+TRAIN_SAMPLE_SIZE = 50_000
+CHUNK_SIZE = 8192
+
+FILES = ("centroids", "offsets", "vectors", "ids")
+
+
+def _hashed_block(values: Optional[List[str]], field: str, dims: int) -> np.ndarray:
+    """Signed feature hashing of a list of terms, l2-normalised"""
+    block = np.zeros(dims, dtype=np.float32)
+    for value in values or []:
+        digest = zlib.crc32(f"{field}:{value}".encode())
+        block[digest % dims] += 1.0 if digest & 0x80000000 else -1.0
+    norm = np.linalg.norm(block)
+    return block / norm if norm else block
+
+
+def embed_profile(profile: Dict[str, Any]) -> np.ndarray:
+    """
+    Embed a profile dict into a DIM-sized float32 vector. Each block is
+    scaled by the square root of its similarity weight, so the dot product
+    of two embeddings is a weighted sum of per-field similarities.
+    """
+    blocks = []
+    for sim_key, field, dims in HASHED_FIELDS:
+        block = _hashed_block(profile.get(field), field, dims)
+        blocks.append(block * math.sqrt(SIMILARITY_WEIGHTS[sim_key]))
+
+    # A score x in [0, 1] maps onto the quarter circle, so the dot product
+    # of two scores is cos(pi/2 * |a - b|), which falls as they drift apart
+    for sim_key, metric_key in NUMERIC_SIMILARITIES:
+        value = profile.get(metric_key)
+        point = (
+            np.zeros(2, dtype=np.float32)
+            if value is None
+            else np.array(
+                [math.cos(math.pi / 2 * value), math.sin(math.pi / 2 * value)],
+                dtype=np.float32,
+            )
+        )
+        blocks.append(point * math.sqrt(SIMILARITY_WEIGHTS[sim_key]))
+
+    by_hour = (profile.get("listening_history") or {}).get("by_hour") or {}
+    hours = np.array([by_hour.get(str(h), 0) for h in range(HOURS)], dtype=np.float32)
+    norm = np.linalg.norm(hours)
+    if norm:
+        hours /= norm
+    blocks.append(hours * math.sqrt(SIMILARITY_WEIGHTS["listening_pattern_similarity"]))
+
+    return np.concatenate(blocks)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the highest-scoring centroid for every row"""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), CHUNK_SIZE):
+        chunk = vectors[start:start + CHUNK_SIZE]
+        assignments[start:start + CHUNK_SIZE] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def _train_centroids(
+    vectors: np.ndarray, n_lists: int, iterations: int, seed: int
+) -> np.ndarray:
+    """Spherical k-means: unit centroids, rows assigned by inner product"""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > TRAIN_SAMPLE_SIZE:
+        vectors = vectors[rng.choice(len(vectors), TRAIN_SAMPLE_SIZE, replace=False)]
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = _assign(vectors, centroids)
+        membership = csr_matrix(
+            (np.ones(len(vectors), dtype=np.float32), (assignments, np.arange(len(vectors)))),
+            shape=(n_lists, len(vectors)),
+        )
+        sums = np.asarray(membership @ vectors)
+        norms = np.linalg.norm(sums, axis=1)
+        # Empty partitions keep their previous centroid
+        filled = norms > 0
+        centroids[filled] = sums[filled] / norms[filled, None]
+
+    return centroids.astype(np.float32)
+
+
+class ProfileIndex:
+    """IVF index of profile embeddings, keyed by user id"""
+
+    def __init__(self, path: str = ANN_INDEX_PATH, nprobe: int = ANN_INDEX_NPROBE):
+        self.path = Path(path)
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        # Rows grouped by partition: partition p is rows offsets[p]:offsets[p + 1]
+        self.vectors: Optional[np.ndarray] = None
+        self.offsets: Optional[np.ndarray] = None
+        self.ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._live: Optional[np.ndarray] = None
+        # Profiles upserted since the base index was built
+        self._overlay: Dict[str, np.ndarray] = {}
+        self._overlay_matrix: Optional[np.ndarray] = None
+        self.searches = 0
+        self.rows_scanned = 0
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self) -> int:
+        base = int(self._live.sum()) if self._live is not None else 0
+        return base + len(self._overlay)
+
+    def _set_base(
+        self,
+        centroids: np.ndarray,
+        offsets: np.ndarray,
+        vectors: np.ndarray,
+        ids: List[str],
+    ) -> None:
+        self.centroids = centroids
+        self.offsets = offsets
+        self.vectors = vectors
+        self.ids = ids
+        self._rows = {user_id: row for row, user_id in enumerate(ids)}
+        self._live = np.ones(len(ids), dtype=bool)
+        self._overlay = {}
+        self._overlay_matrix = None
+
+    def build(
+        self,
+        profiles: Iterable[Dict[str, Any]],
+        n_lists: Optional[int] = None,
+        iterations: int = 10,
+        seed: int = 0,
+    ) -> None:
+        """Build the base index from profile dicts, replacing any current one"""
+        ids: List[str] = []
+        embeddings: List[np.ndarray] = []
+        for profile in profiles:
+            ids.append(str(profile["user_id"]))
+            embeddings.append(embed_profile(profile))
+
+        if not ids:
+            self._set_base(
+                np.zeros((0, DIM), dtype=np.float32),
+                np.zeros(1, dtype=np.int64),
+                np.zeros((0, DIM), dtype=np.float32),
+                [],
+            )
+            return
+
+        vectors = np.vstack(embeddings)
+        n_lists = min(n_lists or max(1, int(math.sqrt(len(ids)))), len(ids))
+        centroids = _train_centroids(vectors, n_lists, iterations, seed)
+        assignments = _assign(vectors, centroids)
+
+        order = np.argsort(assignments, kind="stable")
+        offsets = np.searchsorted(assignments[order], np.arange(n_lists + 1))
+        self._set_base(centroids, offsets, vectors[order], [ids[i] for i in order])
+
+    def save(self) -> None:
+        """Write the base index; existing memory maps keep the old files"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        arrays = {
+            "centroids": self.centroids,
+            "offsets": self.offsets,
+            "vectors": np.asarray(self.vectors),
+            "ids": np.array(self.ids, dtype=str),
+        }
+        for name in FILES:
+            tmp_path = self.path / f"{name}.tmp.npy"
+            np.save(tmp_path, arrays[name])
+            os.replace(tmp_path, self.path / f"{name}.npy")
+
+    def load(self) -> bool:
+        """Memory-map a saved index; False when none has been built yet"""
+        if not all((self.path / f"{name}.npy").exists() for name in FILES):
+            return False
+        self._set_base(
+            np.load(self.path / "centroids.npy"),
+            np.load(self.path / "offsets.npy"),
+            np.load(self.path / "vectors.npy", mmap_mode="r"),
+            np.load(self.path / "ids.npy").tolist(),
+        )
+        return True
+
+    def upsert(self, profile: Dict[str, Any]) -> None:
+        """Insert or replace one profile, e.g. right after a Spotify sync"""
+        user_id = str(profile["user_id"])
+        row = self._rows.get(user_id)
+        if row is not None:
+            self._live[row] = False
+        self._overlay[user_id] = embed_profile(profile)
+        self._overlay_matrix = None
+
+    def search(
+        self,
+        profile: Dict[str, Any],
+        k: int,
+        exclude: Optional[Set[str]] = None,
+    ) -> List[Tuple[str, float]]:
+        """Approximate top-k (user_id, score) pairs, best first"""
+        query = embed_profile(profile)
+        exclude = exclude or set()
+        ids: List[str] = []
+        score_parts: List[np.ndarray] = []
+
+        if self.centroids is not None and len(self.centroids):
+            probes = np.argsort(-(self.centroids @ query))[: self.nprobe]
+            for partition in probes:
+                start, end = int(self.offsets[partition]), int(self.offsets[partition + 1])
+                rows = np.arange(start, end)[self._live[start:end]]
+                if not len(rows):
+                    continue
+                score_parts.append(np.asarray(self.vectors[start:end])[rows - start] @ query)
+                ids.extend(self.ids[row] for row in rows)
+
+        if self._overlay:
+            if self._overlay_matrix is None:
+                self._overlay_matrix = np.vstack(list(self._overlay.values()))
+            score_parts.append(self._overlay_matrix @ query)
+            ids.extend(self._overlay)
+
+        self.searches += 1
+        self.rows_scanned += len(ids)
+        if not ids:
+            return []
+
+        scores = np.concatenate(score_parts)
+        if exclude:
+            keep = np.array([user_id not in exclude for user_id in ids])
+            scores = np.where(keep, scores, -np.inf)
+
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(ids[i], float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.is_loaded,
+            "size": len(self),
+            "base_size": len(self.ids),
+            "overlay_size": len(self._overlay),
+            "lists": 0 if self.centroids is None else len(self.centroids),
+            "nprobe": self.nprobe,
+            "searches": self.searches,
+            "avg_rows_scanned": self.rows_scanned / self.searches if self.searches else 0.0,
+        }
+
+
+def rebuild(path: str = ANN_INDEX_PATH) -> ProfileIndex:
+    """Build the index from every stored MusicProfile and save it"""
+    with Session(engine) as session:
+        profiles = [profile.dict() for profile in session.exec(select(MusicProfile))]
+
+    index = ProfileIndex(path)
+    index.build(profiles)
+    index.save()
+    return index
+
+
+# Shared by every request in this worker process
+profile_index = ProfileIndex()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    started = time.perf_counter()
+    built = rebuild()
+    logging.info(
+        "Built profile index of %d profiles in %.1fs at %s",
+        len(built), time.perf_counter() - started, built.path,
+    )
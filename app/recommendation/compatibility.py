@@ -0,0 +1,321 @@
+"""
+Precomputed user compatibility.
+
+A background job keeps the `user_compatibility` table filled with each
+user's COMPATIBILITY_TOP_K best matches. Every run only rescores profiles
+whose `updated_at` is newer than the last run (the newest `computed_at` in
+the table): their own top matches are rebuilt, stored rows pointing at
+them from other users' lists get their scores refreshed, and they are
+inserted into any other list whose K-th best they now beat.
+
+Compatibility reads are then a primary-key lookup; a pair that is missing
+or older than either profile is scored inline as before.
+
+Run once from the command line with `python -m app.recommendation.compatibility`.
+"""
+import asyncio
+import logging
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import delete, func, text, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+
+from app.constant import (
+    COMPATIBILITY_REFRESH_ENABLED,
+    COMPATIBILITY_REFRESH_INTERVAL,
+    COMPATIBILITY_TOP_K,
+)
+from app.database.database import engine
+from app.models.models import CompatibilityScore, MusicProfile
+from .datamodels import UserCompatibility
+from .music_recommender import (
+    NUMERIC_SIMILARITIES,
+    TEXT_SIMILARITIES,
+    MusicRecommender,
+    recommender,
+)
+
+logger = logging.getLogger(__name__)
+
+BREAKDOWN_KEYS = [sim_key for sim_key, _ in TEXT_SIMILARITIES + NUMERIC_SIMILARITIES] + [
+    "listening_pattern_similarity"
+]
+# Keeps IN lists and multi-row inserts a reasonable size
+CHUNK_SIZE = 1000
+# Only one worker runs a refresh at a time (Postgres advisory lock key)
+REFRESH_LOCK_KEY = zlib.crc32(b"user_compatibility_refresh")
+
+
+def find_compatibility(
+    session: Session, profile: MusicProfile, other_profile: MusicProfile
+) -> Optional[CompatibilityScore]:
+    """The stored score for the pair, if computed after both profiles changed"""
+    row = session.get(CompatibilityScore, (profile.user_id, other_profile.user_id))
+    if row is None:
+        row = session.get(CompatibilityScore, (other_profile.user_id, profile.user_id))
+    if row is None or row.computed_at < max(profile.updated_at, other_profile.updated_at):
+        return None
+    return row
+
+
+def to_compatibility(row: CompatibilityScore) -> UserCompatibility:
+    return UserCompatibility(overall_similarity=row.overall_similarity, **(row.breakdown or {}))
+
+
+def get_compatibility(
+    session: Session,
+    profile: MusicProfile,
+    other_profile: MusicProfile,
+    music_recommender: MusicRecommender = recommender,
+) -> UserCompatibility:
+    """Stored compatibility of two profiles, scoring them inline on a miss"""
+    row = find_compatibility(session, profile, other_profile)
+    if row is not None:
+        return to_compatibility(row)
+    return music_recommender.calculate_overall_similarity(profile.dict(), other_profile.dict())
+
+
+def top_compatibility_statement(user_id: UUID, limit: int, min_score: float = 0.0):
+    """A user's best stored matches, served by ix_user_compatibility_user_score"""
+    return (
+        select(CompatibilityScore)
+        .where(
+            CompatibilityScore.user_id == user_id,
+            CompatibilityScore.overall_similarity >= min_score,
+        )
+        .order_by(CompatibilityScore.overall_similarity.desc())
+        .limit(limit)
+    )
+
+
+def _chunks(items: List[Any], size: int = CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _row(
+    user_id: Any, other_user_id: Any, scores: Dict[str, np.ndarray], index: int,
+    computed_at: datetime,
+) -> Dict[str, Any]:
+    return {
+        "user_id": user_id,
+        "other_user_id": other_user_id,
+        "overall_similarity": float(scores["overall_similarity"][index]),
+        "breakdown": {key: float(scores[key][index]) for key in BREAKDOWN_KEYS},
+        "computed_at": computed_at,
+    }
+
+
+def _upsert(session: Session, rows: List[Dict[str, Any]]) -> None:
+    dialect = postgresql if session.get_bind().dialect.name == "postgresql" else sqlite
+    for chunk in _chunks(rows):
+        statement = dialect.insert(CompatibilityScore).values(chunk)
+        session.exec(
+            statement.on_conflict_do_update(
+                index_elements=["user_id", "other_user_id"],
+                set_={
+                    "overall_similarity": statement.excluded.overall_similarity,
+                    "breakdown": statement.excluded.breakdown,
+                    "computed_at": statement.excluded.computed_at,
+                },
+            )
+        )
+
+
+def _trim(session: Session, user_ids: List[Any], top_k: int) -> None:
+    """Cut the users' stored lists back to their `top_k` best matches"""
+    for chunk in _chunks(user_ids):
+        matches = defaultdict(list)
+        for user_id, other_user_id, score in session.exec(
+            select(
+                CompatibilityScore.user_id,
+                CompatibilityScore.other_user_id,
+                CompatibilityScore.overall_similarity,
+            ).where(CompatibilityScore.user_id.in_(chunk))
+        ):
+            matches[user_id].append((score, other_user_id))
+        dropped = [
+            (user_id, other_user_id)
+            for user_id, scored in matches.items()
+            for _, other_user_id in sorted(scored, reverse=True)[top_k:]
+        ]
+        for dropped_chunk in _chunks(dropped):
+            session.exec(
+                delete(CompatibilityScore).where(
+                    tuple_(CompatibilityScore.user_id, CompatibilityScore.other_user_id).in_(
+                        dropped_chunk
+                    )
+                )
+            )
+
+
+def refresh_compatibility(
+    session: Session,
+    music_recommender: Optional[MusicRecommender] = None,
+    top_k: int = COMPATIBILITY_TOP_K,
+) -> Dict[str, Any]:
+    """
+    Rescore every profile changed since the last run, in one transaction.
+    Runs off the event loop, so it fits its own recommender rather than the
+    one request handlers are reading.
+    """
+    music_recommender = music_recommender or MusicRecommender()
+    started_at = datetime.utcnow()
+    since = session.exec(select(func.max(CompatibilityScore.computed_at))).one()
+
+    profiles = [profile.dict() for profile in session.exec(select(MusicProfile))]
+    changed = [
+        i for i, profile in enumerate(profiles)
+        if since is None or profile["updated_at"] > since
+    ]
+    result = {"profiles": len(profiles), "changed_profiles": len(changed), "rows_written": 0}
+    if not changed or len(profiles) < 2:
+        return result
+
+    music_recommender.fit_if_stale(lambda: profiles)
+    candidates = music_recommender.prepare_candidates(profiles)
+    user_ids = [profile["user_id"] for profile in profiles]
+    position = {user_id: i for i, user_id in enumerate(user_ids)}
+    changed_ids = [user_ids[i] for i in changed]
+    changed_set = set(changed_ids)
+
+    # Other users' stored matches that point at a changed profile
+    referrers = defaultdict(list)
+    for chunk in _chunks(changed_ids):
+        for user_id, other_user_id in session.exec(
+            select(CompatibilityScore.user_id, CompatibilityScore.other_user_id).where(
+                CompatibilityScore.other_user_id.in_(chunk)
+            )
+        ):
+            if user_id not in changed_set and user_id in position:
+                referrers[other_user_id].append(user_id)
+
+    k = min(top_k, len(profiles) - 1)
+    # Score a changed profile must beat to enter an unchanged user's list:
+    # their current K-th best, or anything while the list is short
+    thresholds = np.full(len(profiles), -np.inf)
+    for user_id, worst, count in session.exec(
+        select(
+            CompatibilityScore.user_id,
+            func.min(CompatibilityScore.overall_similarity),
+            func.count(),
+        ).group_by(CompatibilityScore.user_id)
+    ):
+        if user_id in position and count >= k:
+            thresholds[position[user_id]] = worst
+    thresholds[changed] = np.inf
+
+    rows = []
+    extended = set()
+    for i in changed:
+        scores = music_recommender.score_candidates(profiles[i], candidates)
+        overall = scores["overall_similarity"].copy()
+        overall[i] = -np.inf
+        for j in np.argpartition(-overall, k - 1)[:k]:
+            rows.append(_row(user_ids[i], user_ids[j], scores, j, started_at))
+        # Similarity is symmetric, so the same pass rescores the referrers
+        referring = referrers[user_ids[i]]
+        for referrer in referring:
+            rows.append(_row(referrer, user_ids[i], scores, position[referrer], started_at))
+        # ...and inserts the changed profile into lists it now belongs in
+        referring = set(referring)
+        for j in np.flatnonzero(overall > thresholds):
+            if user_ids[j] not in referring:
+                rows.append(_row(user_ids[j], user_ids[i], scores, j, started_at))
+                extended.add(user_ids[j])
+
+    # Changed users' lists are rebuilt from scratch, dropping old matches
+    for chunk in _chunks(changed_ids):
+        session.exec(delete(CompatibilityScore).where(CompatibilityScore.user_id.in_(chunk)))
+    _upsert(session, rows)
+    _trim(session, list(extended), top_k)
+    session.commit()
+
+    result["rows_written"] = len(rows)
+    return result
+
+
+class CompatibilityRefresher:
+    """Runs `refresh_compatibility` every `interval` seconds in the background"""
+
+    def __init__(self, interval: float = COMPATIBILITY_REFRESH_INTERVAL):
+        self.interval = interval
+        # Only ever used by the refresh thread
+        self.recommender = MusicRecommender()
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.skipped = 0
+        self.errors = 0
+        self.last_run: Dict[str, Any] = {}
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        """One refresh, or None when another worker holds the refresh lock"""
+        started = time.perf_counter()
+        with Session(engine) as session:
+            if engine.dialect.name == "postgresql":
+                # Released when refresh_compatibility commits
+                locked = session.exec(
+                    text("SELECT pg_try_advisory_xact_lock(:key)").bindparams(
+                        key=REFRESH_LOCK_KEY
+                    )
+                ).scalar()
+                if not locked:
+                    self.skipped += 1
+                    return None
+            result = refresh_compatibility(session, self.recommender)
+
+        self.runs += 1
+        self.last_run = {
+            **result,
+            "finished_at": datetime.utcnow().isoformat(),
+            "duration": time.perf_counter() - started,
+        }
+        return result
+
+    async def _run_forever(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception:
+                self.errors += 1
+                logger.exception("Compatibility refresh failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if COMPATIBILITY_REFRESH_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "interval": self.interval,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "last_run": self.last_run,
+        }
+
+
+# One refresher per worker; the advisory lock keeps runs from overlapping
+compatibility_refresher = CompatibilityRefresher()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    logging.info("Compatibility refresh: %s", compatibility_refresher.run_once())
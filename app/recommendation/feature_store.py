@@ -0,0 +1,347 @@
+"""
+Columnar, memory-mapped store of the features recommendations score.
+
+Every profile becomes one row of flat arrays instead of a SQLModel object:
+
+- per text field, the profile's tf-idf row in CSR form (`indptr`,
+  `indices`, `data`) over interned integer term ids, with the field's
+  vocabulary and IDF fitted over all rows at build time
+- `numeric`: float32 energy / danceability / diversity / obscurity (NaN
+  when missing)
+- `hours`: float32 24-bin listening hour histograms
+
+Rows are sorted by user id, so a user is found by binary search in the
+memory-mapped `ids` array. Workers `numpy.memmap` the same files and share
+them through the page cache; per-worker memory is the vocabularies plus an
+overlay of profiles synced since the build.
+
+The recommender fits its vectorizers from the stored vocabularies and IDFs
+(`MusicRecommender.use_store`), so stored rows are exactly its tf-idf rows.
+
+Build offline with `python -m app.recommendation.feature_store`; each
+build goes to a new version directory and `CURRENT` is switched over
+atomically.
+"""
+import json
+import logging
+import os
+import shutil
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sqlmodel import Session, select
+
+from app.constant import FEATURE_STORE_PATH
+from app.database.database import engine
+from app.models.models import MusicProfile
+from .music_recommender import (
+    NUMERIC_SIMILARITIES,
+    TEXT_FIELDS,
+    CandidateSet,
+    MusicRecommender,
+)
+
+logger = logging.getLogger(__name__)
+
+METRICS = [metric_key for _, metric_key in NUMERIC_SIMILARITIES]
+# The recommender's tokenizer, so stored terms match its vectorizers
+_analyze = TfidfVectorizer().build_analyzer()
+
+
+class StoreCandidates(NamedTuple):
+    ids: np.ndarray  # user id per candidate row
+    live: np.ndarray  # False for base rows superseded by the overlay
+    candidates: CandidateSet
+
+
+class _Row(NamedTuple):
+    """One profile's features, before or outside the base arrays"""
+
+    text: Dict[str, Tuple[np.ndarray, np.ndarray]]  # field -> (term ids, tf-idf)
+    numeric: np.ndarray
+    hours: np.ndarray
+
+
+def _term_counts(profile: Dict[str, Any], field: str) -> Counter:
+    return Counter(_analyze(MusicRecommender._to_document(profile.get(field))))
+
+
+def _numeric(profile: Dict[str, Any]) -> np.ndarray:
+    return np.array(
+        [np.nan if profile.get(key) is None else profile[key] for key in METRICS],
+        dtype=np.float32,
+    )
+
+
+def _hours(profile: Dict[str, Any]) -> np.ndarray:
+    return np.array(
+        MusicRecommender._hour_vector(profile.get("listening_history")), dtype=np.float32
+    )
+
+
+def _l2_normalize(indptr: np.ndarray, data: np.ndarray) -> np.ndarray:
+    n_rows = len(indptr) - 1
+    row_of = np.repeat(np.arange(n_rows), np.diff(indptr))
+    norms = np.sqrt(np.bincount(row_of, weights=data ** 2, minlength=n_rows))
+    return (data / np.where(norms > 0, norms, 1)[row_of]).astype(np.float32)
+
+
+class FeatureStore:
+    def __init__(self, path: str = FEATURE_STORE_PATH):
+        self.path = Path(path)
+        self.version: Optional[str] = None
+        self.ids: Optional[np.ndarray] = None
+        self.numeric: Optional[np.ndarray] = None
+        self.hours: Optional[np.ndarray] = None
+        self.hour_norms: Optional[np.ndarray] = None
+        # field -> (indptr, indices, data), memory-mapped
+        self.text: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        self.vocabularies: Dict[str, Dict[str, int]] = {}
+        self.idfs: Dict[str, np.ndarray] = {}
+        # Profiles synced since the build, and the base rows they replace
+        self._overlay: Dict[str, _Row] = {}
+        self._stale: Set[str] = set()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.version is not None
+
+    def __len__(self) -> int:
+        base = 0 if self.ids is None else len(self.ids)
+        return base - len(self._stale) + len(self._overlay)
+
+    def build(self, profiles: Iterable[Dict[str, Any]]) -> str:
+        """Write a new version from profile dicts; returns its directory name"""
+        ids: List[str] = []
+        numeric: List[np.ndarray] = []
+        hours: List[np.ndarray] = []
+        vocabularies: Dict[str, Dict[str, int]] = {field: {} for field in TEXT_FIELDS}
+        rows: Dict[str, List[Counter]] = {field: [] for field in TEXT_FIELDS}
+        for profile in profiles:
+            ids.append(str(profile["user_id"]))
+            numeric.append(_numeric(profile))
+            hours.append(_hours(profile))
+            for field in TEXT_FIELDS:
+                vocabulary = vocabularies[field]
+                rows[field].append(Counter({
+                    vocabulary.setdefault(term, len(vocabulary)): count
+                    for term, count in _term_counts(profile, field).items()
+                }))
+
+        order = sorted(range(len(ids)), key=ids.__getitem__)
+        arrays = {
+            "ids": np.array([ids[i] for i in order], dtype=str),
+            "numeric": np.array(
+                [numeric[i] for i in order], dtype=np.float32
+            ).reshape(-1, len(METRICS)),
+            "hours": np.array([hours[i] for i in order], dtype=np.float32).reshape(-1, 24),
+        }
+        arrays["hour_norms"] = np.linalg.norm(arrays["hours"], axis=1)
+        for field in TEXT_FIELDS:
+            counts = [rows[field][i] for i in order]
+            indptr = np.zeros(len(counts) + 1, dtype=np.int64)
+            indptr[1:] = np.cumsum([len(row) for row in counts])
+            indices = np.fromiter(
+                (term for row in counts for term in row), dtype=np.int32, count=indptr[-1]
+            )
+            tf = np.fromiter(
+                (count for row in counts for count in row.values()),
+                dtype=np.float64, count=indptr[-1],
+            )
+            # Smoothed IDF, as TfidfVectorizer computes it
+            df = np.bincount(indices, minlength=len(vocabularies[field]))
+            idf = np.log((1 + len(counts)) / (1 + df)) + 1
+            arrays[f"{field}.indptr"] = indptr
+            arrays[f"{field}.indices"] = indices
+            arrays[f"{field}.data"] = _l2_normalize(indptr, tf * idf[indices])
+            arrays[f"{field}.idf"] = idf
+
+        version = f"v{time.time_ns()}"
+        directory = self.path / version
+        directory.mkdir(parents=True)
+        for name, array in arrays.items():
+            np.save(directory / f"{name}.npy", array)
+        for field, vocabulary in vocabularies.items():
+            (directory / f"{field}.vocab.json").write_text(json.dumps(list(vocabulary)))
+
+        # Switch over atomically. The previous version stays for workers that
+        # are loading it right now; mapped files outlive their deletion.
+        current = self.path / "CURRENT"
+        previous = current.read_text().strip() if current.exists() else None
+        tmp_path = self.path / "CURRENT.tmp"
+        tmp_path.write_text(version)
+        os.replace(tmp_path, current)
+        for old in self.path.iterdir():
+            if old.is_dir() and old.name not in (version, previous):
+                shutil.rmtree(old, ignore_errors=True)
+        return version
+
+    def load(self) -> bool:
+        """Memory-map the current version; False when none has been built"""
+        current = self.path / "CURRENT"
+        if not current.exists():
+            return False
+        version = current.read_text().strip()
+        directory = self.path / version
+
+        def mapped(name: str) -> np.ndarray:
+            return np.load(directory / f"{name}.npy", mmap_mode="r")
+
+        self.ids = mapped("ids")
+        self.numeric = mapped("numeric")
+        self.hours = mapped("hours")
+        self.hour_norms = mapped("hour_norms")
+        self.text = {}
+        self.vocabularies = {}
+        self.idfs = {}
+        for field in TEXT_FIELDS:
+            self.text[field] = tuple(
+                mapped(f"{field}.{part}") for part in ("indptr", "indices", "data")
+            )
+            terms = json.loads((directory / f"{field}.vocab.json").read_text())
+            self.vocabularies[field] = {term: i for i, term in enumerate(terms)}
+            self.idfs[field] = np.load(directory / f"{field}.idf.npy")
+        self._overlay = {}
+        self._stale = set()
+        self.version = version
+        return True
+
+    def _row(self, user_id: str) -> Optional[int]:
+        if self.ids is None or not len(self.ids):
+            return None
+        row = int(np.searchsorted(self.ids, user_id))
+        return row if row < len(self.ids) and self.ids[row] == user_id else None
+
+    def encode(self, profile: Dict[str, Any]) -> _Row:
+        """A profile's features against the stored vocabularies and IDFs"""
+        text = {}
+        for field in TEXT_FIELDS:
+            vocabulary = self.vocabularies[field]
+            # Terms unseen at build time are dropped, as vectorizer.transform does
+            counts = {
+                vocabulary[term]: count
+                for term, count in _term_counts(profile, field).items()
+                if term in vocabulary
+            }
+            indices = np.fromiter(counts, dtype=np.int32, count=len(counts))
+            tfidf = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+            tfidf *= self.idfs[field][indices]
+            norm = np.linalg.norm(tfidf)
+            text[field] = (indices, (tfidf / norm if norm else tfidf).astype(np.float32))
+        return _Row(text, _numeric(profile), _hours(profile))
+
+    def upsert(self, profile: Dict[str, Any]) -> None:
+        """Replace one user's features, e.g. right after a Spotify sync"""
+        user_id = str(profile["user_id"])
+        if self._row(user_id) is not None:
+            self._stale.add(user_id)
+        self._overlay[user_id] = self.encode(profile)
+
+    def field_matrix(self, field: str, rows: Optional[np.ndarray] = None) -> csr_matrix:
+        """The field's tf-idf rows (all of them when `rows` is None)"""
+        indptr, indices, data = self.text[field]
+        matrix = csr_matrix(
+            (data, indices, indptr), shape=(len(indptr) - 1, len(self.idfs[field]))
+        )
+        return matrix if rows is None else matrix[rows]
+
+    def candidate_set(self, user_ids: Optional[Iterable[str]] = None) -> StoreCandidates:
+        """Stacked features of `user_ids` (every stored user when None)"""
+        if user_ids is None:
+            rows = None
+            base_ids = np.asarray(self.ids)
+            overlay_ids = list(self._overlay)
+        else:
+            wanted = {str(user_id) for user_id in user_ids}
+            overlay_ids = [user_id for user_id in wanted if user_id in self._overlay]
+            rows = np.array(
+                sorted(
+                    row for row in map(self._row, wanted - set(overlay_ids))
+                    if row is not None
+                ),
+                dtype=np.int64,
+            )
+            base_ids = np.asarray(self.ids[rows]) if len(rows) else np.array([], dtype=str)
+
+        overlay = [self._overlay[user_id] for user_id in overlay_ids]
+        ids = np.concatenate([base_ids, np.array(overlay_ids, dtype=str)])
+        live = np.ones(len(ids), dtype=bool)
+        if rows is None and self._stale:
+            live[: len(base_ids)] = ~np.isin(base_ids, list(self._stale))
+
+        def base(array: np.ndarray) -> np.ndarray:
+            return np.asarray(array if rows is None else array[rows])
+
+        text = {}
+        for field in TEXT_FIELDS:
+            n_terms = len(self.idfs[field])
+            if not n_terms:
+                continue
+            parts = [self.field_matrix(field, rows)]
+            if overlay:
+                terms = [row.text[field] for row in overlay]
+                parts.append(csr_matrix(
+                    (
+                        np.concatenate([values for _, values in terms]),
+                        np.concatenate([indices for indices, _ in terms]),
+                        np.concatenate([[0], np.cumsum([len(indices) for indices, _ in terms])]),
+                    ),
+                    shape=(len(overlay), n_terms),
+                ))
+            text[field] = vstack(parts, format="csr") if overlay else parts[0]
+
+        numeric = np.vstack([base(self.numeric), *(row.numeric for row in overlay)])
+        hours = np.vstack([base(self.hours), *(row.hours for row in overlay)])
+        hour_norms = np.concatenate(
+            [base(self.hour_norms), np.linalg.norm(hours[len(base_ids):], axis=1)]
+        )
+        return StoreCandidates(
+            ids,
+            live,
+            CandidateSet(
+                len(ids),
+                text,
+                {metric: numeric[:, i].astype(float) for i, metric in enumerate(METRICS)},
+                hours,
+                hour_norms,
+            ),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.is_loaded,
+            "version": self.version,
+            "size": len(self),
+            "base_size": 0 if self.ids is None else len(self.ids),
+            "overlay_size": len(self._overlay),
+            "terms": {field: len(vocabulary) for field, vocabulary in self.vocabularies.items()},
+        }
+
+
+def rebuild(path: str = FEATURE_STORE_PATH) -> FeatureStore:
+    """Build a new store version from every stored MusicProfile"""
+    store = FeatureStore(path)
+    with Session(engine) as session:
+        profiles = session.exec(select(MusicProfile).execution_options(yield_per=1000))
+        store.build(profile.model_dump() for profile in profiles)
+    store.load()
+    return store
+
+
+# Shared by every request in this worker process
+feature_store = FeatureStore()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    started = time.perf_counter()
+    built = rebuild()
+    logging.info(
+        "Built feature store %s of %d profiles in %.1fs",
+        built.version, len(built), time.perf_counter() - started,
+    )
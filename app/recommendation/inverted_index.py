@@ -0,0 +1,137 @@
+"""
+Inverted index from shared music to users, for candidate generation.
+
+Each artist, genre and track maps to a posting list of the users whose
+profile contains it. A target's candidates are the users sharing at least
+one of its items, ranked by how many they share, so recommendations only
+score a few hundred users instead of everyone.
+
+The index lives in memory per worker: it is built from every MusicProfile
+on startup and each profile sync replaces that user's postings.
+"""
+import logging
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlmodel import Session, select
+
+from app.constant import INVERTED_INDEX_CANDIDATES, INVERTED_INDEX_MAX_POSTING
+from app.database.database import engine
+from app.helpers.minhash import INDEXED_FIELDS, profile_terms
+from app.models.models import MusicProfile
+
+logger = logging.getLogger(__name__)
+
+# Terms are "field:item", e.g. "genres:afrobeats"
+Term = str
+
+
+class PostingIndex:
+    def __init__(
+        self,
+        candidates: int = INVERTED_INDEX_CANDIDATES,
+        max_posting: int = INVERTED_INDEX_MAX_POSTING,
+    ):
+        self.candidates = candidates
+        # Terms shared by more users than this (e.g. "genres:pop") are only
+        # counted when the rarer terms leave the candidate set short
+        self.max_posting = max_posting
+        self.postings: Dict[Term, Set[str]] = {}
+        self._terms_by_user: Dict[str, Set[Term]] = {}
+        self.built_at: Optional[float] = None
+        self.searches = 0
+        self.postings_scanned = 0
+
+    def __len__(self) -> int:
+        return len(self._terms_by_user)
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.built_at is not None
+
+    def build(self, profiles: Iterable[Dict[str, Any]]) -> None:
+        # Built aside and swapped in, so searches never see a partial index
+        fresh = PostingIndex(self.candidates, self.max_posting)
+        for profile in profiles:
+            fresh.upsert(profile)
+        self.postings, self._terms_by_user = fresh.postings, fresh._terms_by_user
+        self.built_at = time.time()
+
+    def upsert(self, profile: Dict[str, Any]) -> None:
+        """Replace one user's postings with those of their current profile"""
+        user_id = str(profile["user_id"])
+        self.remove(user_id)
+        terms = profile_terms(profile)
+        for term in terms:
+            self.postings.setdefault(term, set()).add(user_id)
+        self._terms_by_user[user_id] = terms
+
+    def remove(self, user_id: str) -> None:
+        for term in self._terms_by_user.pop(user_id, ()):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            posting.discard(user_id)
+            if not posting:
+                del self.postings[term]
+
+    def search(
+        self,
+        profile: Dict[str, Any],
+        limit: Optional[int] = None,
+        exclude: Optional[Set[str]] = None,
+    ) -> List[Tuple[str, int]]:
+        """Users sharing anything with `profile`: (user_id, overlap), most first"""
+        limit = limit or self.candidates
+        exclude = exclude or set()
+        # Rarest terms first: they are cheap to scan and the most telling
+        postings = sorted(
+            (self.postings[term] for term in profile_terms(profile) if term in self.postings),
+            key=len,
+        )
+
+        overlap: Counter = Counter()
+        for posting in postings:
+            if len(posting) > self.max_posting and len(overlap) >= limit:
+                break
+            overlap.update(posting)
+            self.postings_scanned += len(posting)
+        for user_id in exclude:
+            overlap.pop(user_id, None)
+
+        self.searches += 1
+        return overlap.most_common(limit)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.is_loaded,
+            "users": len(self),
+            "terms": len(self.postings),
+            "candidates": self.candidates,
+            "searches": self.searches,
+            "avg_postings_scanned": (
+                self.postings_scanned / self.searches if self.searches else 0.0
+            ),
+        }
+
+
+def rebuild(index: Optional[PostingIndex] = None) -> PostingIndex:
+    """(Re)build `index` (the shared one by default) from every MusicProfile"""
+    if index is None:
+        index = profile_postings
+    started = time.perf_counter()
+    with Session(engine) as session:
+        profiles = session.exec(
+            select(MusicProfile.user_id, *(getattr(MusicProfile, f) for f in INDEXED_FIELDS))
+        )
+        index.build(dict(zip(("user_id", *INDEXED_FIELDS), row)) for row in profiles)
+    logger.info(
+        "Built posting index of %d users, %d terms in %.1fs",
+        len(index), len(index.postings), time.perf_counter() - started,
+    )
+    return index
+
+
+# Shared by every request in this worker process
+profile_postings = PostingIndex()
@@ -0,0 +1,164 @@
+"""
+LSH banding index over MinHash signatures, for finding high-overlap users.
+
+A signature is cut into `bands` bands of `rows` values; users whose band
+values are identical land in the same bucket. Two profiles with Jaccard
+similarity J share at least one bucket with probability
+1 - (1 - J**rows)**bands, so a lookup touches a handful of buckets instead
+of every user. Matches are ranked by their estimated Jaccard similarity.
+
+Signatures are stored on MusicProfile (see `MusicProfile.minhash`); the
+index is built from them on startup and each profile sync replaces one.
+"""
+import logging
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlmodel import Session, select
+
+from app.constant import LSH_BANDS, LSH_MAX_BUCKET, MINHASH_PERMUTATIONS
+from app.database.database import engine
+from app.helpers.minhash import INDEXED_FIELDS, minhash_signature, profile_terms
+from app.models.models import MusicProfile
+
+logger = logging.getLogger(__name__)
+
+# Odd multipliers for folding a band's values into one bucket key
+_BAND_MIX = np.array(
+    [(0x9E3779B97F4A7C15 * (i + 1)) % 2**64 | 1 for i in range(MINHASH_PERMUTATIONS)],
+    dtype=np.uint64,
+)
+
+
+class LSHIndex:
+    def __init__(self, bands: int = LSH_BANDS, max_bucket: int = LSH_MAX_BUCKET):
+        if MINHASH_PERMUTATIONS % bands:
+            raise ValueError("MINHASH_PERMUTATIONS must be a multiple of the LSH bands")
+        self.bands = bands
+        self.rows = MINHASH_PERMUTATIONS // bands
+        # Buckets this full (e.g. everyone whose only tag is "pop") say little
+        # about overlap and are not expanded
+        self.max_bucket = max_bucket
+        # Per band: hash of the band's values -> users
+        self.buckets: List[Dict[int, Set[str]]] = [{} for _ in range(bands)]
+        self.signatures: Dict[str, np.ndarray] = {}
+        self.built_at: Optional[float] = None
+        self.searches = 0
+        self.candidates_checked = 0
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.built_at is not None
+
+    def _band_keys(self, signature: np.ndarray):
+        # uint64 arithmetic wraps, which is fine for a hash
+        keys = (
+            signature.astype(np.uint64).reshape(self.bands, self.rows) * _BAND_MIX[: self.rows]
+        ).sum(axis=1, dtype=np.uint64)
+        return enumerate(keys.tolist())
+
+    def build(self, signatures: Dict[str, List[int]]) -> None:
+        # Built aside and swapped in, so searches never see a partial index
+        fresh = LSHIndex(self.bands, self.max_bucket)
+        for user_id, signature in signatures.items():
+            fresh.upsert(user_id, signature)
+        self.buckets, self.signatures = fresh.buckets, fresh.signatures
+        self.built_at = time.time()
+
+    def upsert(self, user_id: str, signature: Optional[List[int]]) -> None:
+        user_id = str(user_id)
+        self.remove(user_id)
+        if not signature:
+            return
+        signature = np.asarray(signature, dtype=np.int64)
+        for band, key in self._band_keys(signature):
+            self.buckets[band].setdefault(key, set()).add(user_id)
+        self.signatures[user_id] = signature
+
+    def remove(self, user_id: str) -> None:
+        signature = self.signatures.pop(user_id, None)
+        if signature is None:
+            return
+        for band, key in self._band_keys(signature):
+            bucket = self.buckets[band].get(key)
+            if bucket is None:
+                continue
+            bucket.discard(user_id)
+            if not bucket:
+                del self.buckets[band][key]
+
+    def search(
+        self,
+        signature: Optional[List[int]],
+        limit: int,
+        exclude: Optional[Set[str]] = None,
+    ) -> List[Tuple[str, float]]:
+        """High-overlap users: (user_id, estimated Jaccard), best first"""
+        if not signature:
+            return []
+        signature = np.asarray(signature, dtype=np.int64)
+        candidates: Set[str] = set()
+        for band, key in self._band_keys(signature):
+            bucket = self.buckets[band].get(key)
+            if bucket and len(bucket) <= self.max_bucket:
+                candidates |= bucket
+        candidates -= exclude or set()
+
+        self.searches += 1
+        self.candidates_checked += len(candidates)
+        if not candidates:
+            return []
+
+        ids = list(candidates)
+        estimates = (np.vstack([self.signatures[i] for i in ids]) == signature).mean(axis=1)
+        k = min(limit, len(ids))
+        top = np.argpartition(-estimates, k - 1)[:k]
+        top = top[np.argsort(-estimates[top], kind="stable")]
+        return [(ids[i], float(estimates[i])) for i in top]
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "loaded": self.is_loaded,
+            "users": len(self),
+            "bands": self.bands,
+            "rows": self.rows,
+            "buckets": sum(len(buckets) for buckets in self.buckets),
+            "searches": self.searches,
+            "avg_candidates_checked": (
+                self.candidates_checked / self.searches if self.searches else 0.0
+            ),
+        }
+
+
+def rebuild(index: Optional[LSHIndex] = None) -> LSHIndex:
+    """(Re)build `index` (the shared one by default) from stored signatures"""
+    if index is None:
+        index = profile_lsh
+    started = time.perf_counter()
+    signatures = {}
+    with Session(engine) as session:
+        rows = session.exec(
+            select(
+                MusicProfile.user_id,
+                MusicProfile.minhash,
+                *(getattr(MusicProfile, field) for field in INDEXED_FIELDS),
+            )
+        )
+        for user_id, minhash, *items in rows:
+            # Profiles saved before signatures existed are sketched here
+            if minhash is None:
+                minhash = minhash_signature(profile_terms(dict(zip(INDEXED_FIELDS, items))))
+            signatures[str(user_id)] = minhash
+    index.build(signatures)
+    logger.info(
+        "Built LSH index of %d users in %.1fs", len(index), time.perf_counter() - started
+    )
+    return index
+
+
+# Shared by every request in this worker process
+profile_lsh = LSHIndex()
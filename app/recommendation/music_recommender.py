@@ -1,14 +1,251 @@
-from typing import Dict, List, Any
+import asyncio
+import logging
+import time
+from datetime import datetime
+from itertools import chain
+from typing import (
+    TYPE_CHECKING, Callable, Collection, Dict, List, Any, NamedTuple, Optional, Tuple, Union,
+)
+
+import numpy as np
+from scipy.sparse import csr_matrix
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
+from sqlmodel import Session, select
 
+from app.constant import RECOMMENDER_REFIT_INTERVAL
+from app.database.database import engine
+from app.helpers.minhash import minhash_signature, profile_terms
 from app.models.models import MusicProfile
 from .datamodels import RecommendedUser, SharedMusic, UserCompatibility
+from .inverted_index import PostingIndex, profile_postings
+from .lsh_index import LSHIndex, profile_lsh
+
+if TYPE_CHECKING:
+    from .feature_store import FeatureStore
+
+logger = logging.getLogger(__name__)
+
+# Profile fields compared with TF-IDF cosine similarity
+TEXT_FIELDS = ("genres", "top_artists", "top_tracks", "favorite_decades")
+
+# A profile's l2-normalised tf-idf row for one field: term index -> weight
+SparseVector = Dict[int, float]
+
+TEXT_SIMILARITIES = (
+    ("genre_similarity", "genres"),
+    ("artist_similarity", "top_artists"),
+    ("track_similarity", "top_tracks"),
+    ("decade_similarity", "favorite_decades"),
+)
+NUMERIC_SIMILARITIES = (
+    ("energy_similarity", "energy_score"),
+    ("danceability_similarity", "danceability_score"),
+    ("diversity_similarity", "diversity_score"),
+    ("obscurity_similarity", "obscurity_score"),
+)
+SIMILARITY_WEIGHTS = {
+    "genre_similarity": 0.20,
+    "artist_similarity": 0.20,
+    "track_similarity": 0.15,
+    "energy_similarity": 0.07,
+    "danceability_similarity": 0.07,
+    "diversity_similarity": 0.07,
+    "obscurity_similarity": 0.07,
+    "decade_similarity": 0.07,
+    "listening_pattern_similarity": 0.1,
+}
+
+
+class FittedVocabulary(NamedTuple):
+    """
+    One fit's per-field vectorizers and the profile vectors made with them.
+    A refit builds a new one and swaps it in whole, so readers holding the
+    old one keep scoring against a consistent vocabulary.
+    """
+
+    field_vectorizers: Dict[str, Optional[TfidfVectorizer]]
+    # user_id -> (updated_at, field -> tf-idf row)
+    profile_vectors: Dict[Any, Tuple[Any, Dict[str, SparseVector]]]
+    fitted_at: float
+    # The feature store version the vocabularies came from, if any
+    fitted_from: Optional[str] = None
+
+
+class CandidateSet(NamedTuple):
+    """Candidate profiles stacked into matrices, reusable across targets"""
+
+    size: int
+    text: Dict[str, csr_matrix]  # field -> (size x n_terms) tf-idf rows
+    numeric: Dict[str, np.ndarray]  # metric -> values, nan when missing
+    hours: np.ndarray  # (size x 24) listening hour histograms
+    hour_norms: np.ndarray
+    # The vocabulary `text` was built with; targets are scored with it too
+    vocabulary: Optional[FittedVocabulary] = None
 
 
 class MusicRecommender:
-    def __init__(self):
+    def __init__(
+        self,
+        refit_interval: float = RECOMMENDER_REFIT_INTERVAL,
+        postings: Optional[PostingIndex] = None,
+        lsh: Optional[LSHIndex] = None,
+        load_profiles: Optional[Callable[[], List[Dict[str, Any]]]] = None,
+    ):
         self.vectorizer = TfidfVectorizer()
+        self.refit_interval = refit_interval
+        # Every profile to fit on, refitted in the background by a
+        # RecommenderRefitter; without it, the profiles passed to
+        # get_user_recommendations are fitted on
+        self.load_profiles = load_profiles
+        # Candidate generation: only users sharing music get scored
+        self.postings = postings
+        self.lsh = lsh
+        # One vocabulary/IDF per text field, fitted over every profile;
+        # only ever replaced, never changed in place
+        self.vocabulary: Optional[FittedVocabulary] = None
+        # Set by use_store: vocabularies and candidates come from its arrays
+        self.store: Optional["FeatureStore"] = None
+
+    @staticmethod
+    def _to_document(items: Optional[List[Any]]) -> str:
+        return " ".join(str(item) for item in items or [])
+
+    @staticmethod
+    def _to_sparse_vector(row) -> SparseVector:
+        return dict(zip(row.indices.tolist(), row.data.tolist()))
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.vocabulary is not None
+
+    @property
+    def field_vectorizers(self) -> Dict[str, Optional[TfidfVectorizer]]:
+        return self.vocabulary.field_vectorizers if self.vocabulary else {}
+
+    @property
+    def fitted_at(self) -> Optional[float]:
+        return self.vocabulary.fitted_at if self.vocabulary else None
+
+    @property
+    def fitted_from(self) -> Optional[str]:
+        return self.vocabulary.fitted_from if self.vocabulary else None
+
+    def needs_refit(self) -> bool:
+        return (
+            not self.is_fitted
+            or time.monotonic() - self.fitted_at > self.refit_interval
+        )
+
+    def fit(self, profiles: List[Dict[str, Any]]) -> None:
+        """Fit each text field's vocabulary and IDF once over all profiles"""
+        self.vocabulary = self.fit_vocabulary(profiles)
+
+    def fit_vocabulary(self, profiles: List[Dict[str, Any]]) -> FittedVocabulary:
+        """Fit a vocabulary over `profiles` without installing it"""
+        field_vectorizers: Dict[str, Optional[TfidfVectorizer]] = {}
+        rows_by_field: Dict[str, List[SparseVector]] = {}
+        for field in TEXT_FIELDS:
+            vectorizer = TfidfVectorizer()
+            try:
+                matrix = vectorizer.fit_transform(
+                    [self._to_document(profile.get(field)) for profile in profiles]
+                )
+            except ValueError:
+                # No profile has any terms for this field yet
+                field_vectorizers[field] = None
+                continue
+            field_vectorizers[field] = vectorizer
+            rows_by_field[field] = [self._to_sparse_vector(row) for row in matrix]
+
+        # The fitted profiles' vectors come for free from fit_transform
+        profile_vectors = {
+            profile["user_id"]: (
+                profile.get("updated_at"),
+                {field: rows[i] for field, rows in rows_by_field.items()},
+            )
+            for i, profile in enumerate(profiles)
+            if profile.get("user_id") is not None
+        }
+        return FittedVocabulary(field_vectorizers, profile_vectors, time.monotonic())
+
+    def fit_if_stale(self, load_profiles: Callable[[], List[Dict[str, Any]]]) -> None:
+        """
+        Refit from `load_profiles()` when never fitted or past the interval.
+        With a feature store in use, its vocabularies are used instead.
+        """
+        if self.store is not None:
+            self.fit_from_store(self.store)
+        elif self.needs_refit():
+            self.fit(load_profiles())
+
+    def fit_from_store(self, store: "FeatureStore") -> None:
+        """Adopt the store's vocabularies and IDFs, unless already fitted from them"""
+        if self.fitted_from == store.version:
+            return
+        field_vectorizers: Dict[str, Optional[TfidfVectorizer]] = {}
+        for field in TEXT_FIELDS:
+            vocabulary = store.vocabularies.get(field)
+            if not vocabulary:
+                field_vectorizers[field] = None
+                continue
+            vectorizer = TfidfVectorizer()
+            vectorizer.vocabulary_ = vocabulary
+            vectorizer.idf_ = store.idfs[field]
+            field_vectorizers[field] = vectorizer
+        self.vocabulary = FittedVocabulary(
+            field_vectorizers, {}, time.monotonic(), store.version
+        )
+
+    def use_store(self, store: "FeatureStore") -> None:
+        """Score candidates out of a loaded FeatureStore from now on"""
+        self.fit_from_store(store)
+        self.store = store
+
+    def profile_vectors(
+        self, profile: Dict[str, Any], vocabulary: Optional[FittedVocabulary] = None
+    ) -> Dict[str, SparseVector]:
+        """
+        Get a profile's per-field vectors under `vocabulary` (the current one
+        by default), transforming only when the profile changed. Vectors are
+        cached on the vocabulary that made them, so a refit drops them.
+        """
+        vocabulary = vocabulary or self.vocabulary
+        user_id = profile.get("user_id")
+        version = profile.get("updated_at")
+        cached = vocabulary.profile_vectors.get(user_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        vectors = {}
+        for field, vectorizer in vocabulary.field_vectorizers.items():
+            if vectorizer is not None:
+                vectors[field] = self._to_sparse_vector(
+                    vectorizer.transform([self._to_document(profile.get(field))])
+                )
+
+        if user_id is not None:
+            vocabulary.profile_vectors[user_id] = (version, vectors)
+        return vectors
+
+    def calculate_vector_similarity(
+        self,
+        vectors1: Dict[str, SparseVector],
+        vectors2: Dict[str, SparseVector],
+        field: str,
+    ) -> float:
+        """Cosine similarity of precomputed rows: a sparse dot product"""
+        vector1 = vectors1.get(field)
+        vector2 = vectors2.get(field)
+        if not vector1 or not vector2:
+            return 0.0
+        if len(vector1) > len(vector2):
+            vector1, vector2 = vector2, vector1
+        return sum(
+            weight * vector2[term]
+            for term, weight in vector1.items()
+            if term in vector2
+        )
 
     def calculate_text_similarity(self, text1: List[str], text2: List[str]) -> float:
         """Calculate cosine similarity between two lists of text items"""
@@ -49,12 +286,13 @@ class MusicRecommender:
 
         return 0.0
 
-    def calculate_overall_similarity(
-        self, profile1: Dict[str, Any], profile2: Dict[str, Any]
-    ) -> UserCompatibility:
-        """Calculate overall similarity between two user profiles with detailed breakdown"""
-        similarities: Dict[str, float] = {}
-
+    def _calculate_pairwise_text_similarities(
+        self,
+        profile1: Dict[str, Any],
+        profile2: Dict[str, Any],
+        similarities: Dict[str, float],
+    ) -> None:
+        """Per-pair TF-IDF fallback, used until the recommender has been fitted"""
         # Genre similarity using cosine similarity
         genres1 = profile1.get("genres", [])
         genres2 = profile2.get("genres", [])
@@ -63,32 +301,19 @@ class MusicRecommender:
         )
 
         # Artist similarity using cosine similarity
-        artists1 = [artist for artist in profile1.get("top_artists", [])]
-        artists2 = [artist for artist in profile2.get("top_artists", [])]
+        artists1 = [artist for artist in profile1.get("top_artists") or []]
+        artists2 = [artist for artist in profile2.get("top_artists") or []]
         similarities["artist_similarity"] = self.calculate_text_similarity(
             artists1, artists2
         )
 
         # Track similarity using cosine similarity
-        tracks1 = [track for track in profile1.get("top_tracks", [])]
-        tracks2 = [track for track in profile2.get("top_tracks", [])]
+        tracks1 = [track for track in profile1.get("top_tracks") or []]
+        tracks2 = [track for track in profile2.get("top_tracks") or []]
         similarities["track_similarity"] = self.calculate_text_similarity(
             tracks1, tracks2
         )
 
-        # Numeric profile metrics similarity
-        metric_pairs = [
-            ("energy_similarity", "energy_score"),
-            ("danceability_similarity", "danceability_score"),
-            ("diversity_similarity", "diversity_score"),
-            ("obscurity_similarity", "obscurity_score"),
-        ]
-
-        for sim_key, metric_key in metric_pairs:
-            similarities[sim_key] = self.calculate_numeric_similarity(
-                profile1.get(metric_key, 0.0), profile2.get(metric_key, 0.0)
-            )
-
         # Decade preference similarity
         decades1 = profile1.get("favorite_decades", [])
         decades2 = profile2.get("favorite_decades", [])
@@ -99,6 +324,31 @@ class MusicRecommender:
         else:
             similarities["decade_similarity"] = 0.0
 
+    def calculate_overall_similarity(
+        self, profile1: Dict[str, Any], profile2: Dict[str, Any]
+    ) -> UserCompatibility:
+        """Calculate overall similarity between two user profiles with detailed breakdown"""
+        similarities: Dict[str, float] = {}
+
+        vocabulary = self.vocabulary
+        if vocabulary is not None:
+            vectors1 = self.profile_vectors(profile1, vocabulary)
+            vectors2 = self.profile_vectors(profile2, vocabulary)
+            for sim_key, field in TEXT_SIMILARITIES:
+                similarities[sim_key] = self.calculate_vector_similarity(
+                    vectors1, vectors2, field
+                )
+        else:
+            self._calculate_pairwise_text_similarities(
+                profile1, profile2, similarities
+            )
+
+        # Numeric profile metrics similarity
+        for sim_key, metric_key in NUMERIC_SIMILARITIES:
+            similarities[sim_key] = self.calculate_numeric_similarity(
+                profile1.get(metric_key, 0.0), profile2.get(metric_key, 0.0)
+            )
+
         # Listening patterns similarity
         similarities["listening_pattern_similarity"] = (
             self.calculate_listening_patterns_similarity(
@@ -108,20 +358,8 @@ class MusicRecommender:
         )
 
         # Calculate weighted overall similarity
-        weights = {
-            "genre_similarity": 0.20,
-            "artist_similarity": 0.20,
-            "track_similarity": 0.15,
-            "energy_similarity": 0.07,
-            "danceability_similarity": 0.07,
-            "diversity_similarity": 0.07,
-            "obscurity_similarity": 0.07,
-            "decade_similarity": 0.07,
-            "listening_pattern_similarity": 0.1,
-        }
-
         overall_similarity = sum(
-            similarities[key] * weight for key, weight in weights.items()
+            similarities[key] * weight for key, weight in SIMILARITY_WEIGHTS.items()
         )
 
         return UserCompatibility(
@@ -129,27 +367,323 @@ class MusicRecommender:
             **similarities
         )
 
+    @staticmethod
+    def _stack_rows(rows: List[SparseVector], n_terms: int) -> csr_matrix:
+        """Stack per-profile rows into one candidates x terms CSR matrix"""
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(row) for row in rows], out=indptr[1:])
+        indices = np.fromiter(chain.from_iterable(rows), dtype=np.int64)
+        data = np.fromiter(
+            chain.from_iterable(row.values() for row in rows), dtype=np.float64
+        )
+        return csr_matrix((data, indices, indptr), shape=(len(rows), n_terms))
+
+    @staticmethod
+    def _hour_vector(patterns: Optional[Dict[str, Any]]) -> List[float]:
+        hours = (patterns or {}).get("by_hour") or {}
+        return [hours.get(str(h), 0) for h in range(24)]
+
+    def prepare_candidates(
+        self,
+        candidates: List[Dict[str, Any]],
+        vocabulary: Optional[FittedVocabulary] = None,
+    ) -> CandidateSet:
+        """
+        Stack the candidates' features once, so many targets can be scored
+        against them with `score_candidates`. The recommender must be fitted,
+        unless a `vocabulary` to use instead is passed.
+        """
+        vocabulary = vocabulary or self.vocabulary
+        n = len(candidates)
+        candidate_vectors = [
+            self.profile_vectors(profile, vocabulary) for profile in candidates
+        ]
+
+        text = {}
+        for _, field in TEXT_SIMILARITIES:
+            vectorizer = vocabulary.field_vectorizers.get(field)
+            if vectorizer is not None:
+                text[field] = self._stack_rows(
+                    [vectors.get(field, {}) for vectors in candidate_vectors],
+                    len(vectorizer.vocabulary_),
+                )
+
+        numeric = {
+            metric_key: np.array(
+                [profile.get(metric_key) for profile in candidates], dtype=float
+            )
+            for _, metric_key in NUMERIC_SIMILARITIES
+        }
+
+        hours = np.array(
+            [self._hour_vector(profile.get("listening_history")) for profile in candidates],
+            dtype=float,
+        ).reshape(n, 24)
+        return CandidateSet(
+            n, text, numeric, hours, np.linalg.norm(hours, axis=1), vocabulary
+        )
+
+    def score_candidates(
+        self,
+        target: Dict[str, Any],
+        candidates: Union[List[Dict[str, Any]], CandidateSet],
+    ) -> Dict[str, np.ndarray]:
+        """
+        Score one profile against many in a single vectorized pass.
+        Returns one array per similarity component plus `overall_similarity`,
+        aligned with `candidates`. The recommender must be fitted.
+        """
+        if not isinstance(candidates, CandidateSet):
+            candidates = self.prepare_candidates(candidates)
+        n = candidates.size
+        scores: Dict[str, np.ndarray] = {}
+
+        # Text fields: candidate tf-idf matrix times the target's dense row,
+        # with the vocabulary the matrix was built with
+        target_vectors = self.profile_vectors(target, candidates.vocabulary)
+        for sim_key, field in TEXT_SIMILARITIES:
+            matrix = candidates.text.get(field)
+            target_row = target_vectors.get(field)
+            if matrix is None or not target_row:
+                scores[sim_key] = np.zeros(n)
+                continue
+            target_dense = np.zeros(matrix.shape[1])
+            target_dense[list(target_row)] = list(target_row.values())
+            scores[sim_key] = matrix @ target_dense
+
+        # Numeric scores: a missing value on either side scores 0
+        for sim_key, metric_key in NUMERIC_SIMILARITIES:
+            target_value = target.get(metric_key)
+            if target_value is None:
+                scores[sim_key] = np.zeros(n)
+            else:
+                scores[sim_key] = np.nan_to_num(
+                    1 - np.abs(candidates.numeric[metric_key] - target_value)
+                )
+
+        # Listening patterns: cosine over 24-bin hour histograms
+        target_hours = np.array(self._hour_vector(target.get("listening_history")))
+        norms = candidates.hour_norms * np.linalg.norm(target_hours)
+        scores["listening_pattern_similarity"] = np.divide(
+            candidates.hours @ target_hours, norms, out=np.zeros(n), where=norms > 0
+        )
+
+        scores["overall_similarity"] = sum(
+            scores[key] * weight for key, weight in SIMILARITY_WEIGHTS.items()
+        )
+        return scores
+
+    def candidate_ids(self, target: Dict[str, Any], limit: int) -> Optional[List[str]]:
+        """
+        Users sharing the most music with `target`, or None when there is no
+        index to ask (every profile is then a candidate). High-overlap users
+        come from the LSH buckets; the posting lists fill any shortfall.
+        """
+        lsh_ready = self.lsh is not None and self.lsh.is_loaded
+        postings_ready = self.postings is not None and self.postings.is_loaded
+        if not lsh_ready and not postings_ready:
+            return None
+
+        exclude = {str(target.get("user_id"))}
+        wanted = max(self.postings.candidates if postings_ready else 0, limit)
+        candidates: List[str] = []
+        if lsh_ready:
+            signature = target.get("minhash") or minhash_signature(profile_terms(target))
+            candidates = [
+                user_id for user_id, _ in self.lsh.search(signature, wanted, exclude)
+            ]
+        if postings_ready and len(candidates) < wanted:
+            seen = set(candidates)
+            candidates.extend(
+                user_id
+                for user_id, _ in self.postings.search(target, wanted, exclude)
+                if user_id not in seen
+            )
+        return candidates[:wanted]
+
     def get_user_recommendations(
         self,
         target_profile: MusicProfile,
         other_profiles: List[MusicProfile],
         limit: int,
+        min_score: float = 0.0,
+        candidate_ids: Optional[Collection[str]] = None,
     ) -> List[RecommendedUser]:
-        """Get recommended users sorted by similarity score"""
-        recommendations: List[RecommendedUser] = []
+        """
+        Get recommended users sorted by similarity score. Only profiles in
+        `candidate_ids` are scored; by default those are the users sharing
+        the most artists, genres and tracks with the target.
+        """
+        if not other_profiles or limit <= 0:
+            return []
 
-        for profile in other_profiles:
-            similarity_result = self.calculate_overall_similarity(
-                target_profile.to_dict(), profile.to_dict()
+        target = target_profile.dict()
+        vocabulary = self.vocabulary
+        if self.load_profiles is None:
+            self.fit_if_stale(
+                lambda: [target, *(profile.dict() for profile in other_profiles)]
             )
-            recommendations.append(
-                RecommendedUser(
-                    user_id=profile.user_id,
-                    similarity_score=similarity_result.overall_similarity,
-                    compatibility=similarity_result,
-                )
+            vocabulary = self.vocabulary
+        elif vocabulary is None:
+            # Vocabularies and IDFs are shared by every request, so they are
+            # fitted over all profiles in the background, never here. Until
+            # the first fit lands, score with one over this request's profiles.
+            vocabulary = self.fit_vocabulary(
+                [target, *(profile.dict() for profile in other_profiles)]
+            )
+        if candidate_ids is None:
+            candidate_ids = self.candidate_ids(target, limit)
+        if candidate_ids is not None:
+            candidate_ids = set(candidate_ids)
+            other_profiles = [
+                profile for profile in other_profiles
+                if str(profile.user_id) in candidate_ids
+            ]
+            if not other_profiles:
+                return []
+        candidates = [profile.dict() for profile in other_profiles]
+
+        scores = self.score_candidates(
+            target, self.prepare_candidates(candidates, vocabulary)
+        )
+        return self._top_recommendations(
+            [candidate["user_id"] for candidate in candidates],
+            scores,
+            scores["overall_similarity"],
+            limit,
+            min_score,
+        )
+
+    def recommend_from_store(
+        self,
+        target_profile: MusicProfile,
+        limit: int,
+        min_score: float = 0.0,
+        candidate_ids: Optional[Collection[str]] = None,
+    ) -> List[RecommendedUser]:
+        """
+        Like get_user_recommendations, with candidates read from the feature
+        store instead of profile objects. Scores every stored user when
+        `candidate_ids` is None and there is no index to generate them.
+        """
+        if limit <= 0:
+            return []
+        target = target_profile.dict()
+        self.fit_from_store(self.store)
+        if candidate_ids is None:
+            candidate_ids = self.candidate_ids(target, limit)
+
+        selection = self.store.candidate_set(candidate_ids)
+        if not len(selection.ids):
+            return []
+        scores = self.score_candidates(target, selection.candidates)
+        eligible = selection.live & (selection.ids != str(target_profile.user_id))
+        overall = np.where(eligible, scores["overall_similarity"], -np.inf)
+        return self._top_recommendations(selection.ids, scores, overall, limit, min_score)
+
+    @staticmethod
+    def _top_recommendations(
+        user_ids: Any,
+        scores: Dict[str, np.ndarray],
+        overall: np.ndarray,
+        limit: int,
+        min_score: float,
+    ) -> List[RecommendedUser]:
+        # Top-k without sorting the whole candidate set
+        eligible = np.flatnonzero(overall >= min_score)
+        k = min(limit, len(eligible))
+        if k == 0:
+            return []
+        top = eligible[np.argpartition(-overall[eligible], k - 1)[:k]]
+        top = top[np.argsort(-overall[top], kind="stable")]
+
+        # Only the returned users get a full compatibility breakdown
+        return [
+            RecommendedUser(
+                user_id=str(user_ids[i]),
+                similarity_score=float(overall[i]),
+                compatibility=UserCompatibility(
+                    **{key: float(values[i]) for key, values in scores.items()}
+                ),
             )
+            for i in top
+        ]
+
+
+def load_all_profiles() -> List[Dict[str, Any]]:
+    """Every stored profile, for fitting the shared vocabularies"""
+    with Session(engine) as session:
+        return [profile.dict() for profile in session.exec(select(MusicProfile))]
+
+
+class RecommenderRefitter:
+    """Refits a recommender's vocabularies every `interval` seconds in the background"""
+
+    def __init__(self, music_recommender: MusicRecommender, interval: Optional[float] = None):
+        self.recommender = music_recommender
+        self.interval = music_recommender.refit_interval if interval is None else interval
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.errors = 0
+        self.last_run: Dict[str, Any] = {}
+
+    def run_once(self) -> Dict[str, Any]:
+        """One refit, from the feature store when one is in use"""
+        started = time.perf_counter()
+        store = self.recommender.store
+        if store is not None:
+            self.recommender.fit_from_store(store)
+            result = {"source": "feature_store", "version": store.version}
+        else:
+            profiles = self.recommender.load_profiles()
+            self.recommender.fit(profiles)
+            result = {"source": "profiles", "profiles": len(profiles)}
+
+        self.runs += 1
+        self.last_run = {
+            **result,
+            "finished_at": datetime.utcnow().isoformat(),
+            "duration": time.perf_counter() - started,
+        }
+        return result
+
+    async def _run_forever(self) -> None:
+        # The first fit runs straight away at startup
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception:
+                self.errors += 1
+                logger.exception("Recommender refit failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "fitted": self.recommender.is_fitted,
+            "fitted_from": self.recommender.fitted_from,
+            "interval": self.interval,
+            "runs": self.runs,
+            "errors": self.errors,
+            "last_run": self.last_run,
+        }
+
 
-        # Sort by similarity score in descending order
-        recommendations.sort(key=lambda x: x.get("similarity_score", 0.0), reverse=True)
-        return recommendations[:limit]
\ No newline at end of file
+recommender = MusicRecommender(
+    postings=profile_postings, lsh=profile_lsh, load_profiles=load_all_profiles
+)
+# Request handlers only read `recommender`; this keeps it fitted
+recommender_refitter = RecommenderRefitter(recommender)
@@ -1,13 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List, Optional
 from uuid import UUID
-from sqlmodel import or_, select
+from sqlmodel import Session, select
 
-from app.helpers.router.utils import get_user_service
-from app.users.users import UserService
+from app.database.async_service import run_db
+from app.helpers.router.utils import get_async_user_service
+from app.music.music import find_music_profile
+from app.users.users import AsyncUserService
 from app.auth.auth import get_authenticated_user
+from app.constant import ANN_CANDIDATES, COMPATIBILITY_TOP_K
 from app.models.models import User, MusicProfile
-from app.recommendation.music_recommender import MusicRecommender
+from app.recommendation.ann_index import profile_index
+from app.recommendation.compatibility import (
+    to_compatibility,
+    top_compatibility_statement,
+)
+from app.recommendation.music_recommender import recommender
 from app.recommendation.datamodels import (
     RecommendedUser,
     UserCompatibility,
@@ -15,92 +23,187 @@ from app.recommendation.datamodels import (
 )
 
 router = APIRouter()
-recommender = MusicRecommender()
 
 
 @router.get("/users", response_model=List[RecommendedUser])
 async def get_recommended_users(
-    request: Request,
     limit: int = 10,
     min_score: float = 0.0,
-    genres: Optional[List[str]] = None,
+    genres: Optional[List[str]] = Query(None),
+    user_service: AsyncUserService = Depends(get_async_user_service),
     current_user: User = Depends(get_authenticated_user),
 ):
     """Get recommended users based on music taste"""
+    # Queries and scoring run together, off the event loop
+    return await run_db(
+        user_service.db, _recommend_users, current_user.id, limit, min_score, genres
+    )
+
+
+@router.get("/compatibility/{user_id}", response_model=UserCompatibility)
+async def get_user_compatibility(
+    user_id: UUID,
+    user_service: AsyncUserService = Depends(get_async_user_service),
+    current_user: User = Depends(get_authenticated_user)
+):
+    """Get detailed compatibility analysis with another user"""
+    return await user_service.get_user_compatibility(
+        current_user.id, user_id
+    )
+
+
+def _recommend_users(
+    session: Session,
+    user_id: UUID,
+    limit: int,
+    min_score: float,
+    genres: Optional[List[str]],
+) -> List[RecommendedUser]:
     # Get current user's music profile
-    current_profile = request.app.get(MusicProfile, current_user.id)
+    current_profile = find_music_profile(session, user_id)
     if not current_profile:
         raise HTTPException(status_code=404, detail="Music profile not found")
 
-    # Get all other users' profiles
-    # If genres contains values: The query filters based on the or_ conditions.
-    # If genres is empty: The 1 == 1 condition keeps the query valid without applying any additional filtering.
+    # Unfiltered requests are served from the precomputed top matches
+    if not genres and limit <= COMPATIBILITY_TOP_K:
+        stored = _get_stored_recommendations(session, current_profile, limit, min_score)
+        if stored is not None:
+            return stored
+
+    # With the indexes built, only users sharing music with the current user
+    # and approximate neighbours are scored exactly
+    target = current_profile.dict()
+    candidate_ids = recommender.candidate_ids(target, limit)
+    if profile_index.is_loaded:
+        neighbours = profile_index.search(
+            target,
+            k=max(ANN_CANDIDATES, limit),
+            exclude={str(user_id)},
+        )
+        candidate_ids = [
+            *(candidate_ids or []), *(neighbour_id for neighbour_id, _ in neighbours)
+        ]
+
     statement = select(MusicProfile, User).where(
-        MusicProfile.user_id != current_user.id,
+        MusicProfile.user_id != user_id,
         User.id == MusicProfile.user_id,
-        (
-            or_(MusicProfile.genres.contains(genre) for genre in genres)
-            if genres
-            else (1 == 1)
-        ),
     )
-    results = request.state.db.exec(statement).all()
+    if recommender.store is not None and not genres:
+        # Candidates are scored from the feature store's arrays; only the
+        # returned users' profiles are loaded
+        recommendations = recommender.recommend_from_store(
+            current_profile, limit=limit, min_score=min_score, candidate_ids=candidate_ids
+        )
+        statement = statement.where(
+            MusicProfile.user_id.in_([UUID(rec.user_id) for rec in recommendations])
+        )
+        results = session.exec(statement).all() if recommendations else []
+    else:
+        # Get the candidates' profiles, optionally sharing any of `genres`.
+        # `&&` (array overlap) is served by the GIN index on genres.
+        if genres:
+            statement = statement.where(MusicProfile.genres.overlap(genres))
+        if candidate_ids is not None:
+            statement = statement.where(
+                MusicProfile.user_id.in_(
+                    {UUID(candidate_id) for candidate_id in candidate_ids}
+                )
+            )
+        results = session.exec(statement).all()
+
+        # Get recommendations, scored against all candidates in one pass
+        recommendations = recommender.get_user_recommendations(
+            current_profile,
+            [profile for profile, _ in results],
+            limit=limit,
+            min_score=min_score,
+            candidate_ids=candidate_ids,
+        )
 
     if not results:
         return []
 
-    # Convert profiles to dictionaries
-    other_profiles = []
     other_profiles_map = {}
     user_map = {}
-
     for profile, user in results:
-        other_profiles.append(profile)
         other_profiles_map[str(user.id)] = profile
         user_map[str(user.id)] = user
 
-    # Get recommendations
-    recommendations: List[RecommendedUser] = recommender.get_user_recommendations(
-        current_profile, other_profiles, limit=limit
-    )
-
     # Enhance recommendations with user details
     enhanced_recommendations = []
     for rec in recommendations:
-        user = user_map.get(rec["user_id"])
+        user = user_map.get(rec.user_id)
         if user:
             # Get shared music details for this user
             shared_music = _get_shared_music(
-                current_profile, other_profiles_map[rec["user_id"]]
+                current_profile, other_profiles_map[rec.user_id]
             )
             rec.compatibility.shared_music = shared_music
 
-            rec.username = user.username
+            rec.username = user.spotify_id
             rec.display_name = user.display_name
-            rec.avatar_url = user.avatar_url
+            rec.avatar_url = user.spotify_image_url
 
             enhanced_recommendations.append(rec)
 
     return enhanced_recommendations
 
 
-@router.get("/compatibility/{user_id}", response_model=UserCompatibility)
-async def get_user_compatibility(
-    user_id: UUID,
-    user_service: UserService = Depends(get_user_service),
-    current_user: User = Depends(get_authenticated_user)
-):
-    """Get detailed compatibility analysis with another user"""
-    return user_service.get_user_compatibility(
-        current_user.id, user_id
-    )
+def _get_stored_recommendations(
+    session: Session,
+    current_profile: MusicProfile,
+    limit: int,
+    min_score: float,
+) -> Optional[List[RecommendedUser]]:
+    """
+    The user's best matches from user_compatibility, or None when they have
+    not been computed since either side's profile last changed
+    """
+    rows = session.exec(
+        top_compatibility_statement(current_profile.user_id, limit, min_score)
+    ).all()
+    if not rows or any(row.computed_at < current_profile.updated_at for row in rows):
+        return None
+
+    results = session.exec(
+        select(MusicProfile, User).where(
+            User.id == MusicProfile.user_id,
+            MusicProfile.user_id.in_([row.other_user_id for row in rows]),
+        )
+    ).all()
+    matches = {profile.user_id: (profile, user) for profile, user in results}
+    if any(
+        row.other_user_id in matches
+        and row.computed_at < matches[row.other_user_id][0].updated_at
+        for row in rows
+    ):
+        return None
+
+    recommendations = []
+    for row in rows:
+        if row.other_user_id not in matches:
+            continue
+        profile, user = matches[row.other_user_id]
+        compatibility = to_compatibility(row)
+        compatibility.shared_music = _get_shared_music(current_profile, profile)
+        recommendations.append(
+            RecommendedUser(
+                user_id=str(user.id),
+                similarity_score=row.overall_similarity,
+                compatibility=compatibility,
+                username=user.spotify_id,
+                display_name=user.display_name,
+                avatar_url=user.spotify_image_url,
+            )
+        )
+    return recommendations
 
 
 def _get_shared_music(profile1: MusicProfile, profile2: MusicProfile) -> SharedMusic:
     """Calculate shared music between two profiles."""
     shared_music = SharedMusic(
-        artists=list(set(profile1.top_artists) & set(profile2.top_artists)),
-        tracks=list(set(profile1.top_tracks) & set(profile2.top_tracks)),
-        genres=list(set(profile1.genres) & set(profile2.genres)),
+        artists=list(set(profile1.top_artists or []) & set(profile2.top_artists or [])),
+        tracks=list(set(profile1.top_tracks or []) & set(profile2.top_tracks or [])),
+        genres=list(set(profile1.genres or []) & set(profile2.genres or [])),
     )
     return shared_music
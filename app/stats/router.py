@@ -0,0 +1,152 @@
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends
+
+from app.auth.auth import get_authenticated_user
+from app.auth.token_cache import auth_token_cache
+from app.database.database import pool_stats
+from app.helpers.artist_cache import artist_cache
+from app.helpers.rate_limit import spotify_scheduler
+from app.helpers.response_cache import music_response_cache
+from app.helpers.single_flight import spotify_inflight
+from app.models.models import User
+from app.music.music import spotify_sync_queue
+from app.music.refresh import profile_refresher
+from app.realtime.handlers import manager
+from app.realtime.presence import presence
+from app.recommendation.ann_index import profile_index
+from app.recommendation.compatibility import compatibility_refresher
+from app.recommendation.feature_store import feature_store
+from app.recommendation.inverted_index import profile_postings
+from app.recommendation.lsh_index import profile_lsh
+from app.recommendation.music_recommender import recommender_refitter
+
+router = APIRouter()
+
+
+@router.get("/artist-cache")
+async def get_artist_cache_stats(
+    current_user: User = Depends(get_authenticated_user),
+) -> Dict[str, Any]:
+    """Hit/miss counters for the shared artist metadata cache"""
+    return artist_cache.stats()
+
+
+@router.get("/spotify-scheduler")
+async def get_spotify_scheduler_stats(
+    current_user: User = Depends(get_authenticated_user),
+) -> Dict[str, Any]:
+    """Queue depth, throttling time and retry counters for Spotify traffic"""
+    return spotify_scheduler.stats()
+
+
+@router.get("/spotify-inflight")
+async def get_spotify_inflight_stats(
+    current_user: User = Depends(get_authenticated_user),
+) -> Dict[str, Any]:
+    """How many Spotify reads were coalesced onto an identical in-flight call"""
+    return spotify_inflight.stats()
+
+
+@router.get("/response-cache")
+async def get_response_cache_stats(
+    current_user: User = Depends(get_authenticated_user),
+) -> Dict[str, Any]:
+    """Hit, stale-hit and miss counters for the per-user music response cache"""
+    return music_response_cache.stats()
+
+
+@router.get("/profile-index")
+async def get_profile_index_stats(
+    current_user: User = Depends(get_authenticated_user),
+) -> Dict[str, Any]:
+    """Size, overlay backlog and rows scanned per search for the user index"""
+    return profile_index.stats()
+
+
+@router.get("/db-pool")
+async def get_db_pool_stats(
+    current_user: User = Depends(get_authenticated_user),
+) -> Dict[str, Any]:
+    """Checked-out and overflow connections in this worker's database pool"""
+    return pool_stats()
+
+
+@router.get("/auth-cache")
+async def get_auth_cache_stats(
+    current_user: User = Depends(get_authenticated_user),
+) -> Dict[str, Any]:
+    """Hit/miss counters for the authenticated-user cache"""
+    return auth_token_cache.stats()
+
+
+@router.get("/compatibility-refresh")
+async def get_compatibility_refresh_stats(
+    current_user: User = Depends(get_authenticated_user),
+) -> Dict[str, Any]:
+    """Runs, errors and the last run's changed profiles and rows written"""
+    return compatibility_refresher.stats()
+
+
+@router.get("/recommender-refit")
+async def get_recommender_refit_stats(
+    current_user: User = Depends(get_authenticated_user),
+) -> Dict[str, Any]:
+    """Whether the shared recommender is fitted, and its last refit"""
+    return recommender_refitter.stats()
+
+
+@router.get("/posting-index")
+async def get_posting_index_stats(
+    current_user: User = Depends(get_authenticated_user),
+) -> Dict[str, Any]:
+    """Users, terms and postings scanned per candidate search"""
+    return profile_postings.stats()
+
+
+@router.get("/lsh-index")
+async def get_lsh_index_stats(
+    current_user: User = Depends(get_authenticated_user),
+) -> Dict[str, Any]:
+    """Users, buckets and candidates checked per high-overlap lookup"""
+    return profile_lsh.stats()
+
+
+@router.get("/feature-store")
+async def get_feature_store_stats(
+    current_user: User = Depends(get_authenticated_user),
+) -> Dict[str, Any]:
+    """Version, rows and overlay size of the memory-mapped feature store"""
+    return feature_store.stats()
+
+
+@router.get("/spotify-sync-jobs")
+async def get_spotify_sync_job_stats(
+    current_user: User = Depends(get_authenticated_user),
+) -> Dict[str, Any]:
+    """Queue depth, running jobs and outcomes of background Spotify syncs"""
+    return await spotify_sync_queue.stats()
+
+
+@router.get("/profile-refresh")
+async def get_profile_refresh_stats(
+    current_user: User = Depends(get_authenticated_user),
+) -> Dict[str, Any]:
+    """Profiles refreshed per minute, failures by reason and the last run"""
+    return profile_refresher.stats()
+
+
+@router.get("/realtime")
+async def get_realtime_stats(
+    current_user: User = Depends(get_authenticated_user),
+) -> Dict[str, Any]:
+    """Room sockets, queued frames and dropped or coalesced messages"""
+    return manager.stats()
+
+
+@router.get("/presence")
+async def get_presence_stats(
+    current_user: User = Depends(get_authenticated_user),
+) -> Dict[str, Any]:
+    """Rooms, participants, diffs sent and the last checkpoint"""
+    return presence.stats()
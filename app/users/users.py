@@ -1,19 +1,29 @@
 import logging
-from typing import List, Optional, Dict
+from datetime import datetime
+from typing import Any, List, Optional, Dict
 from uuid import UUID
 from fastapi import HTTPException
 from sqlmodel import Session, select
 
-from app.recommendation.datamodels import SharedMusic, UserCompatibility
+from app.auth.token_cache import auth_token_cache
+from app.database.async_service import AsyncService
+from app.helpers.tokens import hash_token
+from app.recommendation.datamodels import (
+    RecommendedUser,
+    SharedMusic,
+    UserCompatibility,
+)
 from app.models.models import User, MusicProfile
 from app.models.schema import SocialLinks
-from app.recommendation.music_recommender import MusicRecommender
+from app.recommendation.compatibility import get_compatibility
+from app.recommendation.music_recommender import recommender
 
 
 class UserService:
     def __init__(self, db: Session):
         self.db = db
-        self._recommender = MusicRecommender()
+        # Shared so the fitted vocabularies serve every request
+        self._recommender = recommender
 
     def get_user(self, user_id: UUID) -> User:
         """Get user by ID"""
@@ -29,7 +39,7 @@ class UserService:
 
     def get_user_by_token(self, auth_token: str) -> Optional[User]:
         """Get user by authentication token"""
-        statement = select(User).where(User.spotify_token == auth_token)
+        statement = select(User).where(User.spotify_token_hash == hash_token(auth_token))
         return self.db.exec(statement).first()
 
     def get_music_profile(self, user_id: UUID) -> MusicProfile:
@@ -41,6 +51,11 @@ class UserService:
             raise HTTPException(status_code=404, detail=f"Music profile not found for {user_id}")
         return profile
 
+    def get_all_music_profiles(self) -> List[Dict[str, Any]]:
+        """Get every music profile as a dict, e.g. to fit the recommender"""
+        profiles = self.db.exec(select(MusicProfile)).all()
+        return [profile.dict() for profile in profiles]
+
     def update_user_music_profile(self, user_id: UUID, profile_data: Dict) -> MusicProfile:
         """Update user's music profile"""
         profile = self.get_music_profile(user_id)
@@ -48,6 +63,7 @@ class UserService:
         for key, value in profile_data.items():
             if hasattr(profile, key):
                 setattr(profile, key, value)
+        profile.updated_at = datetime.utcnow()
 
         self.db.add(profile)
         self.db.commit()
@@ -65,6 +81,8 @@ class UserService:
         self.db.add(user)
         self.db.commit()
         self.db.refresh(user)
+        # Cached auth snapshots (and a replaced token) are now stale
+        auth_token_cache.invalidate_user(user_id)
         return user
 
     def create_user(self, user_data: Dict) -> User:
@@ -95,6 +113,10 @@ class UserService:
         self.db.add(profile)
         self.db.commit()
 
+        # The token may have belonged to a user that no longer exists
+        if user.spotify_token:
+            auth_token_cache.invalidate(user.spotify_token)
+
         return user
 
     def update_social_links(self, user_id: UUID, social_links: SocialLinks) -> User:
@@ -104,22 +126,25 @@ class UserService:
         self.db.add(user)
         self.db.commit()
         self.db.refresh(user)
+        auth_token_cache.invalidate_user(user_id)
         return user
 
-    def get_recommended_users(self, user_id: UUID, limit: int = 10) -> List[User]:
+    def get_recommended_users(
+        self, user_id: UUID, limit: int = 10
+    ) -> List[RecommendedUser]:
         """Get recommended users based on music taste"""
         # Get current user's profile
         user_profile = self.get_music_profile(user_id)
         if not user_profile:
             raise HTTPException(status_code=404, detail="User profile not found")
 
-        # Get all other users
-        statement = select(User).where(User.id != user_id)
-        other_users = self.db.exec(statement).all()
+        # Get all other users' profiles
+        statement = select(MusicProfile).where(MusicProfile.user_id != user_id)
+        other_profiles = self.db.exec(statement).all()
 
         # Get recommendations using the music recommender
         recommended_users = self._recommender.get_user_recommendations(
-            user_profile, other_users, limit=limit
+            user_profile, other_profiles, limit=limit
         )
 
         return recommended_users
@@ -135,9 +160,9 @@ class UserService:
         current_profile = self.get_music_profile(user_id)
 
 
-        # Calculate compatibility
-        similarity = self._recommender.calculate_overall_similarity(
-            current_profile.dict(), target_profile.dict()
+        # Precomputed by the compatibility job; scored inline on a miss
+        similarity = get_compatibility(
+            self.db, current_profile, target_profile, self._recommender
         )
 
         # Add shared music details
@@ -162,3 +187,49 @@ class UserService:
             genres=list(set(profile1.genres) & set(profile2.genres)),
         )
         return shared_music
+
+
+class AsyncUserService(AsyncService[UserService]):
+    """UserService for async handlers; queries never block the event loop"""
+
+    def _service(self, session: Session) -> UserService:
+        return UserService(session)
+
+    async def get_user(self, user_id: UUID) -> User:
+        return await self._run(UserService.get_user, user_id)
+
+    async def get_user_by_spotify_id(self, spotify_id: str) -> Optional[User]:
+        return await self._run(UserService.get_user_by_spotify_id, spotify_id)
+
+    async def get_user_by_token(self, auth_token: str) -> Optional[User]:
+        return await self._run(UserService.get_user_by_token, auth_token)
+
+    async def get_music_profile(self, user_id: UUID) -> MusicProfile:
+        return await self._run(UserService.get_music_profile, user_id)
+
+    async def get_all_music_profiles(self) -> List[Dict[str, Any]]:
+        return await self._run(UserService.get_all_music_profiles)
+
+    async def update_user_music_profile(
+        self, user_id: UUID, profile_data: Dict
+    ) -> MusicProfile:
+        return await self._run(UserService.update_user_music_profile, user_id, profile_data)
+
+    async def update_user(self, user_id: UUID, profile_data: Dict) -> User:
+        return await self._run(UserService.update_user, user_id, profile_data)
+
+    async def create_user(self, user_data: Dict) -> User:
+        return await self._run(UserService.create_user, user_data)
+
+    async def update_social_links(self, user_id: UUID, social_links: SocialLinks) -> User:
+        return await self._run(UserService.update_social_links, user_id, social_links)
+
+    async def get_recommended_users(
+        self, user_id: UUID, limit: int = 10
+    ) -> List[RecommendedUser]:
+        return await self._run(UserService.get_recommended_users, user_id, limit)
+
+    async def get_user_compatibility(
+        self, user_id: UUID, target_user_id: UUID
+    ) -> UserCompatibility:
+        return await self._run(UserService.get_user_compatibility, user_id, target_user_id)
@@ -0,0 +1,140 @@
+"""Benchmark mood room broadcast: sequential sends vs per-socket writers.
+
+Simulates rooms of clients whose ``send_text`` takes ``--send-delay``
+seconds, with a ``--slow-fraction`` of them taking ``--slow-delay``
+instead, and broadcasts ``--messages`` chat messages to each room through:
+
+- before: encoding and sending to every socket in turn (the old behaviour)
+- after:  ``ConnectionManager`` encoding once and pushing the frame to each
+  socket's bounded send queue
+
+Reports how long ``broadcast_to_room`` holds the sender, how long fast
+clients wait for each message and how often each message was encoded.
+
+Usage:
+    python -m benchmarks.realtime_broadcast --rooms 10 100 1000 --messages 20
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from collections import Counter
+from typing import List
+from uuid import uuid4
+
+from app.realtime.handlers import ConnectionManager
+from app.realtime.models import ChatMessage, WebSocketUser
+
+USER = WebSocketUser(id="benchmark", name="Benchmark")
+
+
+class SimulatedClient:
+    """A websocket whose sends take `delay` seconds"""
+
+    def __init__(self, delay: float, slow: bool):
+        self.delay = delay
+        self.slow = slow
+        # Arrival time of each message; sends are never dropped at the
+        # default queue size, so the list index is the message number
+        self.sent_at: List[float] = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        await asyncio.sleep(self.delay)
+        self.sent_at.append(time.perf_counter())
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        pass
+
+
+def make_clients(size: int, args) -> List[SimulatedClient]:
+    slow_every = round(1 / args.slow_fraction) if args.slow_fraction else 0
+    return [
+        SimulatedClient(args.slow_delay, True)
+        if slow_every and i % slow_every == 0
+        else SimulatedClient(args.send_delay, False)
+        for i in range(size)
+    ]
+
+
+async def sequential_broadcast(
+    clients: List[SimulatedClient], message: ChatMessage, counters: Counter
+):
+    message_dict = message.model_dump(mode="json")
+    for websocket in clients:
+        # What WebSocket.send_json does for each recipient
+        await websocket.send_text(json.dumps(message_dict, separators=(",", ":")))
+        counters["encoded"] += 1
+
+
+async def run_room(label: str, size: int, args) -> None:
+    clients = make_clients(size, args)
+    room_id = uuid4()
+    manager = ConnectionManager(send_queue_size=args.queue_size)
+    if label == "after":
+        for client in clients:
+            await manager.connect_to_room(client, room_id)
+
+    hold_ms: List[float] = []
+    broadcast_at: List[float] = []
+    for i in range(args.messages):
+        message = ChatMessage(user=USER, content=str(i))
+        started = time.perf_counter()
+        broadcast_at.append(started)
+        if label == "before":
+            await sequential_broadcast(clients, message, manager.counters)
+        else:
+            await manager.broadcast_to_room(room_id, message)
+        hold_ms.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(args.interval)
+
+    # Let the writers finish before reading delivery times
+    deadline = time.perf_counter() + 30
+    fast = [client for client in clients if not client.slow]
+    while time.perf_counter() < deadline and any(
+        len(client.sent_at) < args.messages for client in fast
+    ):
+        await asyncio.sleep(0.01)
+    for client in clients:
+        await manager.disconnect_from_room(client, room_id)
+
+    delivery_ms = [
+        (sent_at - broadcast_at[i]) * 1000
+        for client in fast
+        for i, sent_at in enumerate(client.sent_at)
+    ]
+    report(label, size, hold_ms, delivery_ms, manager.counters)
+
+
+def report(label: str, size: int, hold_ms: List[float], delivery_ms: List[float], counters):
+    p95 = statistics.quantiles(delivery_ms, n=100)[94]
+    print(
+        f"{label:<7} clients={size:<5} broadcast p50={statistics.median(hold_ms):8.2f}ms "
+        f"delivery p50={statistics.median(delivery_ms):8.2f}ms p95={p95:8.2f}ms "
+        f"encodes/message={counters['encoded'] / len(hold_ms):6.0f} "
+        f"dropped={counters['dropped']}"
+    )
+
+
+async def main(args):
+    for size in args.rooms:
+        for label in ("before", "after"):
+            await run_room(label, size, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.05,
+                        help="seconds between broadcasts")
+    parser.add_argument("--send-delay", type=float, default=0.0005,
+                        help="seconds a healthy client's send takes")
+    parser.add_argument("--slow-delay", type=float, default=0.2,
+                        help="seconds a slow client's send takes")
+    parser.add_argument("--slow-fraction", type=float, default=0.05)
+    parser.add_argument("--queue-size", type=int, default=64)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,134 @@
+"""Benchmark SpotifyClient transport: per-call AsyncClient vs shared pool.
+
+Starts a local HTTP/1.1 stub of the Spotify API that counts accepted
+connections (each one stands in for a TCP+TLS handshake, with an optional
+artificial handshake delay) and replays the same request mix through:
+
+- before: a fresh ``httpx.AsyncClient()`` per call (the old behaviour)
+- after:  ``SpotifyClient`` drawing from the process-wide pooled client
+
+Usage:
+    python -m benchmarks.spotify_http_pool --requests 600 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Awaitable, Callable, List
+
+import httpx
+
+import app.helpers.spotify as spotify_module
+from app.helpers.http import create_http_client
+from app.helpers.spotify import SpotifyClient
+
+PAYLOAD = json.dumps({"items": [{"id": "stub", "name": "stub"}] * 20}).encode()
+
+
+class StubSpotifyServer:
+    """Minimal keep-alive HTTP server that counts new connections"""
+
+    def __init__(self, handshake_delay: float):
+        self.handshake_delay = handshake_delay
+        self.connections = 0
+        self.server = None
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        # Simulate the extra round trips a TLS handshake costs
+        await asyncio.sleep(self.handshake_delay)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                if not head:
+                    break
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: application/json\r\n"
+                    + f"Content-Length: {len(PAYLOAD)}\r\n\r\n".encode()
+                    + PAYLOAD
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+async def run_load(
+    call: Callable[[], Awaitable[None]], requests: int, concurrency: int
+) -> List[float]:
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await call()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies
+
+
+def report(label: str, latencies: List[float], connections: int, elapsed: float):
+    p95 = statistics.quantiles(latencies, n=100)[94]
+    print(
+        f"{label:<7} requests={len(latencies):<5} handshakes={connections:<5} "
+        f"p50={statistics.median(latencies):7.2f}ms p95={p95:7.2f}ms "
+        f"throughput={len(latencies) / elapsed:8.1f} req/s"
+    )
+
+
+async def main(requests: int, concurrency: int, handshake_delay: float):
+    stub = StubSpotifyServer(handshake_delay)
+    port = await stub.start()
+    base_url = f"http://127.0.0.1:{port}/v1/"
+    spotify_module.API_BASE_URL = base_url
+
+    async def per_call_client():
+        async with httpx.AsyncClient() as client:
+            response = await client.get(f"{base_url}me/top/artists")
+            response.raise_for_status()
+            response.json()
+
+    start = time.perf_counter()
+    latencies = await run_load(per_call_client, requests, concurrency)
+    report("before", latencies, stub.connections, time.perf_counter() - start)
+
+    stub.connections = 0
+    pooled = create_http_client(http2=False)
+    spotify = SpotifyClient("benchmark-token", http_client=pooled)
+
+    async def pooled_client():
+        await spotify.current_user_top_artists()
+
+    start = time.perf_counter()
+    latencies = await run_load(pooled_client, requests, concurrency)
+    report("after", latencies, stub.connections, time.perf_counter() - start)
+
+    await pooled.aclose()
+    await stub.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument(
+        "--handshake-delay",
+        type=float,
+        default=0.02,
+        help="seconds added to every new connection to mimic TLS setup",
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.handshake_delay))
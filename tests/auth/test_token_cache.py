@@ -0,0 +1,58 @@
+from app.auth.token_cache import AuthTokenCache
+from app.models.models import User
+
+
+def _user():
+    return User(email='cached@example.com', spotify_token='token', display_name='cached')
+
+
+def test_cached_user_is_a_fresh_copy():
+    cache = AuthTokenCache(maxsize=10, ttl=60)
+    user = _user()
+    cache.set('token', user)
+
+    cached = cache.get('token')
+
+    assert cached is not user
+    assert cached.id == user.id
+    assert cached.display_name == 'cached'
+    assert cache.get('other-token') is None
+
+
+def test_invalidation_by_token_and_by_user():
+    cache = AuthTokenCache(maxsize=10, ttl=60)
+    user = _user()
+
+    cache.set('token', user)
+    cache.invalidate('token')
+    assert cache.get('token') is None
+
+    cache.set('token', user)
+    cache.invalidate_user(user.id)
+    assert cache.get('token') is None
+
+
+def test_invalidating_a_user_drops_every_one_of_their_tokens():
+    cache = AuthTokenCache(maxsize=10, ttl=60)
+    user, other = _user(), _user()
+    cache.set('phone', user)
+    cache.set('laptop', user)
+    cache.set('other', other)
+
+    cache.invalidate_user(user.id)
+
+    assert cache.get('phone') is None
+    assert cache.get('laptop') is None
+    assert cache.get('other') is not None
+
+
+def test_evicted_tokens_are_pruned_from_the_user_map():
+    cache = AuthTokenCache(maxsize=2, ttl=60)
+    users = [_user() for _ in range(6)]
+    for i, user in enumerate(users):
+        cache.set(f'token-{i}', user)
+    # The oldest user logs in again after their first token was evicted
+    cache.set('token-again', users[0])
+
+    assert len(cache._hashes_by_user[str(users[0].id)]) == 1
+    assert len(cache._hashes_by_user) <= 2 * cache.memory.maxsize
@@ -181,12 +181,14 @@ async def get_other_sample_user_profile(
 @pytest.fixture
 async def client(
     app,
+    db_test: Session,
     sample_user: User,
     user_service: UserService,
     connection_service: ConnectionService,
 ):
     token = sample_user.spotify_token
     headers = {'Content-Type': 'application/json', 'auth-token': f'Bearer {token}'}
+    app.dependency_overrides[get_db] = lambda: db_test
     app.dependency_overrides[get_user_service] = lambda: user_service
     app.dependency_overrides[get_connection_service] = lambda: connection_service
 
@@ -198,5 +200,6 @@ async def client(
 
 
     # Clean up the overrides
+    del app.dependency_overrides[get_db]
     del app.dependency_overrides[get_user_service]
     del app.dependency_overrides[get_connection_service]
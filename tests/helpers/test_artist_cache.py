@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.helpers import cache as ttl_cache
+from app.helpers.artist_cache import ArtistMetadataCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ttl_cache, 'time', SimpleNamespace(monotonic=clock))
+    return clock
+
+
+class FakeTable:
+    """Stands in for the artist_metadata table behind `_load` and `_store`"""
+
+    def __init__(self, rows=None):
+        # artist id -> (payload, remaining ttl)
+        self.rows = dict(rows or {})
+        self.loads = []
+
+    def load(self, artist_ids):
+        self.loads.append(list(artist_ids))
+        return {i: self.rows[i] for i in artist_ids if i in self.rows}
+
+    def store(self, artists):
+        for artist in artists:
+            self.rows[artist['id']] = (artist, 3600)
+
+
+def cache_with_table(monkeypatch, table, ttl=3600):
+    cache = ArtistMetadataCache(maxsize=10, ttl=ttl, use_db=True)
+    monkeypatch.setattr(cache, '_load', table.load)
+    monkeypatch.setattr(cache, '_store', table.store)
+    return cache
+
+
+async def test_memory_misses_read_through_to_the_database(monkeypatch, clock):
+    burna = {'id': 'burna', 'genres': ['afrobeats']}
+    table = FakeTable({'burna': (burna, 600)})
+    cache = cache_with_table(monkeypatch, table)
+
+    assert await cache.get_many(['burna', 'tems']) == {'burna': burna}
+    assert table.loads == [['burna', 'tems']]
+
+    # The stored row is now in memory, so only the real miss goes back to the table
+    assert await cache.get_many(['burna', 'tems']) == {'burna': burna}
+    assert table.loads == [['burna', 'tems'], ['tems']]
+
+    # Promoted with the row's remaining ttl, not a fresh one
+    clock.now += 601
+    await cache.get_many(['burna'])
+    assert table.loads[-1] == ['burna']
+
+
+async def test_writes_go_to_memory_and_the_database(monkeypatch, clock):
+    table = FakeTable()
+    cache = cache_with_table(monkeypatch, table)
+
+    await cache.set_many([{'id': 'tems', 'genres': ['alte']}, None, {'name': 'no id'}])
+
+    assert list(table.rows) == ['tems']
+    assert await cache.get('tems') == {'id': 'tems', 'genres': ['alte']}
+    assert table.loads == []
+
+
+async def test_memory_entries_expire_after_the_ttl(clock):
+    cache = ArtistMetadataCache(maxsize=10, ttl=60, use_db=False)
+    await cache.set_many([{'id': 'burna'}])
+
+    clock.now += 59
+    assert await cache.get('burna') == {'id': 'burna'}
+    clock.now += 2
+    assert await cache.get('burna') is None
+
+
+async def test_stats_count_memory_and_database_hits(monkeypatch, clock):
+    table = FakeTable({'burna': ({'id': 'burna'}, 600)})
+    cache = cache_with_table(monkeypatch, table)
+    await cache.set_many([{'id': 'tems'}])
+
+    await cache.get_many(['tems', 'burna', 'wizkid'])
+
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+    assert stats['db_hits'] == 1
+    assert stats['db_misses'] == 1
+    assert stats['lookups_saved'] == 2
+    assert stats['db_enabled'] is True
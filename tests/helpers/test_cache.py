@@ -0,0 +1,33 @@
+import time
+
+from app.helpers.cache import TTLCache
+
+
+def test_cache_hit_and_miss_counters():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set('artist', {'genres': ['afrobeats']})
+
+    assert cache.get('artist') == {'genres': ['afrobeats']}
+    assert cache.get('unknown') is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert cache.stats()['evictions'] == 1
+
+
+def test_cache_entries_expire():
+    cache = TTLCache(maxsize=10, ttl=0.01)
+    cache.set('a', 1)
+    time.sleep(0.02)
+
+    assert cache.get('a') is None
@@ -0,0 +1,53 @@
+import asyncio
+
+import httpx
+
+from app import constant
+from app.helpers import http
+from app.helpers.http import HostLimitedTransport, create_http_client
+
+
+async def test_per_host_cap_limits_in_flight_requests(monkeypatch):
+    in_flight = {'api.spotify.com': 0, 'accounts.spotify.com': 0}
+    peak = dict(in_flight)
+
+    async def handle_async_request(self, request):
+        host = request.url.host
+        in_flight[host] += 1
+        peak[host] = max(peak[host], in_flight[host])
+        await asyncio.sleep(0.01)
+        in_flight[host] -= 1
+        return httpx.Response(200)
+
+    # The pooled transport underneath, so nothing goes over the network
+    monkeypatch.setattr(httpx.AsyncHTTPTransport, 'handle_async_request', handle_async_request)
+    async with httpx.AsyncClient(transport=HostLimitedTransport(max_per_host=2)) as client:
+        await asyncio.gather(
+            *(client.get('https://api.spotify.com/v1/me') for _ in range(6)),
+            *(client.get('https://accounts.spotify.com/api/token') for _ in range(6)),
+        )
+
+    # Each host gets its own cap
+    assert peak == {'api.spotify.com': 2, 'accounts.spotify.com': 2}
+
+
+async def test_pool_limits_and_keep_alive_come_from_constants():
+    client = create_http_client()
+    pool = client._transport._pool
+
+    assert pool._max_connections == constant.HTTP_MAX_CONNECTIONS
+    assert pool._max_keepalive_connections == constant.HTTP_MAX_KEEPALIVE_CONNECTIONS
+    assert pool._keepalive_expiry == constant.HTTP_KEEPALIVE_EXPIRY
+    assert client._transport.max_per_host == constant.HTTP_MAX_CONNECTIONS_PER_HOST
+    assert client.timeout == httpx.Timeout(constant.HTTP_TIMEOUT)
+    await client.aclose()
+
+
+async def test_falls_back_to_http1_without_h2(monkeypatch):
+    monkeypatch.setattr(http, 'http2_available', lambda: False)
+
+    client = create_http_client(http2=True)
+
+    assert client._transport._pool._http1
+    assert not client._transport._pool._http2
+    await client.aclose()
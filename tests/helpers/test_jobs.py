@@ -0,0 +1,72 @@
+import asyncio
+
+from fastapi import HTTPException
+
+from app.helpers.jobs import InMemoryJobBackend, JobQueue
+
+
+async def _wait_for(queue, job_id, status):
+    for _ in range(100):
+        job = await queue.get(job_id)
+        if job.status == status:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f'job {job_id} never reached {status}')
+
+
+async def test_enqueue_deduplicates_active_jobs_per_key():
+    release = asyncio.Event()
+
+    async def handler(job, progress):
+        await release.wait()
+
+    queue = JobQueue('sync', handler, InMemoryJobBackend(), workers=1)
+    queue.start()
+    try:
+        first = await queue.enqueue('user-1')
+        assert (await queue.enqueue('user-1')).id == first.id
+        assert (await queue.enqueue('user-2')).id != first.id
+
+        release.set()
+        await _wait_for(queue, first.id, 'succeeded')
+        # A finished job no longer blocks a new one
+        assert (await queue.enqueue('user-1')).id != first.id
+        assert queue.deduplicated == 1
+    finally:
+        await queue.stop()
+
+
+async def test_job_reports_progress_and_finishes():
+    stages = []
+
+    async def handler(job, progress):
+        await progress('fetching top artists')
+        stages.append((await queue.get(job.id)).progress)
+
+    queue = JobQueue('sync', handler, InMemoryJobBackend(), workers=2)
+    queue.start()
+    try:
+        job = await queue.enqueue('user-1')
+        assert job.status == 'queued'
+
+        job = await _wait_for(queue, job.id, 'succeeded')
+        assert stages == ['fetching top artists']
+        assert job.started_at is not None and job.finished_at is not None
+        assert (await queue.stats())['succeeded'] == 1
+    finally:
+        await queue.stop()
+
+
+async def test_failed_job_records_error():
+    async def handler(job, progress):
+        raise HTTPException(status_code=404, detail='User profile not found')
+
+    queue = JobQueue('sync', handler, InMemoryJobBackend(), workers=1)
+    queue.start()
+    try:
+        job = await queue.enqueue('user-1')
+        job = await _wait_for(queue, job.id, 'failed')
+        assert job.error == 'User profile not found'
+        assert queue.failed == 1
+    finally:
+        await queue.stop()
@@ -0,0 +1,27 @@
+import pytest
+
+from app.helpers.minhash import estimate_jaccard, minhash_signature, profile_terms
+
+
+def test_profile_terms_are_prefixed_by_field():
+    profile = {
+        'genres': ['Afrobeats'],
+        'top_artists': [{'id': '3wcj11K77LjEY1PkEazffa', 'name': 'Burna Boy'}],
+        'top_tracks': None,
+    }
+
+    assert profile_terms(profile) == {
+        'genres:afrobeats', 'top_artists:3wcj11k77ljey1pkeazffa'
+    }
+
+
+def test_signatures_estimate_jaccard():
+    shared = [f'artist-{i}' for i in range(60)]
+    a = minhash_signature(shared + [f'a-{i}' for i in range(20)])
+    b = minhash_signature(shared + [f'b-{i}' for i in range(20)])
+
+    # 60 shared of 100 distinct items
+    assert estimate_jaccard(a, b) == pytest.approx(0.6, abs=0.15)
+    assert estimate_jaccard(a, a) == 1.0
+    assert minhash_signature([]) is None
+    assert minhash_signature(['x', 'y']) == minhash_signature(['y', 'x'])
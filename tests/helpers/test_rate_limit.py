@@ -0,0 +1,151 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.helpers import rate_limit
+from app.helpers.rate_limit import SpotifyRequestScheduler, TokenBucket, parse_retry_after
+
+
+class FakeClock:
+    """monotonic() and sleep() where sleeping only moves the clock forward"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, 'time', SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(rate_limit, 'asyncio', SimpleNamespace(sleep=clock.sleep, Lock=asyncio.Lock))
+    return clock
+
+
+@pytest.fixture
+def jitter(monkeypatch):
+    """Records the bounds of every backoff and always picks the upper one"""
+    bounds = []
+
+    def uniform(low, high):
+        bounds.append((low, high))
+        return high
+
+    monkeypatch.setattr(rate_limit, 'random', SimpleNamespace(uniform=uniform))
+    return bounds
+
+
+def spotify_client(*responses: httpx.Response):
+    """An AsyncClient whose transport answers with `responses` in order"""
+    pending = list(responses)
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return pending.pop(0)
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler)), requests
+
+
+async def test_bucket_allows_a_burst_then_waits_for_refill(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+
+    assert [await bucket.acquire() for _ in range(3)] == [0, 0, 0]
+    assert not bucket.try_acquire()
+
+    # Empty bucket: the next token arrives after 1 / rate seconds
+    assert await bucket.acquire() == 0.5
+    assert clock.now == 0.5
+
+
+async def test_bucket_refills_up_to_its_capacity(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    for _ in range(3):
+        bucket.try_acquire()
+
+    clock.now += 1
+    assert [bucket.try_acquire() for _ in range(3)] == [True, True, False]
+
+    clock.now += 100
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+
+async def test_paused_bucket_holds_every_caller(clock):
+    bucket = TokenBucket(rate=10, capacity=10)
+    bucket.pause(3)
+
+    assert not bucket.try_acquire()
+    assert await bucket.acquire() == 3
+    assert bucket.try_acquire()
+
+
+def test_retry_after_as_seconds_or_http_date():
+    def response(value=None):
+        headers = {'Retry-After': value} if value is not None else {}
+        return httpx.Response(429, headers=headers)
+
+    assert parse_retry_after(response('3')) == 3.0
+    assert parse_retry_after(response('-1')) == 0.0
+    assert parse_retry_after(response()) is None
+    assert parse_retry_after(response('soon')) is None
+
+    in_a_minute = datetime.now(timezone.utc) + timedelta(seconds=60)
+    assert 55 < parse_retry_after(response(format_datetime(in_a_minute, usegmt=True))) <= 60
+    a_minute_ago = datetime.now(timezone.utc) - timedelta(seconds=60)
+    assert parse_retry_after(response(format_datetime(a_minute_ago, usegmt=True))) == 0.0
+
+
+async def test_429_pauses_for_retry_after_plus_jitter(clock, jitter):
+    scheduler = SpotifyRequestScheduler(rate=100, burst=10, backoff_base=0.5)
+    client, requests = spotify_client(
+        httpx.Response(429, headers={'Retry-After': '2'}),
+        httpx.Response(200, json={'id': 'me'}),
+    )
+
+    response = await scheduler.send(lambda: client.get('https://api.spotify.com/v1/me'))
+
+    assert response.json() == {'id': 'me'}
+    assert len(requests) == 2
+    assert jitter == [(0, 0.5)]
+    # The retry waited out Retry-After plus the jittered backoff
+    assert clock.now == 2.5
+    assert scheduler.stats()['rate_limited'] == 1
+    assert scheduler.stats()['retries'] == 1
+
+
+async def test_repeated_429_backs_off_exponentially_up_to_the_cap(clock, jitter):
+    scheduler = SpotifyRequestScheduler(
+        rate=100, burst=10, max_retries=3, backoff_base=0.5, backoff_max=1.5
+    )
+    client, requests = spotify_client(*[httpx.Response(429) for _ in range(4)])
+
+    response = await scheduler.send(lambda: client.get('https://api.spotify.com/v1/me'))
+
+    # Out of retries: the last 429 goes back to the caller
+    assert response.status_code == 429
+    assert len(requests) == 4
+    assert jitter == [(0, 0.5), (0, 1.0), (0, 1.5)]
+    assert clock.now == 3.0
+
+
+async def test_server_errors_are_retried_without_pausing_others(clock, jitter):
+    scheduler = SpotifyRequestScheduler(rate=100, burst=10, backoff_base=0.5)
+    client, _ = spotify_client(httpx.Response(503), httpx.Response(200))
+
+    response = await scheduler.send(lambda: client.get('https://api.spotify.com/v1/me'))
+
+    assert response.status_code == 200
+    assert clock.sleeps == [0.5]
+    assert scheduler.bucket.paused_until == 0.0
+    assert scheduler.stats()['server_errors'] == 1
@@ -0,0 +1,113 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.helpers import cache, response_cache
+from app.helpers.response_cache import InMemoryResponseBackend, ResponseCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    # Freshness is wall-clock time, the backend's expiry is monotonic
+    monkeypatch.setattr(response_cache, 'time', SimpleNamespace(time=clock))
+    monkeypatch.setattr(cache, 'time', SimpleNamespace(monotonic=clock))
+    return clock
+
+
+class Fetcher:
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        return f'v{self.calls}'
+
+
+async def test_fresh_entries_are_served_from_cache(clock):
+    responses = ResponseCache(InMemoryResponseBackend(), ttl=60, stale_ttl=300)
+    fetch = Fetcher()
+
+    assert await responses.get_or_fetch('u1:top_artists', fetch) == 'v1'
+    clock.now += 59
+    assert await responses.get_or_fetch('u1:top_artists', fetch) == 'v1'
+
+    assert fetch.calls == 1
+    assert responses.stats()['hits'] == 1
+    assert responses.stats()['misses'] == 1
+
+
+async def test_entries_expire_after_ttl_and_stale_ttl(clock):
+    responses = ResponseCache(InMemoryResponseBackend(), ttl=60, stale_ttl=300)
+    fetch = Fetcher()
+
+    await responses.get_or_fetch('u1:top_artists', fetch)
+    clock.now += 361
+
+    # Past the stale window: a plain miss that waits for the fetch
+    assert await responses.get_or_fetch('u1:top_artists', fetch) == 'v2'
+    assert responses.stats()['misses'] == 2
+    assert responses.stats()['stale_hits'] == 0
+
+
+async def test_stale_value_is_served_while_one_refresh_runs(clock):
+    responses = ResponseCache(InMemoryResponseBackend(), ttl=60, stale_ttl=300)
+    fetch = Fetcher()
+    await responses.get_or_fetch('u1:top_artists', fetch)
+    clock.now += 120
+
+    fetch.release.clear()
+    stale = await asyncio.gather(
+        *(responses.get_or_fetch('u1:top_artists', fetch) for _ in range(5))
+    )
+    assert stale == ['v1'] * 5
+    assert responses.stats()['refreshing'] == 1
+
+    fetch.release.set()
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+    assert fetch.calls == 2
+    assert responses.stats()['refreshing'] == 0
+    assert responses.stats()['stale_hits'] == 5
+    assert await responses.get_or_fetch('u1:top_artists', fetch) == 'v2'
+
+
+async def test_failed_refresh_keeps_the_stale_value(clock):
+    responses = ResponseCache(InMemoryResponseBackend(), ttl=60, stale_ttl=300)
+    await responses.set('u1:top_artists', 'v1')
+    clock.now += 120
+
+    async def fail():
+        raise RuntimeError('spotify down')
+
+    assert await responses.get_or_fetch('u1:top_artists', fail) == 'v1'
+    await asyncio.sleep(0)
+
+    assert responses.stats()['refresh_errors'] == 1
+    assert await responses.get_or_fetch('u1:top_artists', fail) == 'v1'
+
+
+async def test_invalidate_drops_only_the_prefix(clock):
+    responses = ResponseCache(InMemoryResponseBackend(), ttl=60, stale_ttl=300)
+    await responses.set('u1:top_artists:short_term', 'a')
+    await responses.set('u1:top_genres:short_term', 'b')
+    await responses.set('u2:top_artists:short_term', 'c')
+
+    await responses.invalidate('u1:')
+
+    assert await responses.backend.get('u1:top_artists:short_term') is None
+    assert await responses.backend.get('u1:top_genres:short_term') is None
+    assert (await responses.backend.get('u2:top_artists:short_term'))[1] == 'c'
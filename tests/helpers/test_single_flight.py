@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from app.helpers.single_flight import SingleFlight
+
+
+class Upstream:
+    """An upstream call that blocks until released, counting invocations"""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def fetch(self, result='profile', error=None):
+        self.calls += 1
+        await self.release.wait()
+        if error is not None:
+            raise error
+        return result
+
+
+async def test_concurrent_callers_share_one_upstream_call():
+    inflight = SingleFlight()
+    upstream = Upstream()
+
+    waiters = [asyncio.create_task(inflight.do('me', upstream.fetch)) for _ in range(5)]
+    await asyncio.sleep(0)
+    upstream.release.set()
+
+    assert await asyncio.gather(*waiters) == ['profile'] * 5
+    assert upstream.calls == 1
+    assert inflight.stats() == {'in_flight': 0, 'leaders': 1, 'coalesced': 4}
+
+
+async def test_different_keys_and_later_calls_go_upstream():
+    inflight = SingleFlight()
+    upstream = Upstream()
+    upstream.release.set()
+
+    await asyncio.gather(inflight.do('a', upstream.fetch), inflight.do('b', upstream.fetch))
+    await inflight.do('a', upstream.fetch)
+
+    assert upstream.calls == 3
+
+
+async def test_errors_reach_every_waiter():
+    inflight = SingleFlight()
+    upstream = Upstream()
+
+    waiters = [
+        asyncio.create_task(inflight.do('me', lambda: upstream.fetch(error=ValueError('429'))))
+        for _ in range(3)
+    ]
+    await asyncio.sleep(0)
+    upstream.release.set()
+
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    assert [type(result) for result in results] == [ValueError] * 3
+    assert upstream.calls == 1
+    # A failed call is forgotten, so the next caller retries
+    assert inflight.stats()['in_flight'] == 0
+
+
+async def test_cancelling_one_waiter_leaves_the_others_running():
+    inflight = SingleFlight()
+    upstream = Upstream()
+
+    leader = asyncio.create_task(inflight.do('me', upstream.fetch))
+    follower = asyncio.create_task(inflight.do('me', upstream.fetch))
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    upstream.release.set()
+
+    assert await follower == 'profile'
+    assert upstream.calls == 1
@@ -0,0 +1,103 @@
+import httpx
+import pytest
+
+from app.helpers import spotify
+from app.helpers.artist_cache import ArtistMetadataCache
+from app.helpers.spotify import SpotifyClient
+from app.music.profile_analyzer import MusicProfileAnalyzer
+
+
+def artist(artist_id: str):
+    return {'id': artist_id, 'name': artist_id.title(), 'genres': [f'{artist_id}-genre']}
+
+
+class FakeSpotifyApi:
+    """MockTransport handler for GET /artists, recording the ids of each call"""
+
+    def __init__(self, unknown=()):
+        self.unknown = set(unknown)
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if request.url.path != '/v1/artists':
+            return httpx.Response(404)
+        ids = request.url.params['ids'].split(',')
+        # Spotify answers null for ids it doesn't know
+        return httpx.Response(
+            200, json={'artists': [None if i in self.unknown else artist(i) for i in ids]}
+        )
+
+    @property
+    def batches(self):
+        return [request.url.params['ids'].split(',') for request in self.requests]
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ArtistMetadataCache(use_db=False)
+    monkeypatch.setattr(spotify, 'artist_cache', cache)
+    return cache
+
+
+def client_for(api: FakeSpotifyApi) -> SpotifyClient:
+    return SpotifyClient('token', http_client=httpx.AsyncClient(transport=httpx.MockTransport(api)))
+
+
+async def test_artists_are_fetched_in_chunks_of_50(cache):
+    api = FakeSpotifyApi()
+    ids = [f'artist{i}' for i in range(120)]
+
+    artists = await client_for(api).get_artists(ids)
+
+    assert [len(batch) for batch in api.batches] == [50, 50, 20]
+    assert sorted(a['id'] for a in artists) == sorted(ids)
+
+
+async def test_duplicate_and_empty_ids_are_fetched_once(cache):
+    api = FakeSpotifyApi()
+
+    artists = await client_for(api).get_artists(['burna', 'tems', 'burna', None, '', 'tems'])
+
+    assert api.batches == [['burna', 'tems']]
+    assert [a['id'] for a in artists] == ['burna', 'tems']
+
+
+async def test_unknown_artists_are_dropped(cache):
+    api = FakeSpotifyApi(unknown={'ghost'})
+
+    artists = await client_for(api).get_artists(['burna', 'ghost'])
+
+    assert [a['id'] for a in artists] == ['burna']
+    assert 'ghost' not in cache.memory
+
+
+async def test_cached_artists_are_not_fetched(cache):
+    api = FakeSpotifyApi()
+    await cache.set_many([artist('burna')])
+
+    artists = await client_for(api).get_artists(['burna', 'tems'])
+
+    assert api.batches == [['tems']]
+    assert sorted(a['id'] for a in artists) == ['burna', 'tems']
+    # Fetched artists are cached for the next lookup
+    await client_for(api).get_artists(['burna', 'tems'])
+    assert len(api.requests) == 1
+
+
+async def test_analyzer_resolves_genres_with_one_batched_lookup(cache):
+    api = FakeSpotifyApi()
+    recent = [
+        {
+            'played_at': f'2024-05-01T{hour:02d}:00:00Z',
+            'track': {'id': f'track{hour}', 'name': 'song', 'artists': [{'id': f'artist{hour % 4}'}]},
+        }
+        for hour in range(20)
+    ]
+
+    patterns = await MusicProfileAnalyzer(client_for(api)).analyze_listening_patterns(recent)
+
+    # Not one artists/{id} call per played track
+    assert [request.url.path for request in api.requests] == ['/v1/artists']
+    assert sorted(api.batches[0]) == ['artist0', 'artist1', 'artist2', 'artist3']
+    assert patterns['by_genre'] == {f'artist{i}-genre': 5 for i in range(4)}
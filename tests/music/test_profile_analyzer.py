@@ -0,0 +1,104 @@
+from collections import Counter
+
+import pytest
+
+from app.helpers import spotify
+from app.helpers.artist_cache import ArtistMetadataCache
+from app.helpers.spotify import fetch_spotify_profile
+from app.music import profile_analyzer
+from app.music.profile_analyzer import MusicProfileAnalyzer
+
+ARTISTS = [
+    {'id': 'burna', 'name': 'Burna Boy', 'popularity': 80, 'genres': ['afrobeats']},
+    {'id': 'tems', 'name': 'Tems', 'popularity': 70, 'genres': ['alte', 'rnb']},
+]
+TRACKS = [
+    {
+        'id': f'track-{i}', 'name': f'Track {i}', 'popularity': 60,
+        'artists': [{'id': 'burna', 'name': 'Burna Boy'}],
+        'album': {'name': 'Love, Damini', 'release_date': '2022-07-08'},
+    }
+    for i in range(3)
+]
+RECENT = [
+    {'played_at': '2024-05-01T20:15:00Z', 'track': TRACKS[0]},
+    {'played_at': '2024-05-01T21:15:00Z', 'track': {**TRACKS[1], 'artists': [{'id': 'wizkid', 'name': 'Wizkid'}]}},
+]
+
+
+class CountingSpotify:
+    """Fake SpotifyClient counting calls to each endpoint"""
+
+    def __init__(self):
+        self.calls = Counter()
+
+    async def get_user_data(self):
+        self.calls['me'] += 1
+        return {'id': 'ada', 'display_name': 'Ada', 'external_urls': {'spotify': 'url'}}
+
+    async def current_user_top_tracks(self, limit=20, time_range='medium_term'):
+        self.calls['me/top/tracks'] += 1
+        return {'items': TRACKS}
+
+    async def current_user_top_artists(self, limit=20, time_range='medium_term'):
+        self.calls['me/top/artists'] += 1
+        return {'items': ARTISTS}
+
+    async def current_user_recently_played(self, limit=50):
+        self.calls['me/player/recently-played'] += 1
+        return {'items': RECENT}
+
+    async def audio_features(self, track_ids):
+        self.calls['audio-features'] += 1
+        return [{'id': track_id, 'energy': 0.8, 'danceability': 0.6} for track_id in track_ids]
+
+    async def get_artists(self, artist_ids):
+        self.calls['artists'] += 1
+        return [{'id': artist_id, 'genres': ['afroswing']} for artist_id in artist_ids]
+
+
+@pytest.fixture(autouse=True)
+def empty_artist_cache(monkeypatch):
+    cache = ArtistMetadataCache(use_db=False)
+    monkeypatch.setattr(profile_analyzer, 'artist_cache', cache)
+    monkeypatch.setattr(spotify, 'artist_cache', cache)
+
+
+async def test_sync_calls_each_spotify_endpoint_once():
+    client = CountingSpotify()
+
+    user_update, profile_data = await fetch_spotify_profile(client)
+
+    assert client.calls == {
+        'me': 1,
+        'me/top/tracks': 1,
+        'me/top/artists': 1,
+        'me/player/recently-played': 1,
+        'audio-features': 1,
+        'artists': 1,
+    }
+    assert user_update['spotify_id'] == 'ada'
+    assert profile_data['energy_score'] == 80
+    assert profile_data['listening_history']['by_genre'] == {'afroswing': 2}
+
+
+async def test_payloads_passed_in_are_not_fetched_again():
+    client = CountingSpotify()
+    analyzer = MusicProfileAnalyzer(client)
+
+    await analyzer.get_complete_profile_metrics(
+        top_tracks={'items': TRACKS}, top_artists={'items': ARTISTS}, recent_tracks={'items': RECENT}
+    )
+
+    assert client.calls == {'audio-features': 1, 'artists': 1}
+
+
+async def test_missing_payloads_are_fetched():
+    client = CountingSpotify()
+    analyzer = MusicProfileAnalyzer(client)
+
+    await analyzer.get_complete_profile_metrics(top_artists={'items': ARTISTS})
+
+    assert client.calls['me/top/artists'] == 0
+    assert client.calls['me/top/tracks'] == 1
+    assert client.calls['me/player/recently-played'] == 1
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+
+import httpx
+from sqlmodel import Session
+
+from app.models.models import User
+from app.music import refresh
+from app.music.refresh import ProfileRefresher, save_profiles, stale_users_page
+from app.users.users import UserService
+
+
+async def test_stale_users_are_paged_never_synced_first(
+    db_test: Session,
+    user_service: UserService,
+    sample_user: User,
+    other_sample_user: User,
+):
+    user_service.update_user(other_sample_user.id, {'last_spotify_sync': datetime(2020, 1, 1)})
+    cutoff = datetime.utcnow()
+
+    first = stale_users_page(db_test, cutoff, None, 1)
+    assert [row[0] for row in first] == [sample_user.id]
+
+    second = stale_users_page(db_test, cutoff, (first[-1][1], first[-1][0]), 1)
+    assert [row[0] for row in second] == [other_sample_user.id]
+    assert stale_users_page(db_test, cutoff, (second[-1][1], second[-1][0]), 1) == []
+
+
+async def test_save_profiles_upserts_users_and_profiles(
+    db_test: Session,
+    user_service: UserService,
+    sample_user: User,
+):
+    synced_at = datetime.utcnow()
+    profiles = save_profiles(db_test, {
+        sample_user.id: (
+            {'display_name': 'refreshed', 'last_spotify_sync': synced_at},
+            # Shaped like fetch_spotify_profile's output
+            {
+                'genres': ['afrobeats'],
+                'top_artists': [
+                    {'name': 'Burna Boy', 'id': '3wcj11K77LjEY1PkEazffa', 'popularity': 80,
+                     'genres': ['afrobeats']},
+                ],
+                'top_tracks': [
+                    {'name': 'Last Last', 'id': '4fdQy8Ny4jJ0zDg1rQqLq2', 'artist': 'Burna Boy',
+                     'album': 'Love, Damini', 'popularity': 75},
+                ],
+                'energy_score': 0.9,
+            },
+        ),
+    })
+
+    assert [profile.genres for profile in profiles] == [['afrobeats']]
+    assert profiles[0].top_artists == ['Burna Boy']
+    assert profiles[0].top_tracks == ['Last Last']
+    assert profiles[0].minhash is not None
+    user = user_service.get_user(sample_user.id)
+    assert user.display_name == 'refreshed'
+    assert user.last_spotify_sync == synced_at
+    assert stale_users_page(db_test, synced_at, None, 10) == []
+
+
+async def test_users_still_authenticate_after_their_tokens_are_refreshed(
+    db_test: Session,
+    user_service: UserService,
+    sample_user: User,
+):
+    login_token = sample_user.spotify_token
+    save_profiles(db_test, {
+        sample_user.id: (
+            {
+                'spotify_access_token': 'refreshed-access-token',
+                'spotify_refresh_token': 'rotated-refresh-token',
+                'token_expires_at': datetime.utcnow() + timedelta(hours=1),
+            },
+            {'genres': ['afrobeats']},
+        ),
+    })
+    db_test.expire_all()
+
+    user = user_service.get_user_by_token(login_token)
+    assert user is not None and user.id == sample_user.id
+    assert user.spotify_access_token == 'refreshed-access-token'
+    # The refresher calls Spotify with the refreshed token from now on
+    [row] = stale_users_page(db_test, datetime.utcnow() + timedelta(days=1), None, 10)
+    assert row[2] == 'refreshed-access-token'
+
+
+async def test_expired_and_rejected_tokens_are_refreshed(monkeypatch):
+    async def refresh_spotify_token(refresh_token):
+        return {'spotify_access_token': f'new-{refresh_token}', 'spotify_refresh_token': refresh_token}
+
+    async def fetch_spotify_profile(spotify):
+        if not spotify.token.startswith('new-'):
+            raise httpx.HTTPStatusError(
+                '401', request=httpx.Request('GET', 'https://api.spotify.com/v1/me'),
+                response=httpx.Response(401),
+            )
+        return {'display_name': spotify.token}, {'genres': ['afrobeats']}
+
+    monkeypatch.setattr(refresh, 'refresh_spotify_token', refresh_spotify_token)
+    monkeypatch.setattr(refresh, 'fetch_spotify_profile', fetch_spotify_profile)
+    refresher = ProfileRefresher()
+
+    expired = datetime.utcnow() - timedelta(hours=2)
+    user_update, _ = await refresher._fetch_profile('old', 'r1', expired)
+    assert user_update == {
+        'display_name': 'new-r1', 'spotify_access_token': 'new-r1', 'spotify_refresh_token': 'r1',
+    }
+
+    # No stored expiry: the 401 triggers the refresh
+    user_update, _ = await refresher._fetch_profile('old', 'r2', None)
+    assert user_update['spotify_access_token'] == 'new-r2'
+    assert refresher.tokens_refreshed == 2
@@ -0,0 +1,62 @@
+import uuid
+
+from app.recommendation.ann_index import ProfileIndex
+
+
+def _profile(cluster, i):
+    return {
+        'user_id': uuid.uuid4(),
+        'genres': [f'genre-{cluster}', f'genre-{cluster}-{i % 3}'],
+        'top_artists': [f'artist-{cluster}-{n}' for n in range(i % 5, i % 5 + 10)],
+        'top_tracks': [f'track-{cluster}-{n}' for n in range(i % 7, i % 7 + 10)],
+        'favorite_decades': ['2010s'],
+        'energy_score': 0.5,
+        'danceability_score': 0.5,
+        'diversity_score': 0.5,
+        'obscurity_score': 0.5,
+        'listening_history': {'by_hour': {str(cluster % 24): 3}},
+    }
+
+
+def _profiles():
+    return [_profile(cluster, i) for cluster in range(10) for i in range(20)]
+
+
+def test_search_returns_profiles_with_the_same_taste(tmp_path):
+    profiles = _profiles()
+    index = ProfileIndex(str(tmp_path), nprobe=2)
+    index.build(profiles)
+    target = profiles[0]
+
+    results = index.search(target, k=10, exclude={str(target['user_id'])})
+
+    same_cluster = {str(profile['user_id']) for profile in profiles[1:20]}
+    assert len(results) == 10
+    assert {user_id for user_id, _ in results} <= same_cluster
+
+
+def test_saved_index_is_memory_mapped_on_load(tmp_path):
+    profiles = _profiles()
+    built = ProfileIndex(str(tmp_path))
+    built.build(profiles)
+    built.save()
+
+    loaded = ProfileIndex(str(tmp_path))
+
+    assert loaded.load()
+    assert len(loaded) == len(profiles)
+    assert loaded.search(profiles[0], k=5) == built.search(profiles[0], k=5)
+
+
+def test_upsert_replaces_the_indexed_profile(tmp_path):
+    profiles = _profiles()
+    index = ProfileIndex(str(tmp_path))
+    index.build(profiles)
+    moved = dict(_profile(42, 0), user_id=profiles[0]['user_id'])
+
+    index.upsert(moved)
+
+    results = index.search(profiles[1], k=len(profiles))
+    assert len(index) == len(profiles)
+    assert [user_id for user_id, _ in results].count(str(moved['user_id'])) == 1
+    assert index.search(moved, k=1)[0][0] == str(moved['user_id'])
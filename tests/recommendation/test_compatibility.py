@@ -0,0 +1,62 @@
+from sqlmodel import Session, select
+
+from app.models.models import CompatibilityScore, MusicProfile, User
+from app.recommendation.compatibility import find_compatibility, refresh_compatibility
+from app.users.users import UserService
+
+
+async def test_refresh_only_rescores_changed_profiles(
+    db_test: Session,
+    user_service: UserService,
+    sample_user: User,
+    get_other_sample_user_profile: MusicProfile,
+):
+    result = refresh_compatibility(db_test)
+    assert result['changed_profiles'] == 2
+    assert result['rows_written'] == 2
+
+    profile = user_service.get_music_profile(sample_user.id)
+    stored = find_compatibility(db_test, profile, get_other_sample_user_profile)
+    assert stored is not None
+    assert 0 < stored.overall_similarity <= 1
+
+    assert refresh_compatibility(db_test)['changed_profiles'] == 0
+
+    # A profile change makes the stored pair stale until the next run
+    user_service.update_user_music_profile(sample_user.id, {'energy_score': 0.1})
+    assert find_compatibility(db_test, profile, get_other_sample_user_profile) is None
+
+    result = refresh_compatibility(db_test)
+    assert result['changed_profiles'] == 1
+    rows = db_test.exec(select(CompatibilityScore)).all()
+    assert {(row.user_id, row.other_user_id) for row in rows} == {
+        (sample_user.id, get_other_sample_user_profile.user_id),
+        (get_other_sample_user_profile.user_id, sample_user.id),
+    }
+
+
+async def test_refresh_inserts_new_profiles_into_unchanged_lists(
+    db_test: Session,
+    user_service: UserService,
+    sample_user: User,
+    get_other_sample_user_profile: MusicProfile,
+):
+    refresh_compatibility(db_test, top_k=1)
+
+    # A newcomer with sample_user's taste beats their current best match
+    profile = user_service.get_music_profile(sample_user.id)
+    twin = user_service.create_user({
+        'display_name': 'twin', 'email': 'twin@example.com', 'spotify_id': 'twin_spotify_id',
+    })
+    user_service.update_user_music_profile(twin.id, {
+        field: getattr(profile, field)
+        for field in ('genres', 'top_artists', 'top_tracks', 'energy_score',
+                      'danceability_score', 'diversity_score', 'obscurity_score')
+    })
+
+    result = refresh_compatibility(db_test, top_k=1)
+    assert result['changed_profiles'] == 1
+    rows = db_test.exec(
+        select(CompatibilityScore).where(CompatibilityScore.user_id == sample_user.id)
+    ).all()
+    assert [row.other_user_id for row in rows] == [twin.id]
@@ -0,0 +1,88 @@
+import uuid
+
+import pytest
+
+from app.models.models import MusicProfile
+from app.recommendation.feature_store import FeatureStore
+from app.recommendation.music_recommender import MusicRecommender
+
+
+def _profile(genres, artists, energy, hours):
+    return {
+        'user_id': uuid.uuid4(),
+        'genres': genres,
+        'top_artists': artists,
+        'top_tracks': [f'{artist} - single' for artist in artists],
+        'favorite_decades': ['2010s'],
+        'energy_score': energy,
+        'danceability_score': 0.5,
+        'diversity_score': None,
+        'obscurity_score': 0.3,
+        'listening_history': {'by_hour': hours},
+    }
+
+
+def _profiles():
+    return [
+        _profile(['afrobeats', 'pop'], ['Burna Boy', 'Wizkid'], 0.7, {'20': 4}),
+        _profile(['afrobeats'], ['Burna Boy', 'Tems'], 0.6, {'20': 2, '21': 1}),
+        _profile(['metal'], ['Metallica'], 0.9, {}),
+        _profile(['pop', 'rnb'], ['Wizkid', 'SZA'], None, {'8': 3}),
+    ]
+
+
+def _store(tmp_path, profiles):
+    store = FeatureStore(str(tmp_path))
+    store.build(profiles)
+    assert store.load()
+    return store
+
+
+def test_stored_rows_score_like_fitted_profiles(tmp_path):
+    profiles = _profiles()
+    fitted = MusicRecommender()
+    fitted.fit(profiles)
+    from_store = MusicRecommender()
+    store = _store(tmp_path, profiles)
+    from_store.use_store(store)
+
+    selection = store.candidate_set()
+    by_id = {str(profile['user_id']): profile for profile in profiles}
+    for target in profiles:
+        expected = fitted.score_candidates(target, [by_id[i] for i in selection.ids])
+        scores = from_store.score_candidates(target, selection.candidates)
+        for key, values in expected.items():
+            assert scores[key] == pytest.approx(values, abs=1e-6)
+
+
+def test_recommendations_see_synced_profiles(tmp_path):
+    profiles = _profiles()
+    target, metal = profiles[0], profiles[2]
+    store = _store(tmp_path, profiles)
+    recommender = MusicRecommender()
+    recommender.use_store(store)
+
+    before = recommender.recommend_from_store(MusicProfile(**target), limit=3)
+    assert str(target['user_id']) not in [rec.user_id for rec in before]
+    assert before[-1].user_id == str(metal['user_id'])
+
+    # The metal fan's new taste matches the target exactly
+    store.upsert({**target, 'user_id': metal['user_id']})
+    after = recommender.recommend_from_store(MusicProfile(**target), limit=3)
+
+    assert after[0].user_id == str(metal['user_id'])
+    identical = recommender.calculate_overall_similarity(target, target)
+    assert after[0].similarity_score == pytest.approx(identical.overall_similarity)
+    assert len(store) == len(profiles)
+
+
+def test_rebuild_switches_versions(tmp_path):
+    store = _store(tmp_path, _profiles())
+    first = store.version
+
+    store.build(_profiles()[:2])
+    assert store.load()
+
+    assert store.version != first
+    assert len(store) == 2
+    assert len(store.candidate_set().ids) == 2
@@ -0,0 +1,48 @@
+from app.recommendation.inverted_index import PostingIndex
+
+
+def _profile(user_id, genres=(), artists=(), tracks=()):
+    return {
+        'user_id': user_id,
+        'genres': list(genres),
+        'top_artists': list(artists),
+        'top_tracks': list(tracks),
+    }
+
+
+def test_candidates_ranked_by_overlap():
+    index = PostingIndex()
+    index.build([
+        _profile('target', ['afrobeats', 'pop'], ['Burna Boy', 'Wizkid'], ['Ye']),
+        _profile('three', ['afrobeats'], ['Burna Boy'], ['Ye']),
+        _profile('one', ['pop'], ['Drake']),
+        _profile('none', ['metal'], ['Metallica']),
+    ])
+
+    query = _profile('target', ['afrobeats', 'pop'], ['burna boy', 'Wizkid'], ['Ye'])
+    matches = index.search(query, exclude={'target'})
+
+    assert matches == [('three', 3), ('one', 1)]
+
+
+def test_upsert_replaces_postings():
+    index = PostingIndex()
+    index.build([_profile('a', ['jazz']), _profile('b', ['jazz'])])
+
+    index.upsert(_profile('b', ['house']))
+
+    assert index.search(_profile('q', ['jazz'])) == [('a', 1)]
+    assert index.search(_profile('q', ['house'])) == [('b', 1)]
+    assert len(index) == 2
+
+
+def test_common_terms_skipped_once_rare_terms_fill_the_limit():
+    index = PostingIndex(max_posting=2)
+    index.build([
+        _profile('a', ['pop', 'zouk']),
+        _profile('b', ['pop']),
+        _profile('c', ['pop']),
+    ])
+
+    assert index.search(_profile('q', ['pop', 'zouk']), limit=1) == [('a', 1)]
+    assert len(index.search(_profile('q', ['pop', 'zouk']), limit=3)) == 3
@@ -0,0 +1,33 @@
+from app.helpers.minhash import minhash_signature
+from app.recommendation.lsh_index import LSHIndex
+
+
+def _signature(prefix, shared=(), size=30):
+    return minhash_signature([*shared, *(f'{prefix}-{i}' for i in range(size))])
+
+
+def test_finds_high_overlap_users_best_first():
+    shared = [f'artist-{i}' for i in range(30)]
+    index = LSHIndex()
+    index.build({
+        'close': _signature('close', shared, size=5),
+        'near': _signature('near', shared, size=20),
+        'stranger': _signature('stranger'),
+    })
+
+    matches = index.search(_signature('target', shared, size=5), limit=10)
+
+    assert [user_id for user_id, _ in matches] == ['close', 'near']
+    assert matches[0][1] > matches[1][1]
+
+
+def test_upsert_and_exclude():
+    index = LSHIndex()
+    index.build({'a': _signature('a'), 'b': _signature('b')})
+
+    index.upsert('b', _signature('a'))
+
+    assert {user_id for user_id, _ in index.search(_signature('a'), 10)} == {'a', 'b'}
+    assert [user_id for user_id, _ in index.search(_signature('a'), 10, {'a'})] == ['b']
+    index.upsert('b', None)
+    assert len(index) == 1
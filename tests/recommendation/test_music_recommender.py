@@ -0,0 +1,130 @@
+import uuid
+
+import pytest
+
+from app.models.models import MusicProfile
+from app.recommendation.inverted_index import PostingIndex
+from app.recommendation.music_recommender import MusicRecommender, RecommenderRefitter
+
+
+def _profile(genres, artists, energy, hours):
+    return {
+        'user_id': uuid.uuid4(),
+        'genres': genres,
+        'top_artists': artists,
+        'top_tracks': [f'{artist} - single' for artist in artists],
+        'favorite_decades': ['2010s'],
+        'energy_score': energy,
+        'danceability_score': 0.5,
+        'diversity_score': None,
+        'obscurity_score': 0.3,
+        'listening_history': {'by_hour': hours},
+    }
+
+
+def test_batch_scores_match_pairwise_similarity():
+    target = _profile(['afrobeats', 'pop'], ['Burna Boy', 'Wizkid'], 0.7, {'20': 4})
+    candidates = [
+        _profile(['afrobeats'], ['Burna Boy', 'Tems'], 0.6, {'20': 2, '21': 1}),
+        _profile(['metal'], ['Metallica'], 0.9, {}),
+        _profile(['pop', 'rnb'], ['Wizkid', 'SZA'], None, {'8': 3}),
+    ]
+    recommender = MusicRecommender()
+    recommender.fit([target, *candidates])
+
+    scores = recommender.score_candidates(target, candidates)
+
+    for i, candidate in enumerate(candidates):
+        expected = recommender.calculate_overall_similarity(target, candidate)
+        for key, value in expected.dict(exclude={'shared_music'}).items():
+            assert scores[key][i] == pytest.approx(value)
+
+
+def test_prepared_candidates_score_like_profile_lists():
+    profiles = [
+        _profile(['afrobeats', 'pop'], ['Burna Boy', 'Wizkid'], 0.7, {'20': 4}),
+        _profile(['metal'], ['Metallica'], 0.9, {}),
+        _profile(['pop', 'rnb'], ['Wizkid', 'SZA'], None, {'8': 3}),
+    ]
+    recommender = MusicRecommender()
+    recommender.fit(profiles)
+    prepared = recommender.prepare_candidates(profiles)
+
+    for target in profiles:
+        expected = recommender.score_candidates(target, profiles)
+        scores = recommender.score_candidates(target, prepared)
+        for key, values in expected.items():
+            assert scores[key] == pytest.approx(values)
+
+
+def test_only_users_sharing_music_are_scored():
+    target = _profile(['afrobeats', 'pop'], ['Burna Boy', 'Wizkid'], 0.7, {'20': 4})
+    sharing = _profile(['afrobeats'], ['Tems'], 0.6, {'20': 2})
+    unrelated = _profile(['metal'], ['Metallica'], 0.7, {'20': 4})
+    postings = PostingIndex()
+    postings.build([target, sharing, unrelated])
+    recommender = MusicRecommender(postings=postings)
+
+    recommendations = recommender.get_user_recommendations(
+        MusicProfile(**target),
+        [MusicProfile(**sharing), MusicProfile(**unrelated)],
+        limit=10,
+    )
+
+    assert [rec.user_id for rec in recommendations] == [str(sharing['user_id'])]
+
+
+def test_vocabularies_are_fitted_on_every_profile_not_the_candidates():
+    target = _profile(['afrobeats'], ['Burna Boy'], 0.7, {'20': 4})
+    sharing = _profile(['afrobeats'], ['Tems'], 0.6, {'20': 2})
+    unrelated = _profile(['metal'], ['Metallica'], 0.7, {'20': 4})
+    recommender = MusicRecommender(load_profiles=lambda: [target, sharing, unrelated])
+    RecommenderRefitter(recommender).run_once()
+    vocabulary = recommender.vocabulary
+
+    # e.g. a genre-filtered request only loads the matching profiles
+    recommender.get_user_recommendations(
+        MusicProfile(**target), [MusicProfile(**sharing)], limit=10
+    )
+
+    assert recommender.vocabulary is vocabulary
+    assert 'metal' in recommender.field_vectorizers['genres'].vocabulary_
+
+
+def test_requests_never_fit_a_background_refitted_recommender():
+    target = _profile(['afrobeats'], ['Burna Boy'], 0.7, {'20': 4})
+    sharing = _profile(['afrobeats'], ['Burna Boy'], 0.6, {'20': 2})
+    loads = []
+    recommender = MusicRecommender(load_profiles=lambda: loads.append(1) or [target, sharing])
+
+    # Before the first background fit, requests score with their own vocabulary
+    recommendations = recommender.get_user_recommendations(
+        MusicProfile(**target), [MusicProfile(**sharing)], limit=10
+    )
+
+    assert [rec.user_id for rec in recommendations] == [str(sharing['user_id'])]
+    assert recommendations[0].compatibility.genre_similarity == pytest.approx(1.0)
+    assert not recommender.is_fitted
+    assert loads == []
+
+
+def test_refit_swaps_in_a_new_vocabulary_without_touching_the_old_one():
+    first = _profile(['afrobeats'], ['Burna Boy'], 0.7, {'20': 4})
+    second = _profile(['metal'], ['Metallica'], 0.7, {'20': 4})
+    recommender = MusicRecommender()
+    recommender.fit([first])
+    prepared = recommender.prepare_candidates([first])
+    old = recommender.vocabulary
+
+    recommender.fit([first, second])
+
+    assert 'metal' not in old.field_vectorizers['genres'].vocabulary_
+    assert 'metal' in recommender.field_vectorizers['genres'].vocabulary_
+    # Vectors cached under the old vocabulary are not served under the new one
+    assert first['user_id'] in old.profile_vectors
+    assert recommender.profile_vectors(first) == recommender.vocabulary.profile_vectors[
+        first['user_id']
+    ][1]
+    # Candidates prepared before the refit still score with their own vocabulary
+    scores = recommender.score_candidates(second, prepared)
+    assert scores['genre_similarity'] == pytest.approx([0.0])
@@ -0,0 +1,263 @@
+import asyncio
+import json
+from collections import Counter
+from uuid import uuid4
+
+import pytest
+
+from app.realtime.broker import RedisBroker
+from app.realtime.handlers import ConnectionManager, RoomConnection
+from app.realtime.models import ChatMessage, TrackUpdateMessage, WebSocketUser
+
+USER = WebSocketUser(id='user-1', name='Ada')
+
+
+class FakeWebSocket:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.sent = []
+        self.closed_with = None
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        await self.gate.wait()
+        await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(data))
+
+    async def close(self, code: int = 1000, reason: str = ''):
+        self.closed_with = code
+
+
+def chat(content: str) -> ChatMessage:
+    return ChatMessage(user=USER, content=content)
+
+
+def track(track_id: str, user: WebSocketUser = USER) -> TrackUpdateMessage:
+    return TrackUpdateMessage(
+        user=user, track_id=track_id, track_name=track_id, artist_name='artist'
+    )
+
+
+async def drain():
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+async def test_slow_socket_does_not_delay_the_room():
+    manager = ConnectionManager()
+    room_id = uuid4()
+    fast, slow = FakeWebSocket(), FakeWebSocket()
+    slow.gate.clear()
+    await manager.connect_to_room(fast, room_id)
+    await manager.connect_to_room(slow, room_id)
+
+    await manager.broadcast_to_room(room_id, chat('hello'))
+    await drain()
+
+    assert [message['content'] for message in fast.sent] == ['hello']
+    assert slow.sent == []
+    slow.gate.set()
+    await drain()
+    assert [message['content'] for message in slow.sent] == ['hello']
+    await manager.disconnect_from_room(fast, room_id)
+    await manager.disconnect_from_room(slow, room_id)
+
+
+async def test_full_queue_drops_oldest():
+    manager = ConnectionManager(send_queue_size=2, slow_consumer_policy='drop_oldest')
+    room_id = uuid4()
+    websocket = FakeWebSocket()
+    websocket.gate.clear()
+    await manager.connect_to_room(websocket, room_id)
+
+    for content in ('a', 'b', 'c', 'd'):
+        await manager.broadcast_to_room(room_id, chat(content))
+    websocket.gate.set()
+    await drain()
+
+    assert [message['content'] for message in websocket.sent] == ['c', 'd']
+    assert manager.stats()['dropped'] == 2
+    await manager.disconnect_from_room(websocket, room_id)
+
+
+async def test_coalesce_keeps_latest_track_update():
+    manager = ConnectionManager(send_queue_size=8, slow_consumer_policy='coalesce')
+    room_id = uuid4()
+    websocket = FakeWebSocket()
+    websocket.gate.clear()
+    await manager.connect_to_room(websocket, room_id)
+
+    await manager.broadcast_to_room(room_id, chat('first'))
+    await drain()
+    for track_id in ('t1', 't2', 't3'):
+        await manager.broadcast_to_room(room_id, track(track_id))
+    await manager.broadcast_to_room(room_id, chat('last'))
+    websocket.gate.set()
+    await drain()
+
+    assert [message.get('track_id') or message['content'] for message in websocket.sent] == [
+        'first', 't3', 'last'
+    ]
+    assert manager.stats()['coalesced'] == 2
+    await manager.disconnect_from_room(websocket, room_id)
+
+
+async def test_disconnect_policy_evicts_slow_socket():
+    manager = ConnectionManager(send_queue_size=1, slow_consumer_policy='disconnect')
+    room_id = uuid4()
+    websocket = FakeWebSocket()
+    websocket.gate.clear()
+    await manager.connect_to_room(websocket, room_id)
+
+    for content in ('a', 'b', 'c', 'd'):
+        await manager.broadcast_to_room(room_id, chat(content))
+        await drain()
+    websocket.gate.set()
+    await drain()
+
+    assert websocket.closed_with == 1013
+    assert room_id not in manager.room_connections
+    # Evicted once; nothing is queued, or counted, after that
+    assert manager.stats()['slow_disconnects'] == 1
+    assert manager.stats()['dropped'] == 1
+    # The router still calls this when the socket's receive loop ends
+    await manager.disconnect_from_room(websocket, room_id)
+
+
+async def test_stuck_or_failing_socket_is_closed():
+    counters = Counter()
+    closed = []
+    stuck = FakeWebSocket(delay=1)
+    connection = RoomConnection(stuck, closed.append, counters, send_timeout=0.01)
+    connection.push('{}', 2)
+    await asyncio.sleep(0.05)
+
+    assert stuck.closed_with == 1013
+    assert closed == [connection]
+    assert counters['send_timeouts'] == 1
+
+    failing = FakeWebSocket()
+
+    async def send_text(data):
+        raise RuntimeError('connection reset')
+
+    failing.send_text = send_text
+    connection = RoomConnection(failing, closed.append, counters)
+    connection.push('{}', 2)
+    await drain()
+
+    assert failing.closed_with == 1011
+    assert connection.closed
+
+
+async def test_broadcast_encodes_each_message_once():
+    manager = ConnectionManager()
+    room_id = uuid4()
+    websockets = [FakeWebSocket() for _ in range(3)]
+    for websocket in websockets:
+        await manager.connect_to_room(websocket, room_id)
+
+    await manager.broadcast_to_room(room_id, chat('hello'))
+    await drain()
+
+    stats = manager.stats()
+    assert stats['encoded'] == 1
+    assert stats['sent'] == 3
+    assert stats['bytes_sent'] == 3 * len(chat('hello').model_dump_json())
+    assert all(websocket.sent[0]['content'] == 'hello' for websocket in websockets)
+    for websocket in websockets:
+        await manager.disconnect_from_room(websocket, room_id)
+
+
+async def test_rooms_are_subscribed_only_while_they_have_local_sockets():
+    manager = ConnectionManager()
+    room_id = uuid4()
+    websocket = FakeWebSocket()
+
+    await manager.connect_to_room(websocket, room_id)
+    assert manager.broker.rooms == {room_id}
+
+    await manager.disconnect_from_room(websocket, room_id)
+    assert manager.broker.rooms == set()
+
+
+async def test_redis_broker_shares_rooms_between_workers():
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    workers = [
+        ConnectionManager(broker=RedisBroker(client=fakeredis.FakeAsyncRedis(server=server)))
+        for _ in range(2)
+    ]
+    room_id = uuid4()
+    websockets = [FakeWebSocket(), FakeWebSocket()]
+    for worker, websocket in zip(workers, websockets):
+        await worker.start()
+        await worker.connect_to_room(websocket, room_id)
+    try:
+        await workers[0].broadcast_to_room(room_id, chat('across workers'))
+        for _ in range(100):
+            if all(websocket.sent for websocket in websockets):
+                break
+            await asyncio.sleep(0.01)
+
+        assert [ws.sent[0]['content'] for ws in websockets] == ['across workers'] * 2
+        assert workers[1].stats()['encoded'] == 0
+    finally:
+        for worker, websocket in zip(workers, websockets):
+            await worker.disconnect_from_room(websocket, room_id)
+            await worker.stop()
+
+
+async def test_track_updates_are_coalesced_per_window():
+    manager = ConnectionManager(track_update_window=0.05)
+    room_id = uuid4()
+    websocket = FakeWebSocket()
+    await manager.connect_to_room(websocket, room_id)
+
+    for track_id in ('t1', 't2', 't3', 't4'):
+        await manager.broadcast_track_update(room_id, track(track_id))
+    await asyncio.sleep(0.15)
+
+    assert [message['track_id'] for message in websocket.sent] == ['t1', 't4']
+    assert manager.stats()['track_updates_coalesced'] == 2
+    await manager.disconnect_from_room(websocket, room_id)
+    await manager.stop()
+
+
+async def test_each_users_latest_track_survives_the_window():
+    manager = ConnectionManager(track_update_window=0.05)
+    room_id = uuid4()
+    websocket = FakeWebSocket()
+    await manager.connect_to_room(websocket, room_id)
+    other = WebSocketUser(id='user-2', name='Grace')
+
+    await manager.broadcast_track_update(room_id, track('t1'))
+    await manager.broadcast_track_update(room_id, track('t2'))
+    await manager.broadcast_track_update(room_id, track('o1', other))
+    await asyncio.sleep(0.15)
+
+    assert [
+        (message['user']['id'], message['track_id']) for message in websocket.sent
+    ] == [('user-1', 't1'), ('user-1', 't2'), ('user-2', 'o1')]
+    await manager.disconnect_from_room(websocket, room_id)
+    await manager.stop()
+
+
+async def test_chat_is_rate_limited_per_user():
+    manager = ConnectionManager(chat_rate=0.001, chat_burst=2)
+    room_id = uuid4()
+    websocket = FakeWebSocket()
+    await manager.connect_to_room(websocket, room_id)
+
+    sent = [await manager.broadcast_chat(room_id, 'user-1', chat(str(i))) for i in range(3)]
+    assert sent == [True, True, False]
+    assert await manager.broadcast_chat(room_id, 'user-2', chat('other user'))
+    await drain()
+
+    assert [message['content'] for message in websocket.sent] == ['0', '1', 'other user']
+    assert manager.stats()['chat_rate_limited'] == 1
+    await manager.disconnect_from_room(websocket, room_id)
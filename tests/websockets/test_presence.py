@@ -0,0 +1,104 @@
+import asyncio
+from uuid import uuid4
+
+from sqlmodel import Session, select
+
+from app.models.models import RoomParticipant, User
+from app.realtime import presence
+from app.realtime.models import WebSocketUser
+from app.realtime.presence import PresenceRegistry
+
+
+def user(user_id: str, name: str = 'Ada') -> WebSocketUser:
+    return WebSocketUser(id=user_id, name=name)
+
+
+class Recorder:
+    def __init__(self):
+        self.messages = []
+
+    async def __call__(self, room_id, message):
+        self.messages.append((room_id, message))
+
+
+async def test_participants_count_each_user_once():
+    registry = PresenceRegistry(Recorder(), diff_window=0)
+    room_id = uuid4()
+
+    registry.join(room_id, user('u1'))
+    registry.join(room_id, user('u1'))
+    registry.join(room_id, user('u2', 'Grace'))
+    assert [p.id for p in registry.participants(room_id)] == ['u1', 'u2']
+
+    # Still connected through a second socket
+    registry.leave(room_id, 'u1')
+    assert [p.id for p in (await registry.snapshot(room_id)).users] == ['u1', 'u2']
+
+    registry.leave(room_id, 'u1')
+    registry.leave(room_id, 'u2')
+    registry.leave(room_id, 'u2')
+    assert registry.participants(room_id) == []
+    assert registry.rooms == {}
+    await registry.stop()
+
+
+async def test_presence_changes_are_sent_as_one_compact_diff():
+    recorder = Recorder()
+    registry = PresenceRegistry(recorder, diff_window=0.02)
+    room_id = uuid4()
+    registry.join(room_id, user('u1'))
+    await asyncio.sleep(0.05)
+    recorder.messages.clear()
+
+    registry.join(room_id, user('u2'))
+    registry.join(room_id, user('u3'))
+    registry.leave(room_id, 'u3')  # joined and left within the window
+    registry.leave(room_id, 'u1')
+    await asyncio.sleep(0.05)
+
+    assert len(recorder.messages) == 1
+    _, diff = recorder.messages[0]
+    assert [joined.id for joined in diff.joined] == ['u2']
+    assert diff.left == ['u1']
+    assert registry.stats()['diffs_sent'] == 2
+
+
+async def test_checkpoint_writes_participants(
+    db_test: Session, sample_user: User, other_sample_user: User
+):
+    registry = PresenceRegistry(Recorder(), diff_window=0)
+    room_id = uuid4()
+    registry.join(room_id, user(str(sample_user.id)))
+    registry.join(room_id, user(str(other_sample_user.id), 'Grace'))
+    rows, left = registry._collect()
+    assert registry.write_checkpoint(db_test, rows, left)['participants'] == 2
+
+    registry.leave(room_id, str(other_sample_user.id))
+    rows, left = registry._collect()
+    result = registry.write_checkpoint(db_test, rows, left)
+
+    assert result == {'participants': 1, 'left': 1, 'stale': 0}
+    stored = db_test.exec(select(RoomParticipant)).all()
+    assert [(row.room_id, row.user_id) for row in stored] == [(room_id, sample_user.id)]
+    await registry.stop()
+
+
+async def test_shared_rooms_include_other_workers_participants(
+    monkeypatch, db_test: Session, sample_user: User, other_sample_user: User
+):
+    monkeypatch.setattr(presence, 'engine', db_test.get_bind())
+    room_id = uuid4()
+    # Another worker checkpointed sample_user in the room
+    other_worker = PresenceRegistry(Recorder(), diff_window=0, shared=True)
+    other_worker.join(room_id, user(str(sample_user.id)))
+    other_worker.write_checkpoint(db_test, *other_worker._collect())
+
+    registry = PresenceRegistry(Recorder(), diff_window=0, shared=True)
+    registry.join(room_id, user(str(other_sample_user.id), 'Grace'))
+
+    assert [p.id for p in await registry.all_participants(room_id)] == [
+        str(sample_user.id), str(other_sample_user.id)
+    ]
+    assert registry.participants(room_id) == [user(str(other_sample_user.id), 'Grace')]
+    await registry.stop()
+    await other_worker.stop()